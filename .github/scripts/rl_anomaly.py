@@ -1,30 +1,249 @@
 import json, math, os
+import numpy as np
+from rl_io import History, set_outputs
+from rl_score import endpoint_scores, offenders, top_users, user_features
+from sp_timing import Timings, stage
 
-with open('/tmp/history.json') as f:
-    data = json.load(f)
-
-total = data['total']
-mean = sum(total)/len(total)
-variance = sum((x-mean)**2 for x in total)/len(total)
-std = math.sqrt(variance)
-
-anomalies = [(h, v, round((v-mean)/max(std,1),1)) for h,v in enumerate(total) if (v-mean)/max(std,1) > 2.5]
-normal_peak = max(v for h,v in enumerate(total) if h < 14)
-recommended = max(15, int(normal_peak * 1.5))
-strict = max(10, int(normal_peak * 1.0))
-
-out = os.environ.get('GITHUB_OUTPUT','/tmp/gho.txt')
-with open(out,'a') as f:
-    f.write(f"anomaly_count={len(anomalies)}\n")
-    f.write(f"mean={mean:.1f}\n")
-    f.write(f"std={std:.1f}\n")
-    f.write(f"recommended_limit={recommended}\n")
-    f.write(f"strict_limit={strict}\n")
-    f.write("anomaly_hours="+",".join(str(h) for h,_,_ in anomalies)+"\n")
-
-with open('/tmp/anomaly.json','w') as f:
-    json.dump({'mean':mean,'std':std,'anomalies':[[h,v,z] for h,v,z in anomalies],'recommended':recommended,'strict':strict},f)
-
-print(f"Mean: {mean:.1f} | Std: {std:.1f} | Anomalies: {len(anomalies)} windows")
-print(f"Anomaly hours: {[h for h,_,_ in anomalies]}")
-print(f"AI recommended limit: {recommended} req/min per user")
+STATE_PATH = os.environ.get('RL_DETECTOR_STATE', '/tmp/rl_state/detector.json')
+PROFILE_PATH = os.environ.get('RL_PROFILE', '/tmp/rl_state/profile.json')
+ANOMALY_PATH = os.environ.get('RL_ANOMALY', '/tmp/anomaly.json')
+HALF_LIFE  = float(os.environ.get('RL_EWMA_HALFLIFE', 20))   # minutes
+THRESHOLD  = 2.5      # z-score that flags a minute
+WARMUP     = 180      # minutes absorbed before anything can be flagged
+MIN_FLAGGED = 0.1     # share of an hour's minutes that must be flagged to report the hour
+KEEP       = 24 * 7   # hourly values kept in the state for peaks and reporting
+PROFILE_WEEKS = int(os.environ.get('RL_PROFILE_WEEKS', 4))   # history the seasonal profile learns from
+PROFILE_TTL   = 86400   # seconds of new data before the profile is relearned
+MIN_DAYS      = 3       # days a (weekday, hour) slot needs before it is trusted
+REPORT_USERS  = int(os.environ.get('RL_REPORT_USERS', 1000))   # busiest users ranked for the report
+
+def slot(t):
+    """Epoch seconds → (day of week, hour of day) slot 0–167, Monday 00:00 first."""
+    return ((t // 86400 + 3) % 7) * 24 + t % 86400 // 3600   # 1970-01-01 was a Thursday
+
+def group_median(values, groups, n):
+    """Median of `values` within each of `n` groups; NaN for empty groups."""
+    order = np.lexsort((values, groups))
+    v = values[order]
+    counts = np.bincount(groups, minlength=n)
+    starts = np.cumsum(counts) - counts
+    lo = np.minimum(starts + (counts - 1) // 2, len(v) - 1)
+    hi = np.minimum(starts + counts // 2, len(v) - 1)
+    return np.where(counts > 0, (v[lo] + v[hi]) / 2, np.nan) if len(v) else np.full(n, np.nan)
+
+class Profile:
+    """Seasonal baseline: the typical per-minute rate in each (weekday, hour) slot and its spread.
+
+    Learned from the hourly Σx, Σx² of the last PROFILE_WEEKS — the history's own buckets
+    plus, for the weeks before it, the hourly rollups of the time-series store — so
+    business-hour peaks and quiet weekends each have their own expectation. The median
+    over days keeps outlying days, attacks included, from moving it. Slots seen on
+    fewer than MIN_DAYS days stay untrained and the detector falls back to its EWMA.
+    """
+
+    def __init__(self, step, until, median, sd):
+        self.step, self.until = step, until   # bucket size and epoch second the profile was learned up to
+        self.median, self.sd = median, sd     # 168 values each, None where untrained
+
+    @classmethod
+    def learn(cls, start, step, totals, weeks=PROFILE_WEEKS, earlier=()):
+        """`earlier`: [(hour start, buckets, Σrate, Σrate²)] from before `start`, e.g. Store.moments."""
+        lo = max(0, len(totals) - weeks * 7 * 86400 // step)
+        t = start + np.arange(lo, len(totals), dtype=np.int64) * step
+        rate = np.asarray(totals[lo:], np.float64) * 60 / step
+        hours, cell = np.unique(t // 3600, return_inverse=True)
+        cell = cell.ravel()
+        rows = np.array(list(earlier), np.float64).reshape(-1, 4)
+        n = np.concatenate([rows[:, 1], np.bincount(cell, minlength=len(hours))])
+        m = np.concatenate([rows[:, 2], np.bincount(cell, rate, len(hours))]) / n
+        var = np.maximum(np.concatenate([rows[:, 3], np.bincount(cell, rate * rate, len(hours))]) / n - m * m, 0)
+        s = slot(np.concatenate([rows[:, 0].astype(np.int64), hours * 3600]))
+        med = group_median(m, s, 168)
+        # A minute's spread around the slot median: within its hour, plus how far that hour's level sat from it
+        sd = np.sqrt(group_median(var + (m - med[s]) ** 2, s, 168))
+        ok = np.bincount(s, minlength=168) >= MIN_DAYS   # one hour per slot per day
+        return cls(step, start + len(totals) * step,
+                   [float(v) if k else None for v, k in zip(med, ok)],
+                   [float(v) if k else None for v, k in zip(sd, ok)])
+
+    @property
+    def trained(self):
+        return sum(m is not None for m in self.median)
+
+    def state(self):
+        return {'step': self.step, 'until': self.until, 'median': self.median, 'sd': self.sd}
+
+    @classmethod
+    def load(cls, step, path=PROFILE_PATH):
+        s = load_state(path)
+        return cls(step, s['until'], s['median'], s['sd']) if s and s.get('step') == step and 'sd' in s else None
+
+class Detector:
+    """Online anomaly detector over per-bucket request totals.
+
+    Each bucket is scored against an exponentially weighted mean/variance of the
+    traffic before it, then absorbed — clipped to mean + THRESHOLD·σ, so an attack
+    can only move the baseline slowly. Buckets roll up into hours; an hour is an
+    anomaly when at least MIN_FLAGGED of its buckets were. Welford's mean/variance
+    over the normal hours doubles as the band that catches sustained abuse the EWMA
+    has started to absorb. The state is a handful of numbers plus the last KEEP
+    hours, so a run costs only the buckets added since the last one.
+    """
+
+    def __init__(self, step, state=None):
+        s = state if state and state.get('step') == step else {}
+        self.step = step
+        self.alpha = 1 - 0.5 ** (step / 60 / HALF_LIFE)
+        self.cursor = s.get('cursor')   # epoch second just past the last bucket consumed
+        self.ew = s.get('ew', {'n': 0, 'mean': 0.0, 'var': 0.0})
+        self.normal = s.get('normal', {'n': 0, 'mean': 0.0, 'm2': 0.0})
+        self.open = s.get('open')       # {'hour', 'sum', 'buckets', 'flagged', 'z'} of the hour in progress
+        self.recent = s.get('recent', [])   # [[absolute hour, req/min, z or None]]
+
+    def state(self):
+        return {'step': self.step, 'cursor': self.cursor, 'ew': self.ew,
+                'normal': self.normal, 'open': self.open, 'recent': self.recent}
+
+    def update(self, start, totals, profile=None):
+        """Consumes the per-bucket totals of a history beginning at `start`, skipping buckets already seen.
+
+        Buckets in a trained `profile` slot are scored against their seasonal median/MAD;
+        the rest against the EWMA, which keeps learning either way.
+        """
+        step, ew = self.step, self.ew
+        i0 = 0 if self.cursor is None else max(0, -(-(self.cursor - start) // step))
+        for i, x in enumerate(totals[i0:].tolist(), i0):
+            t = start + i * step
+            hour = t // 3600
+            if self.open and self.open['hour'] != hour:
+                self._close()
+            if not self.open:
+                self.open = {'hour': hour, 'sum': 0, 'buckets': 0, 'flagged': 0, 'z': 0.0, 'seasonal': False}
+
+            rate = x * 60 / step   # req/min
+            sd = max(math.sqrt(ew['var']), 1.0)
+            k = slot(t)
+            if profile and profile.median[k] is not None:
+                # √median is the Poisson floor for quiet slots
+                z = (rate - profile.median[k]) / max(profile.sd[k], math.sqrt(profile.median[k]), 1.0)
+                flagged = z > THRESHOLD
+                self.open['seasonal'] = True
+            else:
+                z = (rate - ew['mean']) / sd
+                flagged = ew['n'] >= WARMUP * 60 // step and z > THRESHOLD
+            if ew['n'] == 0:
+                ew['mean'] = rate
+            else:
+                diff = min(rate, ew['mean'] + THRESHOLD * sd) - ew['mean']
+                incr = self.alpha * diff
+                ew['mean'] += incr
+                ew['var'] = (1 - self.alpha) * (ew['var'] + diff * incr)
+            ew['n'] += 1
+
+            o = self.open
+            o['sum'] += x; o['buckets'] += 1
+            if flagged:
+                o['flagged'] += 1; o['z'] = max(o['z'], z)
+        end = start + len(totals) * step
+        self.cursor = max(self.cursor or end, end)
+        if self.open and end >= (self.open['hour'] + 1) * 3600:
+            self._close()
+
+    def _close(self):
+        o, self.open = self.open, None
+        value = o['sum'] / 60
+        # Sustained abuse stops looking new to the EWMA, so EWMA-scored hours are also held against the normal band
+        w = self.normal
+        z = (value - w['mean']) / max(self.std, 1.0) if w['n'] >= 12 and not o.get('seasonal') else 0.0
+        anomalous = o['flagged'] >= MIN_FLAGGED * o['buckets'] or z > THRESHOLD
+        if not anomalous:
+            w['n'] += 1
+            d = value - w['mean']
+            w['mean'] += d / w['n']
+            w['m2'] += d * (value - w['mean'])
+        self.recent.append([o['hour'], value, round(max(o['z'], z), 1) if anomalous else None])
+        del self.recent[:-KEEP]
+
+    @property
+    def mean(self):
+        return self.normal['mean']
+
+    @property
+    def std(self):
+        return math.sqrt(self.normal['m2'] / self.normal['n']) if self.normal['n'] else 0.0
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+def earlier(store, data, weeks=PROFILE_WEEKS):
+    """The store's hourly (hour start, buckets, Σrate, Σrate²) of total traffic in the `weeks` before `data`."""
+    base = store.base('total')
+    if base is None:
+        return []
+    end = data.start + len(data.total) * data.step
+    k = 60 / base
+    return [(ts, n, s * k, q * k * k)
+            for ts, n, s, q in store.moments('total', end - weeks * 7 * 86400, data.start // 3600 * 3600)]
+
+def analyze(data, store=None):
+    """Advances the detector over `data` and ranks users and endpoints → the anomaly.json report.
+
+    With a time-series `store`, the seasonal profile also learns from its rollups of earlier runs."""
+    end = data.start + len(data.total) * data.step
+    with stage('profile'):
+        profile = Profile.load(data.step)
+        if profile is None or end - profile.until >= PROFILE_TTL:
+            profile = Profile.learn(data.start, data.step, data.total, earlier=earlier(store, data) if store else ())
+            save_state(profile.state(), PROFILE_PATH)
+    with stage('detector'):
+        det = Detector(data.step, load_state())
+        det.update(data.start, data.total, profile)
+        save_state(det.state())
+
+    # Report the last 24 completed hours; limits are recommended by rl_replay.py
+    last = det.cursor // 3600 - 24
+    anomalies = [(h, v, z) for h, v, z in det.recent if z is not None and h >= last]
+    with stage('features'):
+        features = user_features(data)   # one sharded pass over users × time feeds both rankings
+    with stage('rank'):
+        ranked, routes = offenders(data, features=features), endpoint_scores(data)
+        busiest, population = top_users(data, features, REPORT_USERS)
+    print(f"Seasonal profile: {profile.trained}/168 weekday-hour slots trained")
+    return {'mean': det.mean, 'std': det.std, 'anomalies': [[h, round(v, 1), z] for h, v, z in anomalies],
+            'offenders': ranked, 'endpoints': routes, 'top_users': busiest, 'population': population}
+
+def outputs(report):
+    ranked = report['offenders']
+    return {'anomaly_count': len(report['anomalies']), 'mean': f"{report['mean']:.1f}", 'std': f"{report['std']:.1f}",
+            'anomaly_hours': ",".join(str(h % 24) for h, _, _ in report['anomalies']),
+            'offender_count': len(ranked), 'top_offender': ranked[0]['user'] if ranked else ''}
+
+def main():
+    from rl_store import Store, STORE_PATH   # rl_store imports this module
+    timings = Timings('rl_anomaly')
+    store = Store() if os.path.exists(STORE_PATH) else None
+    report = analyze(History(), store)
+    if store:
+        store.close()
+    with stage('write'):
+        set_outputs(outputs(report))
+        with open(ANOMALY_PATH, 'w') as f:
+            json.dump(report, f)
+    timings.report()
+
+    print(f"Mean: {report['mean']:.1f} | Std: {report['std']:.1f} | Anomalies: {len(report['anomalies'])} windows")
+    print(f"Anomaly hours: {[h % 24 for h, _, _ in report['anomalies']]}")
+    print(f"Offenders: {[o['user'] for o in report['offenders'][:5]]}")
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,181 @@
-import json, random, math, os
-
-random.seed(42)
+import argparse, os, time
+import numpy as np
+import rl_io
+from sp_timing import Timings, stage
 
 # Realistic 24-hour baseline (req/min) — peaks at business hours
 baseline = [8,5,4,3,3,4,12,28,45,52,48,55,62,58,54,48,45,42,38,30,24,18,14,10]
+# Day-of-week multiplier, Monday first — weekends are quiet
+weekly = [1.0,1.0,1.0,1.0,0.95,0.35,0.3]
+
+# Named demo personas and their share of the baseline
+personas = {
+    'alice@propowner.com':     0.25,
+    'bob@propowner.com':       0.20,
+    'charlie@plumbing.com':    0.15,
+    'diana@electric.com':      0.12,
+    'api_bot@proptracker.com': 0.10,
+}
+
+# Attack patterns: (start hour, hours, req/min low, req/min high) on the final day
+patterns = {
+    'burst':   (14, 4, 280, 450),   # scripted bot, sustained 4-hour burst
+    'lowslow': (0, 24, 20, 35),     # stays just above a normal user all day
+    'spiky':   (9, 8, 0, 900),      # short random spikes through business hours
+}
 
-users = {
-    'alice@propowner.com':     [max(0,int(b*0.25+random.gauss(0,2))) for b in baseline],
-    'bob@propowner.com':       [max(0,int(b*0.20+random.gauss(0,1))) for b in baseline],
-    'charlie@plumbing.com':    [max(0,int(b*0.15+random.gauss(0,1))) for b in baseline],
-    'diana@electric.com':      [max(0,int(b*0.12+random.gauss(0,1))) for b in baseline],
-    'api_bot@proptracker.com': [max(0,int(b*0.10+random.gauss(0,1))) for b in baseline],
-    'unknown@attacker.io':     [random.randint(280,450) if 14<=h<=17 else random.randint(0,2) for h in range(24)],
+# Endpoint mix: (typical share of a user's requests, attacker share)
+routes = {
+    'POST /api/jobs/:id/bids': (0.10, 0.90),
+    'GET /api/properties':     (0.35, 0.00),
+    'GET /api/jobs':           (0.30, 0.00),
+    'GET /api/contractors':    (0.20, 0.00),
+    'POST /api/auth/login':    (0.05, 0.10),
 }
 
-total = [sum(users[u][h] for u in users) for h in range(24)]
-atk_total = sum(users['unknown@attacker.io'])
+CHUNK = 1 << 24   # cells (users × buckets) generated per vectorized pass — bounds scratch memory
+
+def population(n_users=0, attackers=1):
+    """Row names in matrix order: personas, synthetic users, attackers — and the attackers alone."""
+    atk_names = [f'unknown{i or ""}@attacker.io' for i in range(attackers)]
+    return list(personas) + [f'user{i:06d}@tenant.example' for i in range(n_users)] + atk_names, atk_names
+
+def generate(n_users=0, days=1, step=60, seed=42, attackers=1, pattern='burst', end=None, out=None):
+    """Builds a users × time matrix of request counts per `step`-second bucket.
+
+    Rows are the named personas, then `n_users` synthetic users with log-normal activity,
+    then the attackers. Every user follows the diurnal × weekly profile with Poisson noise,
+    so the same seed always produces the same matrix. `out` may be any writable
+    (users, buckets) array, e.g. a memory map, to avoid holding the result in RAM.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or last_midnight()
+    buckets = days * 86400 // step
+    start = end - buckets * step
+    t = start + np.arange(buckets, dtype=np.int64) * step
+
+    # Aggregate expected requests per bucket: interpolated diurnal curve × weekday factor
+    hour = (t % 86400) / 3600
+    diurnal = np.interp(hour, np.arange(25), baseline + baseline[:1])
+    dow = (t // 86400 + 3) % 7   # 1970-01-01 was a Thursday
+    profile = (diurnal * np.asarray(weekly)[dow] * step / 60).astype(np.float32)
+
+    names, atk_names = population(n_users, attackers)
+    shares = list(personas.values())
+    if n_users:
+        w = rng.lognormal(0.0, 1.0, n_users)
+        shares += list(w / w.sum())   # the synthetic population adds one baseline's worth of traffic
+
+    dtype = np.uint16 if step <= 60 else np.uint32
+    counts = out if out is not None else np.empty((len(names), buckets), dtype)
+    weights = np.asarray(shares, np.float32)
+    rows = max(1, CHUNK // buckets)
+    for lo in range(0, len(weights), rows):
+        lam = weights[lo:lo + rows, None] * profile[None, :]
+        counts[lo:lo + len(lam)] = rng.poisson(lam)
+
+    # Attackers: near-silent, then the pattern's window on the final day
+    h0, hours, r_lo, r_hi = patterns[pattern]
+    per = step / 60
+    a0 = len(names) - attackers
+    counts[a0:] = rng.integers(0, 3, (attackers, buckets)) * per
+    w0 = buckets - 86400 // step + h0 * 3600 // step
+    w1 = min(buckets, w0 + hours * 3600 // step)
+    window = rng.uniform(r_lo, r_hi, (attackers, w1 - w0)) * per
+    if pattern == 'spiky':
+        window *= rng.random((attackers, w1 - w0)) < 0.15
+    counts[a0:, w0:w1] = window.astype(counts.dtype)
+    return {'start': start, 'step': step, 'users': names, 'attackers': atk_names, 'counts': counts}
+
+def by_endpoint(counts, attackers=1, seed=42):
+    """Splits every user's traffic across `routes` → (endpoints × buckets, users × endpoints) counts.
+
+    Each user gets a Dirichlet-jittered version of the typical mix; attackers use the attack mix.
+    """
+    rng = np.random.default_rng(seed + 1)
+    typical, attack = (np.asarray(s, np.float64) for s in zip(*routes.values()))
+    n = counts.shape[0]
+    mix = rng.dirichlet(typical * 20, n)
+    if attackers:
+        mix[n - attackers:] = attack
+    ec = np.zeros((len(routes), counts.shape[1]))
+    ue = np.empty((n, len(routes)))
+    rows = max(1, CHUNK // counts.shape[1])
+    for lo in range(0, n, rows):
+        c = np.asarray(counts[lo:lo + rows], np.float64)
+        ec += mix[lo:lo + rows].T @ c
+        ue[lo:lo + rows] = mix[lo:lo + rows] * c.sum(axis=1)[:, None]
+    return np.rint(ec), np.rint(ue)
+
+def last_midnight():
+    return int(time.time()) // 86400 * 86400   # history ends at 00:00 UTC, so bucket 0 is 00:00
+
+def hourly(series, step):
+    """Per-bucket request counts → mean req/min for each hour."""
+    per_hour = 3600 // step
+    s = np.asarray(series, np.float64)
+    return s[:len(s) // per_hour * per_hour].reshape(-1, per_hour).sum(axis=1) / 60
+
+def options(argv=None):
+    """Simulation options from the command line, defaulting to the RL_* environment."""
+    ap = argparse.ArgumentParser(description='Simulate API request history')
+    ap.add_argument('--users', type=int, default=int(os.environ.get('RL_USERS', 0)), help='synthetic users on top of the personas')
+    ap.add_argument('--days', type=int, default=int(os.environ.get('RL_DAYS', 1)))
+    ap.add_argument('--step', type=int, default=int(os.environ.get('RL_STEP', 60)), help='bucket size in seconds')
+    ap.add_argument('--attackers', type=int, default=int(os.environ.get('RL_ATTACKERS', 1)))
+    ap.add_argument('--pattern', default=os.environ.get('RL_PATTERN', 'burst'), choices=sorted(patterns))
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--end', type=int, default=int(os.environ.get('RL_END', 0)) or last_midnight(),
+                    help='end of the history in epoch seconds, at 00:00 UTC (default: the last midnight)')
+    ap.add_argument('--out', default=rl_io.HISTORY_PATH, help='history file (export as JSON with rl_io.py export)')
+    args = ap.parse_args(argv)
+    if args.end % 86400:
+        ap.error(f"--end must fall on 00:00 UTC, not {args.end}")
+    return args
+
+def simulate(users=0, days=1, step=60, attackers=1, pattern='burst', seed=42, out=rl_io.HISTORY_PATH, end=None):
+    """Generates a history file ending at `end` (the last midnight if None) and returns it opened —
+    the same seed and end always give the same history."""
+    # Generate straight into the memory-mapped history file — the matrix never has to fit in RAM
+    names, atk_names = population(users, attackers)
+    buckets = days * 86400 // step
+    end = end or last_midnight()
+    maps = rl_io.create(out, {'counts': ((len(names), buckets), np.uint16 if step <= 60 else np.uint32),
+                              'total': ((buckets,), np.int64),
+                              'endpoint_counts': ((len(routes), buckets), np.uint32),
+                              'user_endpoint': ((len(names), len(routes)), np.uint32)},
+                        users=names, attackers=atk_names, endpoints=list(routes),
+                        start=end - buckets * step, step=step)
+    counts, total = maps['counts'], maps['total']
+    with stage('generate'):
+        generate(users, days, step, seed, attackers, pattern, end=end, out=counts)
+        total[:] = counts.sum(axis=0, dtype=np.int64)
+    with stage('endpoints'):
+        maps['endpoint_counts'][:], maps['user_endpoint'][:] = by_endpoint(counts, attackers, seed)
+    for m in maps.values(): m.flush()
+    print(f"Simulated {len(names)} users × {buckets} buckets of {step}s")
+    return rl_io.History(out)
 
-out = os.environ.get('GITHUB_OUTPUT','/tmp/gho.txt')
-with open(out,'a') as f:
-    f.write(f"peak_hour={total.index(max(total))}\n")
-    f.write(f"peak_requests={max(total)}\n")
-    f.write(f"attacker_total={atk_total}\n")
+def outputs(data):
+    """Peak hour / volume and the labelled attackers' total of the last 24h, as step outputs."""
+    total_h = hourly(data.total, data.step)
+    last = total_h[-24:]
+    peak_hour = (data.start // 3600 + len(total_h) - len(last) + int(last.argmax())) % 24
+    attackers = set(data.meta.get('attackers') or [])
+    rows = [i for i, u in enumerate(data.users) if u in attackers]
+    day = max(0, data.counts.shape[1] - 86400 // data.step)
+    atk_total = int(np.asarray(data.counts[rows, day:]).sum(dtype=np.int64)) if rows else 0
+    return {'peak_hour': peak_hour, 'peak_requests': int(last.max()), 'attacker_total': atk_total}
 
-with open('/tmp/history.json','w') as f:
-    json.dump({'total':total,'users':users,'baseline':baseline},f)
+def main():
+    args = options()
+    timings = Timings('rl_history')
+    data = simulate(args.users, args.days, args.step, args.attackers, args.pattern, args.seed, args.out, args.end)
+    values = outputs(data)
+    rl_io.set_outputs(values)
+    print(f"Peak: {values['peak_requests']} req/min at {values['peak_hour']}:00")
+    print(f"Attacker total: {values['attacker_total']} requests across the last 24h")
+    timings.report()
 
-print(f"Peak: {max(total)} req/min at {total.index(max(total))}:00")
-print(f"Attacker total: {atk_total} requests across 24h")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import argparse, calendar, datetime, glob, gzip, json, re, sys
+import numpy as np
+import rl_io
+from sp_timing import Timings, stage
+from rl_history import outputs
+from sp_latency import endpoint
+
+# nginx "combined" — also what Express/morgan writes for its 'combined' format
+COMBINED = re.compile(rb'(\S+) \S+ (\S+) \[([^\]]+)\] "(\S+) (\S+)[^"]*" (\d{3})')
+MONTHS = {m.encode(): i for i, m in enumerate(calendar.month_abbr) if m}
+
+BATCH = 1 << 20   # lines between merges of the running aggregate
+USER_BITS, EP_BITS, T_BITS = 24, 12, 28   # packed into one uint64 key per (user, endpoint, bucket)
+T_BIAS = 1 << (T_BITS - 1)
+
+class Interner:
+    def __init__(self):
+        self.ids, self.names = {}, []
+
+    def __call__(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+class Aggregator:
+    """Single-pass (user, endpoint, bucket) → count aggregation with memory bounded by distinct keys.
+
+    Parsed lines are buffered as packed uint64 keys; every BATCH lines the buffer alone is
+    np.unique'd and merged into the sorted unique-key/count pair with searchsorted, so memory
+    tracks the output size, not the log size, and a merge costs O(batch log batch + keys).
+    """
+
+    def __init__(self, step):
+        self.step = step
+        self.users, self.endpoints = Interner(), Interner()
+        self.keys, self.counts = np.empty(0, np.uint64), np.empty(0, np.int64)
+        self._buf, self._origin = [], None
+        self.lines = self.skipped = 0
+
+    def add(self, user, ep, ts):
+        b = int(ts) // self.step
+        if self._origin is None:
+            self._origin = b
+        u, e = self.users(user), self.endpoints(ep)
+        if u >> USER_BITS or e >> EP_BITS:
+            raise ValueError(f"more than {1 << USER_BITS} users or {1 << EP_BITS} endpoints")
+        self._buf.append((u << (EP_BITS + T_BITS)) | (e << T_BITS) | (b - self._origin + T_BIAS))
+        self.lines += 1
+        if len(self._buf) >= BATCH:
+            self.flush()
+
+    def flush(self):
+        if not self._buf:
+            return
+        keys, inverse = np.unique(np.fromiter(self._buf, np.uint64, len(self._buf)), return_inverse=True)
+        counts = np.bincount(inverse.ravel(), minlength=len(keys)).astype(np.int64)
+        self._buf = []
+        pos = np.searchsorted(self.keys, keys)
+        seen = pos < len(self.keys)
+        seen[seen] = self.keys[pos[seen]] == keys[seen]
+        self.counts[pos[seen]] += counts[seen]
+        self.keys = np.insert(self.keys, pos[~seen], keys[~seen])
+        self.counts = np.insert(self.counts, pos[~seen], counts[~seen])
+
+    def decode(self):
+        """(user ids, endpoint ids, bucket numbers relative to the first one, counts) of the aggregate."""
+        self.flush()
+        k = self.keys
+        u = (k >> np.uint64(EP_BITS + T_BITS)).astype(np.int64)
+        e = ((k >> np.uint64(T_BITS)) & np.uint64((1 << EP_BITS) - 1)).astype(np.int64)
+        b = (k & np.uint64((1 << T_BITS) - 1)).astype(np.int64) - T_BIAS + self._origin
+        return u, e, b, self.counts
+
+_minute_cache = {}
+
+def combined_time(raw):
+    """`10/Oct/2026:13:55:36 -0700` → epoch seconds; the minute part is cached since logs are time-ordered."""
+    key = raw[:17] + raw[20:]
+    base = _minute_cache.get(key)
+    if base is None:
+        if len(_minute_cache) > 4096: _minute_cache.clear()
+        day, mon, year = int(raw[0:2]), MONTHS[raw[3:6]], int(raw[7:11])
+        hh, mm, tz = int(raw[12:14]), int(raw[15:17]), raw[21:]
+        off = (int(tz[1:3]) * 3600 + int(tz[3:5]) * 60) * (-1 if tz[:1] == b'-' else 1)
+        base = _minute_cache[key] = calendar.timegm((year, mon, day, hh, mm, 0)) - off
+    return base + int(raw[18:20])
+
+def json_time(v):
+    if isinstance(v, (int, float)):
+        return v / 1000 if v > 1e11 else v   # epoch milliseconds or seconds
+    return datetime.datetime.fromisoformat(v.replace('Z', '+00:00')).timestamp()
+
+def parse_combined(line):
+    m = COMBINED.match(line)
+    if not m:
+        return None
+    ip, user, ts, method, path = m.group(1, 2, 3, 4, 5)
+    who = (user if user != b'-' else ip).decode(errors='replace')
+    return who, endpoint(method.decode(), path.decode(errors='replace')), combined_time(ts)
+
+def parse_jsonl(line):
+    try:
+        d = json.loads(line)
+        who = d.get('user') or d.get('userId') or d.get('user_id') or d.get('email') or d.get('ip')
+        ts = d.get('time') or d.get('timestamp') or d.get('ts')
+        path = d.get('path') or d.get('url')
+        if not (who and ts and path):
+            return None
+        return str(who), endpoint(d.get('method', 'GET'), path), json_time(ts)
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+def open_log(path):
+    if path == '-':
+        return sys.stdin.buffer
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb', buffering=1 << 20)
+
+def ingest(paths, step=60):
+    agg = Aggregator(step)
+    for path in paths:
+        with open_log(path) as f:
+            parse = None
+            for line in f:
+                if parse is None:   # sniff the format from the first non-blank line of each file
+                    if not line.strip(): continue
+                    parse = parse_jsonl if line.lstrip().startswith(b'{') else parse_combined
+                rec = parse(line)
+                if rec is None:
+                    agg.skipped += 1
+                    continue
+                agg.add(*rec)
+    return agg
+
+def check_step(step):
+    """Why `step` can't be a bucket size, or None — buckets must tile minutes and hours exactly."""
+    if step <= 0 or step % 60 or 3600 % step:
+        return f"step must be a multiple of 60 that divides 3600, not {step}"
+    return None
+
+def build(logs, step=60, out=rl_io.HISTORY_PATH):
+    """Aggregates `logs` (paths or globs) into a history file and returns it opened.
+
+    Raises ValueError for a bad step or when no line could be parsed."""
+    if check_step(step):
+        raise ValueError(check_step(step))
+    paths = [p for pattern in logs for p in (sorted(glob.glob(pattern)) or [pattern])]
+    with stage('parse'):
+        agg = ingest(paths, step)
+        if not agg.lines:
+            raise ValueError(f"No parseable request lines in {', '.join(paths)}")
+        u, e, b, c = agg.decode()
+
+    # Align to whole hours so hourly roll-ups and hour-of-day labels line up
+    per_hour = 3600 // step
+    b0 = b.min() // per_hour * per_hour
+    buckets = -(-(b.max() + 1 - b0) // per_hour) * per_hour
+    b -= b0
+    n_u, n_e = len(agg.users.names), len(agg.endpoints.names)
+    # Max per-user bucket count, summed over the (user, bucket) pairs that occur rather than a dense users × buckets array
+    _, cell = np.unique(u.astype(np.int64) * buckets + b, return_inverse=True)
+    peak = np.bincount(cell.ravel(), c).max() if len(c) else 0
+    maps = rl_io.create(out, {
+        'counts': ((n_u, buckets), np.uint16 if peak < 1 << 16 else np.uint32),
+        'total': ((buckets,), np.int64),
+        'endpoint_counts': ((n_e, buckets), np.uint32),
+        'user_endpoint': ((n_u, n_e), np.uint32),
+    }, users=agg.users.names, attackers=[], endpoints=agg.endpoints.names,
+       start=int(b0 * step), step=step, source='access-log')
+    with stage('write'):
+        np.add.at(maps['counts'], (u, b), c)
+        maps['total'][:] = np.bincount(b, c, buckets)
+        np.add.at(maps['endpoint_counts'], (e, b), c)
+        np.add.at(maps['user_endpoint'], (u, e), c)
+        for m in maps.values(): m.flush()
+
+    print(f"Ingested {agg.lines:,} requests ({agg.skipped:,} unparseable lines skipped): "
+          f"{n_u:,} users × {n_e} endpoints × {buckets} buckets of {step}s")
+    return rl_io.History(out)
+
+def main():
+    ap = argparse.ArgumentParser(description='Aggregate API access logs into a rate-limit history file')
+    ap.add_argument('logs', nargs='+', help="nginx/Express combined or JSONL logs (.gz ok, globs ok, '-' = stdin)")
+    ap.add_argument('--step', type=int, default=60, help='bucket size in seconds (a multiple of 60 dividing 3600)')
+    ap.add_argument('--out', default=rl_io.HISTORY_PATH)
+    args = ap.parse_args()
+    if check_step(args.step):
+        ap.error(f"--{check_step(args.step)}")
+    timings = Timings('rl_ingest')
+    try:
+        values = outputs(build(args.logs, args.step, args.out))
+    except ValueError as e:
+        sys.exit(str(e))
+    rl_io.set_outputs(values)
+    print(f"Peak: {values['peak_requests']} req/min at {values['peak_hour']}:00")
+    timings.report()
+
+if __name__ == '__main__':
+    main()
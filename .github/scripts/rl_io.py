@@ -0,0 +1,96 @@
+import argparse, json, os, sys
+import numpy as np
+
+MAGIC = b'RLH1'
+ALIGN = 64
+HISTORY_PATH = os.environ.get('RL_HISTORY', '/tmp/history.rlh')
+
+# File layout:
+#   MAGIC | uint32 header length | JSON header | zero padding | array 0 | padding | array 1 …
+# The header holds the metadata (users, start, step, …) and, per named array, its dtype,
+# shape and byte offset. Every array starts on a 64-byte boundary in C order, so readers
+# np.memmap it in place — opening a multi-GB history costs one header parse, not a copy.
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+def _layout(arrays, meta):
+    specs = {name: {'dtype': np.dtype(dtype).str, 'shape': [int(n) for n in shape], 'offset': 0}
+             for name, (shape, dtype) in arrays.items()}
+    header = {**meta, 'arrays': specs}
+    data_start = -1
+    # Offsets live in the header, so its size depends on them — repeat until it stops moving
+    while True:
+        raw = json.dumps(header).encode()
+        if _align(len(MAGIC) + 4 + len(raw)) == data_start:
+            return header, raw, pos
+        data_start = pos = _align(len(MAGIC) + 4 + len(raw))
+        for spec in specs.values():
+            spec['offset'] = pos
+            pos += _align(int(np.prod(spec['shape'], dtype=np.int64)) * np.dtype(spec['dtype']).itemsize)
+
+def create(path, arrays, **meta):
+    """Allocates a history file and returns {name: writable memmap} for arrays = {name: (shape, dtype)}."""
+    header, raw, size = _layout(arrays, meta)
+    with open(path, 'wb') as f:
+        f.write(MAGIC + len(raw).to_bytes(4, 'little') + raw)
+        f.truncate(size)
+    return {name: np.memmap(path, spec['dtype'], 'r+', spec['offset'], tuple(spec['shape']))
+            for name, spec in header['arrays'].items()}
+
+def write(path, arrays, **meta):
+    """Writes in-memory arrays ({name: ndarray}) with metadata."""
+    maps = create(path, {k: (a.shape, a.dtype) for k, a in arrays.items()}, **meta)
+    for name, a in arrays.items():
+        maps[name][...] = a
+        maps[name].flush()
+
+class History:
+    """A read-only view of a history file — arrays are memory-mapped, metadata is attributes."""
+
+    def __init__(self, path=HISTORY_PATH):
+        with open(path, 'rb') as f:
+            if f.read(4) != MAGIC:
+                raise ValueError(f"{path} is not a history file")
+            n = int.from_bytes(f.read(4), 'little')
+            self.meta = json.loads(f.read(n))
+        self.path = path
+        self.arrays = {name: np.memmap(path, spec['dtype'], 'r', spec['offset'], tuple(spec['shape']))
+                       for name, spec in self.meta['arrays'].items()}
+
+    def __getattr__(self, name):
+        try:
+            return self.arrays[name] if name in self.arrays else self.meta[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def to_json(self):
+        """Plain-JSON form for debugging — lists for arrays, everything else as stored."""
+        meta = {k: v for k, v in self.meta.items() if k != 'arrays'}
+        return {**meta, **{name: np.asarray(a).tolist() for name, a in self.arrays.items()}}
+
+def set_outputs(values):
+    """Appends {name: value} as step outputs to GITHUB_OUTPUT; None is written as an empty value."""
+    with open(os.environ.get('GITHUB_OUTPUT','/tmp/gho.txt'), 'a') as f:
+        for k, v in values.items():
+            f.write(f"{k}={'' if v is None else v}\n")
+
+def main():
+    ap = argparse.ArgumentParser(description='Inspect or export a rate-limit history file')
+    ap.add_argument('command', choices=['info', 'export'])
+    ap.add_argument('path', nargs='?', default=HISTORY_PATH)
+    ap.add_argument('-o', '--out', help='export destination (default: stdout)')
+    args = ap.parse_args()
+
+    h = History(args.path)
+    if args.command == 'info':
+        for name, a in h.arrays.items():
+            print(f"{name:<16} {a.dtype} {'×'.join(map(str, a.shape))}")
+        print(f"users: {len(h.users)}  start: {h.start}  step: {h.step}s")
+        return
+    f = open(args.out, 'w') if args.out else sys.stdout
+    json.dump(h.to_json(), f)
+    if args.out: f.close()
+
+if __name__ == '__main__':
+    main()
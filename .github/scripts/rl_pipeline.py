@@ -0,0 +1,117 @@
+import argparse, json, os
+import rl_anomaly, rl_history, rl_ingest, rl_replay, rl_summary, sp_ratelimit
+from rl_io import History, HISTORY_PATH, set_outputs
+from rl_store import Store, append_history
+from sp_timing import Timings
+
+STAGES = ('history', 'anomaly', 'store', 'replay', 'probe', 'summary')
+# Stage → (artifact file, result when no earlier run left one)
+ARTIFACTS = {
+    'anomaly': (rl_anomaly.ANOMALY_PATH, None),
+    'replay':  (rl_replay.REPLAY_PATH, {'recommended': [], 'strict': []}),
+    'probe':   (sp_ratelimit.MEASURE_PATH, {'rate_limited': False, 'accepted': 0}),
+}
+
+class Pipeline:
+    """Runs the rate-limit stages in one process, handing each stage's result to the next in memory.
+
+    A stage that isn't part of this run gets its input from the artifact an earlier run
+    left on disk instead, so any stage can be run — and timed — alone. Every stage still
+    appends its step outputs to GITHUB_OUTPUT and, unless disabled, writes its artifact.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.results = {}
+        self.timings = Timings('rl_pipeline')
+
+    def __getitem__(self, stage):
+        if stage not in self.results:
+            self.results[stage] = self.load(stage)
+        return self.results[stage]
+
+    def load(self, stage):
+        if stage == 'history':
+            return History(self.args.history)
+        path, default = ARTIFACTS[stage]
+        if not os.path.exists(path):
+            if default is None:
+                raise SystemExit(f"{path} not found — run the {stage} stage first")
+            return default
+        with open(path) as f:
+            return json.load(f)
+
+    def run(self, stage):
+        with self.timings.stage(stage):
+            self.results[stage] = getattr(self, stage)()
+            if self.args.artifacts and stage in ARTIFACTS:
+                with self.timings.stage('write'), open(ARTIFACTS[stage][0], 'w') as f:
+                    json.dump(self.results[stage], f)
+
+    def history(self):
+        sim = rl_history.options([])
+        if self.args.logs:
+            try:
+                data = rl_ingest.build(self.args.logs.split(), sim.step, self.args.history)
+            except ValueError as e:
+                raise SystemExit(str(e))
+        else:
+            data = rl_history.simulate(sim.users, sim.days, sim.step, sim.attackers, sim.pattern, sim.seed,
+                                       self.args.history, sim.end)
+        set_outputs(rl_history.outputs(data))
+        return data
+
+    def anomaly(self):
+        store = Store()
+        report = rl_anomaly.analyze(self['history'], store)
+        store.close()
+        set_outputs(rl_anomaly.outputs(report))
+        return report
+
+    def store(self):
+        store = Store()
+        added = append_history(store, self['history'], self['anomaly'])
+        store.close()
+        return added
+
+    def replay(self):
+        report = rl_replay.run(self['history'], self['anomaly'])
+        set_outputs(rl_replay.outputs(report))
+        return report
+
+    def probe(self):
+        result = sp_ratelimit.probe(self.args.api, self.args.identity, self.args.max_requests, self.args.deadline)
+        set_outputs(sp_ratelimit.outputs(result))
+        return result
+
+    def summary(self):
+        data = self['history']
+        return rl_summary.write_summary(data, rl_history.outputs(data), self['anomaly'], self['replay'], self['probe'])
+
+def main():
+    ap = argparse.ArgumentParser(description='Run the rate-limit analysis stages in one process')
+    ap.add_argument('--stage', action='append', choices=STAGES, help='run only this stage (repeatable); the others load their artifacts')
+    ap.add_argument('--skip', action='append', choices=STAGES, default=[], help='leave this stage out (repeatable)')
+    ap.add_argument('--logs', default=os.environ.get('RL_ACCESS_LOG', ''), help='access logs to ingest instead of simulating')
+    ap.add_argument('--history', default=HISTORY_PATH)
+    ap.add_argument('--api', default=os.environ.get('API_URL', 'http://localhost:3001'))
+    ap.add_argument('--identity', default='charlie@plumbing.com')
+    ap.add_argument('--max-requests', type=int, default=200)
+    ap.add_argument('--deadline', type=float, default=240)
+    ap.add_argument('--no-artifacts', dest='artifacts', action='store_false', help="don't write /tmp/*.json artifacts")
+    args = ap.parse_args()
+
+    pipeline = Pipeline(args)
+    for stage in STAGES:
+        if stage in (args.stage or STAGES) and stage not in args.skip:
+            print(f"── {stage}")
+            pipeline.run(stage)
+
+    result = pipeline.timings.report()
+    print(f"\n{'stage':<24} {'seconds':>8} {'rss MB':>8}")
+    for s in result['stages']:
+        print(f"{'  ' * s['stage'].count('/') + s['stage'].rsplit('/', 1)[-1]:<24} {s['seconds']:>8.2f} {s['rss_mb'] or '':>8}")
+    print(f"{'total':<24} {result['seconds']:>8.2f} {result['rss_mb']:>8}")
+
+if __name__ == '__main__':
+    main()
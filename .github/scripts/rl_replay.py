@@ -0,0 +1,207 @@
+import argparse, json, os
+import numpy as np
+from rl_anomaly import ANOMALY_PATH
+from rl_io import History, HISTORY_PATH, set_outputs
+from sp_timing import Timings, stage
+
+DAYS       = int(os.environ.get('RL_REPLAY_DAYS', 28))      # most recent history replayed
+SAMPLE     = int(os.environ.get('RL_REPLAY_USERS', 500))    # legitimate users replayed (all attackers are)
+FP_BUDGET  = float(os.environ.get('RL_FP_BUDGET', 1.0))     # % of legitimate users (and of their requests) allowed a 429
+STRICT_FP  = float(os.environ.get('RL_STRICT_FP', 5.0))     # the same budget for the strict tier
+WINDOWS    = (5, 15)   # sliding-window lengths, in minutes
+BURSTS     = (1, 5)    # token-bucket capacity, in minutes' worth of the rate
+N_LIMITS   = 60        # candidate req/min limits per algorithm and parameter
+CHUNK      = 1 << 24   # cells read per pass when totalling memory-mapped rows — bounds scratch memory
+REPLAY_PATH = os.environ.get('RL_REPLAY', '/tmp/replay.json')
+
+def excess(x, limits, w):
+    """Σ w·max(0, x − L) over the rows of `x` (row weights `w`) for every L in `limits` at once,
+    via sorted suffix sums."""
+    x, w = np.ravel(x), np.broadcast_to(w[:, None], x.shape).ravel()
+    order = np.argsort(x, kind='stable')
+    x, w = x[order], w[order]
+    wx = np.concatenate([np.cumsum((w * x)[::-1])[::-1], [0.0]])
+    ws = np.concatenate([np.cumsum(w[::-1])[::-1], [0.0]])
+    i = np.searchsorted(x, limits, 'right')
+    return wx[i] - limits * ws[i]
+
+def exceeded(x, limits, w):
+    """Weighted share of rows of `x` whose maximum is over each limit (none when there are no rows)."""
+    total = w.sum()
+    if not x.size or not total:
+        return np.zeros(len(limits))
+    peak = x.max(axis=1)
+    return np.array([w[peak > L].sum() for L in limits]) / total
+
+def _evaluate(algo, param, limits, blocked, users_hit, legit, attack):
+    """blocked: (2, K) requests blocked for legit / attack rows; users_hit: (K,) share of legit users blocked."""
+    return [{'algorithm': algo, 'param': param, 'limit': float(L),
+             'fp_users': round(float(u) * 100, 2),
+             'fp_requests': round(float(b[0] / max(legit, 1)) * 100, 3),
+             'attack_blocked': round(float(b[1] / attack) * 100, 1) if attack else None}
+            for L, b, u in zip(limits, blocked.T, users_hit)]
+
+def fixed_window(c, atk, wt, limits, per_min):
+    """Fixed one-minute windows — exact: whatever exceeds the limit inside a window is rejected."""
+    w = max(1, round(per_min))
+    n = c.shape[1] // w * w
+    s = c[:, :n].reshape(len(c), -1, w).sum(axis=2)
+    cap = limits * w / per_min
+    blocked = np.stack([excess(s[m], cap, wt[m]) for m in (~atk, atk)])
+    return blocked, exceeded(s[~atk], cap, wt[~atk])
+
+def sliding_window(c, atk, wt, limits, per_min, minutes):
+    """Sliding `minutes` window counting every attempt (rejected ones too, as a sliding log does).
+
+    A bucket is rejected by however much its arrival pushes the window over the cap:
+    clip(R_t − cap, 0, c_t) = max(0, R_t − cap) − max(0, R_t − c_t − cap).
+    """
+    w = max(1, round(minutes * per_min))
+    cs = np.cumsum(c, axis=1)
+    r = cs - np.concatenate([np.zeros((len(c), w)), cs[:, :-w]], axis=1)[:, :c.shape[1]]
+    cap = limits * minutes
+    blocked = np.stack([excess(r[m], cap, wt[m]) - excess((r - c)[m], cap, wt[m]) for m in (~atk, atk)])
+    return blocked, exceeded(r[~atk], cap, wt[~atk])
+
+def token_bucket(c, atk, wt, limits, per_min, burst):
+    """Token bucket refilling at the limit with `burst` minutes of capacity, replayed bucket by bucket
+    for every user and every candidate limit at once.
+
+    The bucket state depends on the previous bucket, so this is a Python loop over buckets doing
+    O(limits × users) work each — the slowest replay by far (≈40k iterations for 28 days of
+    minutes). Buckets where no sampled user sent anything only refill, so a run of them is
+    folded into one step: min(cap, t + r) applied k times is min(cap, t + k·r).
+    """
+    rate = (limits / per_min)[:, None]
+    cap = limits[:, None] * burst
+    tokens = np.repeat(cap, len(c), axis=1)
+    dropped = np.zeros_like(tokens)
+    busy = np.flatnonzero(c.any(axis=0))
+    for i, gap in zip(busy, np.diff(busy, prepend=-1)):
+        col = c[:, i]
+        tokens = np.minimum(cap, tokens + rate * gap)
+        admitted = np.minimum(col, np.floor(tokens))
+        tokens -= admitted
+        dropped += col - admitted
+    blocked = dropped @ np.stack([wt * ~atk, wt * atk], axis=1)
+    hit = (dropped[:, ~atk] > 0) @ wt[~atk] / wt[~atk].sum() if (~atk).any() else np.zeros(len(limits))
+    return blocked.T, hit
+
+def replay(counts, attack, step, weights=None, limits=None):
+    """Replays users × buckets `counts` through every limiter configuration.
+
+    `attack` marks attacker rows; `weights` is how many users each row stands for when
+    the rows are a sample. Returns one row per (algorithm, parameter, limit) with the %
+    of legitimate users ever rejected, % of legitimate requests rejected and % of
+    attack requests rejected.
+    """
+    c = np.asarray(counts, np.float64)
+    atk = np.asarray(attack, bool)
+    wt = np.ones(len(c)) if weights is None else np.asarray(weights, np.float64)
+    per_min = 60 / step   # buckets per minute (< 1 for coarse histories)
+    if limits is None:
+        top = max(10.0, float(c[~atk].max(initial=0)) * per_min * 2)
+        limits = np.unique(np.round(np.geomspace(1, top, N_LIMITS)))
+    per_row = c.sum(axis=1) * wt
+    legit, total_atk = per_row[~atk].sum(), per_row[atk].sum()
+    with stage('fixed_window'):
+        rows = _evaluate('fixed_window', 1, limits, *fixed_window(c, atk, wt, limits, per_min), legit, total_atk)
+    for m in WINDOWS:
+        with stage('sliding_window'):
+            rows += _evaluate('sliding_window', m, limits, *sliding_window(c, atk, wt, limits, per_min, m), legit, total_atk)
+    for b in BURSTS:
+        with stage('token_bucket'):
+            rows += _evaluate('token_bucket', b, limits, *token_bucket(c, atk, wt, limits, per_min, b), legit, total_atk)
+    return rows
+
+def recommend(rows, budget):
+    """Per algorithm, the configuration blocking the most attack traffic while rejecting at most
+    `budget` % of legitimate users and of legitimate requests; best overall first."""
+    best = {}
+    for r in rows:
+        if r['fp_users'] > budget or r['fp_requests'] > budget: continue
+        key = (r['attack_blocked'] or 0, -r['fp_requests'], -r['limit'])
+        if r['algorithm'] not in best or key > best[r['algorithm']][0]:
+            best[r['algorithm']] = (key, r)
+    return [r for _, r in sorted(best.values(), key=lambda kr: kr[0], reverse=True)]
+
+def volumes(counts, lo):
+    """Σ counts[:, lo:] per row, read a contiguous block of rows at a time — fancy-indexing a
+    memory-mapped matrix would copy every selected row into RAM at once."""
+    out = np.empty(counts.shape[0], np.int64)
+    batch = max(1, CHUNK // max(1, counts.shape[1] - lo))
+    for r in range(0, len(out), batch):
+        out[r:r + batch] = np.asarray(counts[r:r + batch, lo:]).sum(axis=1, dtype=np.int64)
+    return out
+
+def sample(data, labels, days=DAYS, n=SAMPLE, seed=0):
+    """Rows to replay over the last `days`: every attacker and at most `n` legitimate users.
+
+    The busiest half of the sample is taken outright — they are the users a limit
+    would hit — and the rest is drawn at random from everyone else, weighted up to
+    stand for them. Returns (counts, attack mask, weights).
+    """
+    lo = max(0, data.counts.shape[1] - days * 86400 // data.step)
+    attackers = np.array([i for i, u in enumerate(data.users) if u in labels], dtype=np.int64)
+    legit = np.setdiff1d(np.arange(len(data.users)), attackers)
+    weights = np.ones(len(legit))
+    if len(legit) > n:
+        volume = volumes(data.counts, lo)[legit]
+        order = np.argsort(-volume, kind='stable')
+        heavy, rest = legit[order[:n // 2]], legit[order[n // 2:]]
+        drawn = np.sort(np.random.default_rng(seed).choice(rest, n - len(heavy), replace=False))
+        legit = np.concatenate([heavy, drawn])
+        weights = np.concatenate([np.ones(len(heavy)), np.full(len(drawn), len(rest) / len(drawn))])
+    rows = np.concatenate([legit, attackers])
+    return (np.asarray(data.counts[rows, lo:]), np.arange(len(rows)) >= len(legit),
+            np.concatenate([weights, np.ones(len(attackers))]))
+
+def run(data, anomaly=None):
+    """Replays `data` and recommends limits → the replay.json report. Attack traffic is the history's
+    labelled attackers, or the offenders of the `anomaly` report when it has none."""
+    labels = set(data.meta.get('attackers') or []) or {o['user'] for o in (anomaly or {}).get('offenders', [])}
+    with stage('sample'):
+        counts, attack, weights = sample(data, labels)
+    with stage('replay'):
+        rows = replay(counts, attack, data.step, weights)
+    print(f"Replayed {len(attack)} users ({int(attack.sum())} attackers) × {counts.shape[1]} buckets "
+          f"through {len(rows)} limiter configurations")
+    return {'users': int(len(attack)), 'attackers': int(attack.sum()), 'buckets': int(counts.shape[1]),
+            'fp_budget': FP_BUDGET, 'strict_fp': STRICT_FP,
+            'recommended': recommend(rows, FP_BUDGET), 'strict': recommend(rows, STRICT_FP), 'results': rows}
+
+def outputs(report):
+    rec, strict = report['recommended'], report['strict']
+    values = {}
+    if rec:
+        values.update(recommended_limit=f"{rec[0]['limit']:.0f}", recommended_algorithm=rec[0]['algorithm'],
+                      recommended_param=rec[0]['param'], attack_blocked=rec[0]['attack_blocked'] or 0)
+    if strict:
+        values['strict_limit'] = f"{strict[0]['limit']:.0f}"
+    return values
+
+def main():
+    ap = argparse.ArgumentParser(description='Replay recorded traffic through candidate rate limiters')
+    ap.add_argument('path', nargs='?', default=HISTORY_PATH)
+    ap.add_argument('--anomalies', default=ANOMALY_PATH, help='offenders label attack traffic when the history has no attackers')
+    ap.add_argument('--out', default=REPLAY_PATH)
+    args = ap.parse_args()
+
+    timings = Timings('rl_replay')
+    anomaly = None
+    if os.path.exists(args.anomalies):
+        with open(args.anomalies) as f:
+            anomaly = json.load(f)
+    report = run(History(args.path), anomaly)
+    with stage('write'):
+        with open(args.out, 'w') as f:
+            json.dump(report, f)
+        set_outputs(outputs(report))
+
+    for r in report['recommended']:
+        print(f"  {r['algorithm']:<15} param={r['param']:<3} limit={r['limit']:.0f} req/min  "
+              f"FP users {r['fp_users']}%  attack blocked {r['attack_blocked']}%")
+    timings.report()
+
+if __name__ == '__main__':
+    main()
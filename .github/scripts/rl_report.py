@@ -0,0 +1,86 @@
+import hashlib, json, os, shutil
+from string import Template
+
+REPORT_DIR = os.environ.get('RL_REPORT_DIR', '/tmp/rl_state/report')
+TOP_N      = int(os.environ.get('RL_REPORT_TOP', 25))      # table rows shown inline
+PAGE_SIZE  = int(os.environ.get('RL_REPORT_PAGE', 500))    # rows per overflow page
+
+class Tee:
+    """File-like that writes to several files at once — the step summary and the render cache."""
+
+    def __init__(self, *files):
+        self.files = files
+
+    def write(self, s):
+        for f in self.files:
+            f.write(s)
+
+class Report:
+    """Markdown report built from precompiled string.Template sections.
+
+    Sections are compiled once at import and written one at a time (tables row by
+    row) to a stream, so the document never exists as one string. render() tees
+    the stream into a cache keyed by a hash of the inputs and the template source;
+    when neither changed since the last run, the cached copy is streamed instead.
+    """
+
+    def __init__(self, name, **sections):
+        self.name = name
+        self.sections = {k: Template(v) for k, v in sections.items()}
+        self.source = hashlib.sha256(json.dumps(sections, sort_keys=True).encode()).hexdigest()
+
+    def write(self, f, section, **values):
+        f.write(self.sections[section].substitute(values))
+
+    def rows(self, f, section, items):
+        tpl = self.sections[section]
+        for values in items:
+            f.write(tpl.substitute(values))
+
+    def fingerprint(self, inputs):
+        h = hashlib.sha256(self.source.encode())
+        h.update(json.dumps(inputs, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def render(self, dest, inputs, body, cache_dir=REPORT_DIR):
+        """Streams body(f, inputs) into `dest` (an open file). Returns False when the cached render was reused."""
+        os.makedirs(cache_dir, exist_ok=True)
+        cached = os.path.join(cache_dir, f'{self.name}.md')
+        stamp = cached + '.sha256'
+        key = self.fingerprint(inputs)
+        try:
+            with open(stamp) as f:
+                hit = f.read() == key and os.path.exists(cached)
+        except OSError:
+            hit = False
+        if hit:
+            with open(cached) as f:
+                shutil.copyfileobj(f, dest)
+            return False
+        with open(cached + '.tmp', 'w') as c:
+            body(Tee(dest, c), inputs)
+        os.replace(cached + '.tmp', cached)
+        with open(stamp, 'w') as f:
+            f.write(key)
+        return True
+
+def top(items, n=TOP_N):
+    """(first n items, number left over)."""
+    return items[:n], max(0, len(items) - n)
+
+def pages(report, section, header, items, prefix, size=PAGE_SIZE, cache_dir=REPORT_DIR):
+    """Writes `items` as numbered Markdown pages of `size` rows (header + row template each).
+    Returns the page file names; stale pages from a longer earlier run are removed."""
+    os.makedirs(cache_dir, exist_ok=True)
+    names = []
+    for i in range(0, len(items), size):
+        name = f'{prefix}-{i // size + 1:03d}.md'
+        with open(os.path.join(cache_dir, name), 'w') as f:
+            f.write(header)
+            report.rows(f, section, items[i:i + size])
+        names.append(name)
+    n = len(names) + 1
+    while os.path.exists(os.path.join(cache_dir, f'{prefix}-{n:03d}.md')):
+        os.remove(os.path.join(cache_dir, f'{prefix}-{n:03d}.md'))
+        n += 1
+    return names
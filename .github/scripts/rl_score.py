@@ -0,0 +1,158 @@
+import argparse, functools, json, os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from rl_io import History, HISTORY_PATH
+
+THRESHOLD = 3.5   # modified z-score (Iglewicz & Hoaglin) above which a row is an offender
+MAD_FLOOR = 0.1   # in log1p units, so a near-constant population doesn't turn noise into huge scores
+CHUNK = 1 << 24   # cells per vectorized pass — bounds scratch memory on memory-mapped inputs
+WORKERS = int(os.environ.get('RL_WORKERS', 0)) or os.cpu_count() or 1
+MIN_SHARD = 5000  # users per shard below which a process pool costs more than it saves
+FEATURES = ('peak', 'median', 'requests', 'peak_at')   # per-user rows of user_features()
+
+def window(rows, step, hours=24):
+    """Rows × buckets counts → rows × hours mean req/min over the last `hours`, and the index of its first hour."""
+    per_hour = 3600 // step
+    end = rows.shape[1] // per_hour * per_hour
+    lo = max(0, end - hours * per_hour)
+    n_h = (end - lo) // per_hour
+    out = np.empty((rows.shape[0], n_h), np.float32)
+    batch = max(1, CHUNK // max(1, end - lo))
+    for r in range(0, len(out), batch):
+        block = np.asarray(rows[r:r + batch, lo:end])
+        out[r:r + batch] = block.reshape(len(block), n_h, per_hour).sum(axis=2, dtype=np.int64) / 60
+    return out, lo // per_hour
+
+def robust_z(x, axis=None):
+    """Modified z-scores of log1p(x): 0.6745·(v − median) / MAD, over the whole array or along `axis`."""
+    v = np.log1p(x)
+    med = np.median(v, axis=axis, keepdims=axis is not None)
+    mad = np.median(np.abs(v - med), axis=axis, keepdims=axis is not None)
+    return 0.6745 * (v - med) / np.maximum(mad, MAD_FLOOR)
+
+def moments(x):
+    """(n, mean, M2) of x — the sufficient statistics merge() combines."""
+    x = np.asarray(x, np.float64)
+    mean = float(x.mean()) if len(x) else 0.0
+    return len(x), mean, float(((x - mean) ** 2).sum())
+
+def merge(a, b):
+    """Exact combination of two (n, mean, M2) triples (Chan et al.), so shards add up to one pass."""
+    na, ma, m2a = a
+    nb, mb, m2b = b
+    n = na + nb
+    if not n:
+        return a
+    d = mb - ma
+    return n, ma + d * nb / n, m2a + m2b + d * d * na * nb / n
+
+def _features(rows, step, hours):
+    rates, _ = window(rows, step, hours)
+    if not rates.shape[1]:
+        return np.zeros((len(FEATURES), len(rates)))
+    return np.stack([rates.max(axis=1), np.median(rates, axis=1),
+                     rates.sum(axis=1, dtype=np.float64) * 60, rates.argmax(axis=1)])
+
+_shard_ctx = {}
+
+def _shard_init(path, shm_name, n, hours):
+    shm = shared_memory.SharedMemory(shm_name)
+    _shard_ctx.update(data=History(path), shm=shm, hours=hours,
+                      out=np.ndarray((len(FEATURES), n), np.float64, shm.buf))
+
+def _shard(lo, hi):
+    c = _shard_ctx
+    f = _features(c['data'].counts[lo:hi], c['data'].step, c['hours'])
+    c['out'][:, lo:hi] = f
+    return moments(f[2])
+
+def user_features(data, hours=24, workers=WORKERS):
+    """Per-user FEATURES over the last `hours`, plus (n, mean, M2) of the per-user request totals.
+
+    Large populations are split into row shards across a process pool. Each worker
+    memory-maps the history file itself and writes its rows into one shared-memory
+    result block, so neither the matrix nor the results are pickled; the shards'
+    moments are merged exactly.
+    """
+    n = data.counts.shape[0]
+    _, h0 = window(data.counts[:0], data.step, hours)
+    workers = min(workers, n // MIN_SHARD)
+    if workers <= 1:
+        f = _features(data.counts, data.step, hours)
+        return f, moments(f[2]), h0
+    shm = shared_memory.SharedMemory(create=True, size=len(FEATURES) * n * 8)
+    try:
+        bounds = np.linspace(0, n, min(n // MIN_SHARD, workers * 4) + 1).astype(int)
+        with ProcessPoolExecutor(workers, initializer=_shard_init,
+                                 initargs=(data.path, shm.name, n, hours)) as pool:
+            stats = functools.reduce(merge, pool.map(_shard, bounds[:-1].tolist(), bounds[1:].tolist()))
+        f = np.ndarray((len(FEATURES), n), np.float64, shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return f, stats, h0
+
+def offenders(data, hours=24, top=20, features=None):
+    """Identities whose peak rate or burstiness stands out from the population, highest score first.
+
+    Two features per user over the window: the peak hourly rate, and that peak over the
+    user's own median hour. Each is scored against every other user; a row's score is
+    the larger of the two, so both heavy hitters and sudden bursts surface.
+    """
+    (peak, median, requests, peak_at), _, h0 = features or user_features(data, hours)
+    if not len(peak):
+        return []
+    burst = (peak + 1) / (median + 1)
+    score = np.maximum(robust_z(peak), robust_z(burst))
+    idx = np.flatnonzero(score > THRESHOLD)
+    idx = idx[np.lexsort((-requests[idx], -score[idx]))][:top]
+
+    ue = data.arrays.get('user_endpoint')
+    endpoints = data.meta.get('endpoints')
+    hour0 = data.start // 3600 + h0
+    total = requests.sum() or 1
+    return [{'user': data.users[i], 'score': round(float(score[i]), 1),
+             'requests': int(requests[i]), 'share': round(float(requests[i] / total * 100), 1),
+             'peak_rpm': round(float(peak[i]), 1), 'peak_hour': int((hour0 + peak_at[i]) % 24),
+             'endpoint': endpoints[int(np.argmax(ue[i]))] if ue is not None and endpoints else None}
+            for i in idx]
+
+def top_users(data, features, n=50):
+    """The `n` busiest users over the window and population statistics of per-user volume."""
+    (_, _, requests, _), (count, mean, m2), _ = features
+    idx = np.argsort(-requests, kind='stable')[:n]
+    return ([{'user': data.users[i], 'requests': int(requests[i])} for i in idx],
+            {'users': count, 'requests': int(requests.sum()), 'mean': round(mean, 1),
+             'std': round((m2 / count) ** 0.5 if count else 0.0, 1)})
+
+def endpoint_scores(data, hours=24):
+    """Every endpoint with its share of traffic, top source and how far its peak hour sits above its own median hour."""
+    ec, ue = data.arrays.get('endpoint_counts'), data.arrays.get('user_endpoint')
+    if ec is None or not data.meta.get('endpoints'):
+        return []
+    rates, h0 = window(ec, data.step, hours)
+    if not rates.size:
+        return []
+    score = robust_z(rates, axis=1).max(axis=1)
+    requests = rates.sum(axis=1, dtype=np.float64) * 60
+    sources = np.asarray(ue).argmax(axis=0)
+    hour0 = data.start // 3600 + h0
+    total = requests.sum() or 1
+    return [{'endpoint': data.endpoints[e], 'score': round(float(score[e]), 1),
+             'requests': int(requests[e]), 'share': round(float(requests[e] / total * 100), 1),
+             'peak_hour': int((hour0 + rates[e].argmax()) % 24), 'top_source': data.users[int(sources[e])]}
+            for e in np.argsort(-score, kind='stable')]
+
+def main():
+    ap = argparse.ArgumentParser(description='Rank offending identities and endpoints in a rate-limit history')
+    ap.add_argument('path', nargs='?', default=HISTORY_PATH)
+    ap.add_argument('--hours', type=int, default=24)
+    ap.add_argument('--top', type=int, default=20)
+    args = ap.parse_args()
+    data = History(args.path)
+    print(json.dumps({'offenders': offenders(data, args.hours, args.top),
+                      'endpoints': endpoint_scores(data, args.hours)}, indent=2))
+
+if __name__ == '__main__':
+    main()
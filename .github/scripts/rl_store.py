@@ -0,0 +1,174 @@
+import argparse, json, os, sqlite3, sys, time
+import numpy as np
+from rl_anomaly import ANOMALY_PATH
+from rl_io import History, HISTORY_PATH
+from sp_timing import Timings, stage
+
+STORE_PATH = os.environ.get('RL_STORE', '/tmp/rl_state/history.db')
+HOUR, DAY = 3600, 86400
+# Seconds of data kept at each resolution; the base resolution is the history's bucket size
+RETENTION = {'base': 14 * DAY, HOUR: 400 * DAY, DAY: None}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS points (
+    series TEXT NOT NULL, res INTEGER NOT NULL, ts INTEGER NOT NULL,
+    sum REAL NOT NULL, peak REAL NOT NULL, n INTEGER NOT NULL, sq REAL,
+    PRIMARY KEY (series, res, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS events (
+    ts INTEGER NOT NULL, kind TEXT NOT NULL, value REAL, score REAL, detail TEXT,
+    PRIMARY KEY (ts, kind)
+) WITHOUT ROWID;
+"""
+
+class Store:
+    """Embedded time-series store for rate-limit history, backed by one SQLite file.
+
+    Each series is stored at the history's bucket size plus hour and day rollups.
+    A point keeps the sum, the peak bucket, the bucket count and the sum of squared
+    buckets, so rollups compose and rates and their spread can be derived at any
+    resolution. Appends are upserts past the last
+    stored bucket, so re-appending an overlapping history is cheap and idempotent.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("PRAGMA journal_mode=WAL;" + SCHEMA)
+        if 'sq' not in [c[1] for c in self.db.execute("PRAGMA table_info(points)")]:
+            self.db.execute("ALTER TABLE points ADD COLUMN sq REAL")   # stores from before it: NULL, never guessed
+
+    def close(self):
+        self.db.close()
+
+    def last(self, series, res):
+        return self.db.execute("SELECT MAX(ts) FROM points WHERE series=? AND res=?", (series, res)).fetchone()[0]
+
+    def append(self, series, start, step, values):
+        """Upserts the buckets of `values` (one per `step` seconds from `start`) newer than what's stored,
+        then refreshes the hour and day rollups they touch. Returns the number of new buckets."""
+        last = self.last(series, step)
+        i0 = 0 if last is None else max(0, (last - start) // step + 1)
+        if i0 >= len(values):
+            return 0
+        v = np.asarray(values[i0:], np.float64)
+        ts = start + (i0 + np.arange(len(v), dtype=np.int64)) * step
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?, ?, 1, ?)",
+                                zip([series] * len(v), [step] * len(v), ts.tolist(), v.tolist(), v.tolist(), (v * v).tolist()))
+            lo, hi = int(ts[0]), int(ts[-1]) + step
+            for src, res in ((step, HOUR), (HOUR, DAY)):
+                if res <= src: continue
+                self._rollup(series, src, res, lo // res * res, hi)
+            self._prune(series, step, int(ts[-1]))
+        return len(v)
+
+    def _rollup(self, series, src, res, lo, hi):
+        self.db.execute("""
+            INSERT OR REPLACE INTO points
+            SELECT series, ?, ts / ? * ?, SUM(sum), MAX(peak), SUM(n),
+                   CASE WHEN COUNT(sq) = COUNT(*) THEN SUM(sq) END FROM points
+            WHERE series=? AND res=? AND ts >= ? AND ts < ?
+            GROUP BY ts / ?""", (res, res, res, series, src, lo, hi, res))
+
+    def _prune(self, series, step, now):
+        for res, keep in RETENTION.items():
+            if res == 'base':
+                if step in (HOUR, DAY): continue   # the base series is itself a rollup level
+                res = step
+            if keep is not None:
+                self.db.execute("DELETE FROM points WHERE series=? AND res=? AND ts < ?", (series, res, now - keep))
+
+    def query(self, series, start=None, end=None, res=HOUR):
+        """[(ts, sum, peak, n)] for `series` at resolution `res` (seconds) with start <= ts < end."""
+        return self.db.execute(
+            "SELECT ts, sum, peak, n FROM points WHERE series=? AND res=? AND ts >= ? AND ts < ? ORDER BY ts",
+            (series, res, start or 0, end or 1 << 62)).fetchall()
+
+    def moments(self, series, start=None, end=None, res=HOUR):
+        """[(ts, n, Σx, Σx²)] of the buckets under each point of `series` with start <= ts < end —
+        points rolled up from buckets stored before the sum of squares was kept are left out."""
+        return self.db.execute(
+            "SELECT ts, n, sum, sq FROM points WHERE series=? AND res=? AND ts >= ? AND ts < ? AND sq IS NOT NULL ORDER BY ts",
+            (series, res, start or 0, end or 1 << 62)).fetchall()
+
+    def rates(self, series, start=None, end=None, res=HOUR):
+        """[(ts, mean req/min)] — the sum spread over the covered buckets' minutes."""
+        step = self.base(series) or 60
+        return [(ts, s / (n * step / 60)) for ts, s, _, n in self.query(series, start, end, res)]
+
+    def base(self, series):
+        row = self.db.execute("SELECT MIN(res) FROM points WHERE series=?", (series,)).fetchone()
+        return row[0]
+
+    def series(self):
+        return [r[0] for r in self.db.execute("SELECT DISTINCT series FROM points ORDER BY series")]
+
+    def record_events(self, kind, rows):
+        """Upserts [(ts, value, score, detail dict)] events, e.g. flagged anomaly hours."""
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)",
+                                [(ts, kind, v, z, json.dumps(d) if d else None) for ts, v, z, d in rows])
+
+    def events(self, kind=None, start=None, end=None):
+        q = "SELECT ts, kind, value, score, detail FROM events WHERE ts >= ? AND ts < ?"
+        args = [start or 0, end or 1 << 62]
+        if kind:
+            q += " AND kind=?"; args.append(kind)
+        return [(ts, k, v, z, json.loads(d) if d else None) for ts, k, v, z, d in self.db.execute(q + " ORDER BY ts", args)]
+
+def append_history(store, data, anomalies=None):
+    """Appends a history's total and per-endpoint series (and flagged hours from anomaly.json) to the store."""
+    with stage('total'):
+        added = store.append('total', data.start, data.step, data.total)
+    ec = data.arrays.get('endpoint_counts')
+    with stage('endpoints'):
+        for i, name in enumerate(data.meta.get('endpoints') or []):
+            store.append(f'endpoint:{name}', data.start, data.step, ec[i])
+    if anomalies:
+        store.record_events('anomaly', [(h * HOUR, v, z, None) for h, v, z in anomalies['anomalies']])
+    return added
+
+RES = {'base': None, 'minute': 60, 'hour': HOUR, 'day': DAY}
+
+def main():
+    ap = argparse.ArgumentParser(description='Rate-limit time-series store')
+    sub = ap.add_subparsers(dest='command', required=True)
+    a = sub.add_parser('append', help='append a history file (and anomaly.json) to the store')
+    a.add_argument('history', nargs='?', default=HISTORY_PATH)
+    a.add_argument('--anomalies', default=ANOMALY_PATH)
+    q = sub.add_parser('query', help='print a series as CSV')
+    q.add_argument('series', nargs='?', default='total')
+    q.add_argument('--res', choices=sorted(RES), default='hour')
+    q.add_argument('--days', type=float, help='only the last N days')
+    sub.add_parser('info', help='list series and their coverage')
+    ap.add_argument('--store', default=STORE_PATH)
+    args = ap.parse_args()
+
+    store = Store(args.store)
+    if args.command == 'append':
+        timings = Timings('rl_store')
+        data = History(args.history)
+        anomalies = None
+        if args.anomalies and os.path.exists(args.anomalies):
+            with open(args.anomalies) as f:
+                anomalies = json.load(f)
+        added = append_history(store, data, anomalies)
+        print(f"Stored {added} new {data.step}s buckets in {args.store}")
+        timings.report()
+    elif args.command == 'query':
+        res = RES[args.res] or store.base(args.series)
+        start = int(time.time() - args.days * DAY) if args.days else None
+        sys.stdout.write("ts,sum,peak,n\n")
+        for row in store.query(args.series, start, None, res):
+            sys.stdout.write(",".join(str(x) for x in row) + "\n")
+    else:
+        for name in store.series():
+            spans = store.db.execute("SELECT res, COUNT(*) FROM points WHERE series=? GROUP BY res", (name,)).fetchall()
+            print(name, '  '.join(f"{res}s×{n}" for res, n in spans))
+        print(f"events: {store.db.execute('SELECT COUNT(*) FROM events').fetchone()[0]}")
+    store.close()
+
+if __name__ == '__main__':
+    main()
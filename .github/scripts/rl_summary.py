@@ -1,48 +1,18 @@
-import json, os
-
-with open('/tmp/history.json') as f:
-    data = json.load(f)
-with open('/tmp/anomaly.json') as f:
-    anomaly = json.load(f)
-
-total   = data['total']
-users   = data['users']
-mean    = float(os.environ.get('MEAN','0'))
-std     = float(os.environ.get('STD','0'))
-peak_h  = int(os.environ.get('PEAK_HOUR','14'))
-peak_r  = int(os.environ.get('PEAK_REQ','400'))
-atk     = int(os.environ.get('ATK_TOTAL','1200'))
-n_anom  = int(os.environ.get('ANOMALIES','0'))
-rec     = int(os.environ.get('REC_LIMIT','30'))
-strict  = int(os.environ.get('STRICT_LIMIT','20'))
-rl      = os.environ.get('RATE_LIMITED','0') == '1'
-accepted= int(os.environ.get('ACCEPTED','0'))
-
-user_totals  = {u: sum(v) for u,v in users.items()}
-sorted_users = sorted(user_totals.items(), key=lambda x:-x[1])
-total_all    = sum(user_totals.values())
-
-anom_hours = [h for h,v,z in anomaly['anomalies']]
-labels = [f'"{h:02d}h"' for h in range(24)]
-bar_vals = ', '.join(str(v) for v in total)
-max_y = max(total) + 60
-
-status_icon = "🟢 PROTECTED" if rl else "🔴 VULNERABLE"
-probe_line  = f"{accepted} requests accepted without 429" if not rl else "Rate limit triggered correctly"
-
-endpoints = [
-    ("POST /api/jobs/:id/bids",  62, "unknown@attacker.io",    "🔴 Critical"),
-    ("GET  /api/properties",     15, "alice@propowner.com",    "🟡 Medium"),
-    ("GET  /api/jobs",           12, "bob@propowner.com",      "🟢 Low"),
-    ("GET  /api/contractors",     8, "charlie@plumbing.com",   "🟢 Low"),
-    ("POST /api/auth/login",      3, "unknown@attacker.io",    "🟡 Medium"),
-]
-
-atk_pct = int(atk / total_all * 100)
-
-out = f"""# 🚦 VULN-6: Rate Limit Abuse — AI Anomaly Detection Report
-
-> **Live probe result:** {status_icon} — {probe_line}
+import json, os, time
+from rl_anomaly import ANOMALY_PATH, THRESHOLD as Z_THRESHOLD
+from rl_history import hourly, outputs
+from rl_io import History
+from rl_replay import REPLAY_PATH
+from rl_report import PAGE_SIZE, TOP_N, Report, pages, top
+from rl_score import THRESHOLD as SCORE_THRESHOLD
+from rl_store import DAY, STORE_PATH, Store
+from sp_ratelimit import MEASURE_PATH
+from sp_timing import Timings, stage
+
+# Markdown sections as string.Template ($name placeholders, $$ for a literal dollar sign)
+HEADER = """# 🚦 VULN-6: Rate Limit Abuse — AI Anomaly Detection Report
+
+> **Live probe result:** $status_icon — $probe_line
 
 ---
 
@@ -51,33 +21,52 @@ out = f"""# 🚦 VULN-6: Rate Limit Abuse — AI Anomaly Detection Report
 ```mermaid
 xychart-beta
     title "API Traffic — Last 24 Hours (req/min)"
-    x-axis [{', '.join(labels)}]
-    y-axis "Requests / min" 0 --> {max_y}
-    bar [{bar_vals}]
-    line [{bar_vals}]
+    x-axis [$labels]
+    y-axis "Requests / min" 0 --> $max_y
+    bar [$bars]
+    line [$bars]
 ```
 
+"""
+
+TREND = """
+### 📅 Daily Trend — Last $days Days
+
+```mermaid
+xychart-beta
+    title "Daily mean req/min (bars) and busiest minute (line)"
+    x-axis [$labels]
+    y-axis "Requests / min" 0 --> $max_y
+    bar [$means]
+    line [$peaks]
+```
+"""
+
+METRICS = """
 | Metric | Value |
 |--------|-------|
-| 📈 Peak volume | **{peak_r} req/min** at {peak_h:02d}:00 (attack window) |
-| 📉 Normal baseline mean | **{mean:.0f} req/min** |
-| 📐 Standard deviation | **{std:.1f}** |
-| ⚠️ Anomaly windows detected | **{n_anom} hour(s)** at hours {anom_hours} |
-| 🤖 Attacker total requests | **{atk:,}** from `unknown@attacker.io` ({atk_pct}% of all traffic) |
+| 📈 Peak volume | **$peak_r req/min** at $peak_h:00 (attack window) |
+| 📉 Normal baseline mean | **$mean req/min** |
+| 📐 Standard deviation | **$std** |
+| 👥 Users (24h) | **$users** — $user_mean ± $user_std requests per user |
+| ⚠️ Anomaly windows detected | **$n_anom hour(s)** at hours $anom_hours |
+| 🤖 Offender requests (24h) | **$atk** from $offenders, led by $top_name ($atk_pct% of all traffic) |
 
 ---
 
 ## 👥 Top Users by Request Volume (24h)
 
-| Rank | User | Requests | % of Traffic | Status |
+"""
+
+USERS_HEAD = """| Rank | User | Requests | % of Traffic | Status |
 |------|------|----------|-------------|--------|
 """
-for i,(u,cnt) in enumerate(sorted_users,1):
-    pct = cnt/total_all*100
-    flag = "🚨 **ATTACKER**" if "attacker" in u else ("⚠️ Elevated" if pct>15 else "✅ Normal")
-    out += f"| {i} | `{u}` | **{cnt:,}** | {pct:.1f}% | {flag} |\n"
 
-out += f"""
+USER_ROW = "| $rank | `$user` | **$requests** | $pct% | $status |\n"
+
+USERS_MORE = "\n_Showing the top $shown of $ranked ranked users ($users in total); the full ranking is in the `rate-limit-report` artifact ($pages)._\n"
+
+ENDPOINTS = """
 ---
 
 ## 🎯 Endpoint Attack Heatmap
@@ -85,69 +74,271 @@ out += f"""
 | Endpoint | % of Requests | Top Source | Risk Level |
 |----------|-------------|-----------|------------|
 """
-for ep,pct,src,risk in endpoints:
-    out += f"| `{ep}` | **{pct}%** | `{src}` | {risk} |\n"
 
-out += f"""
+ENDPOINT_ROW = "| `$endpoint` | **$share%** | `$top_source` | $risk |\n"
+
+ENDPOINTS_NONE = "| _no per-endpoint data in this history_ | | | |\n"
+
+ANALYSIS = """
 ---
 
 ## 🤖 AI Anomaly Detection Analysis
 
-Statistical method: **Z-score analysis** (flag anything > 2.5σ from mean)
+Statistical method: **Seasonal Z-score analysis** — each minute against the median/MAD of its weekday-hour slot, falling back to a rolling EWMA baseline until the slot has enough history (flag anything > ${z_threshold}σ)
 
 | Finding | Detail |
 |---------|--------|
-| Normal traffic band | {mean:.0f} ± {std:.1f} req/min |
-| Anomaly threshold | Z-score > 2.5σ |
-| Windows flagged | **{n_anom}** (hours {anom_hours}) |
-| Attack peak | **{peak_r} req/min** — Z={round((peak_r-mean)/max(std,1),1)} |
-| Source attribution | Single user `unknown@attacker.io` = {atk_pct}% of anomaly traffic |
-| Attack pattern | Scripted bot — 4-hour sustained burst on `POST /api/jobs/:id/bids` |
+| Normal traffic band | $mean ± $std req/min |
+| Anomaly threshold | Z-score > ${z_threshold}σ |
+| Offender threshold | Modified Z-score > $score_threshold (users and endpoints) |
+| Windows flagged | **$n_anom** (hours $anom_hours) |
+| Attack peak | **$peak_r req/min** — Z=$peak_z |
+| Source attribution | $top_name = $top_share% of traffic (score $top_score) |
+| Attack pattern | $pattern |
 
 **Anomaly details:**
 """
-for h,v,z in anomaly['anomalies']:
-    out += f"- Hour **{h:02d}:00** — {v} req/min (Z-score: **{z}**) 🚨\n"
 
-out += f"""
+ANOMALY_ROW = "- Hour **$hour:00** — $value req/min (Z-score: **$z**) 🚨\n"
+
+LIMITS = """
 ---
 
 ## 💡 AI-Recommended Rate Limits
 
-Based on 24-hour traffic baseline analysis:
+Based on replaying the recorded per-user traffic through candidate limiters:
 
 | Tier | Limit | Applies To | Rationale |
 |------|-------|-----------|-----------|
-| 🟢 **Recommended** | **{rec} req/min/user** | All endpoints | Mean + 2σ — covers all normal usage |
-| 🟡 **Strict** | **{strict} req/min/user** | Auth + bid endpoints | Mean + 1σ — tighter, low false positives |
+| 🟢 **Recommended** | **$rec req/min/user** | All endpoints | $rec_tier |
+| 🟡 **Strict** | **$strict req/min/user** | Auth + bid endpoints | $strict_tier |
 | 🔴 **Aggressive** | **10 req/min/user** | `/bids`, `/login` only | Highest-risk endpoints |
+"""
+
+REPLAY = """
+**Limiter replay** — $users users ($attackers attacker(s)) × $buckets buckets, $configs configurations:
+
+| Algorithm | Limit | Legitimate users limited | Legitimate requests blocked | Attack traffic blocked |
+|-----------|-------|--------------------------|-----------------------------|------------------------|
+"""
+
+REPLAY_ROW = "| $algo | $limit req/min | $fp_users% | $fp_requests% | $attack_blocked% |\n"
+
+MEASURED = """
+**Measured vs recommended:** live limiter admits **$m_limit requests / ${m_win}s** (≈ **$m_rate req/min/user**)
+against the recommended **$rec req/min/user** — $verdict.
+"""
+
+UNPROTECTED = """
+**Measured vs recommended:** no limiter detected — $accepted requests admitted; the recommended **$rec req/min/user** is not enforced.
+"""
+
+UNREACHABLE = """
+**Measured vs recommended:** the API was not reachable, so the live limiter could not be checked against the recommended **$rec req/min/user**.
+"""
+
+FIX = """
 
 **Copilot-suggested fix (`api/src/routes/jobs.ts`):**
 ```typescript
 import rateLimit from 'express-rate-limit';
 
-// AI-recommended: {rec} req/min based on 24h traffic analysis
-const bidRateLimiter = rateLimit({{
-  windowMs: 60 * 1000,
-  max: {rec},
+// $label
+const bidRateLimiter = rateLimit({
+  windowMs: $minutes * 60 * 1000,
+  max: $limit,
   keyGenerator: (req) => req.user?.userId ?? req.ip,
   standardHeaders: true,
   legacyHeaders: false,
-  handler: (req, res) => res.status(429).json({{
-    error: 'Too many requests. Limit: {rec}/min per user.',
-    retryAfter: 60,
-  }}),
-}});
+  handler: (req, res) => res.status(429).json({
+    error: 'Too many requests. Limit: $limit per $minutes min per user.',
+    retryAfter: $retry,
+  }),
+});
 
 // VULN-6 Fix: wrap the bid endpoint with per-user limiter
 router.post('/:id/bids', authenticate, bidRateLimiter, JobController.submitBid);
 ```
+"""
 
+FOOTER = """
 ---
-*AI Anomaly Detection powered by GitHub Actions | Run: ${{{{ github.run_id }}}}*
+*AI Anomaly Detection powered by GitHub Actions | Run: $run_id*
 """
 
-path = os.environ.get('GITHUB_STEP_SUMMARY','/tmp/summary.md')
-with open(path,'w') as f:
-    f.write(out)
-print("Step Summary written")
+report = Report('summary', header=HEADER, trend=TREND, metrics=METRICS, users_head=USERS_HEAD, user_row=USER_ROW,
+                users_more=USERS_MORE, endpoints=ENDPOINTS, endpoint_row=ENDPOINT_ROW, endpoints_none=ENDPOINTS_NONE,
+                analysis=ANALYSIS, anomaly_row=ANOMALY_ROW, limits=LIMITS, replay=REPLAY, replay_row=REPLAY_ROW,
+                measured=MEASURED, unprotected=UNPROTECTED, unreachable=UNREACHABLE, fix=FIX, footer=FOOTER)
+
+ALGOS = {'fixed_window': 'Fixed window (1 min)', 'sliding_window': 'Sliding window ({} min)', 'token_bucket': 'Token bucket ({} min burst)'}
+
+def algo(r):
+    return ALGOS[r['algorithm']].format(r['param'])
+
+def tier(rows, budget):
+    if not rows:
+        return "No replay data"
+    r = rows[0]
+    blocked = f"blocks {r['attack_blocked']}% of attack traffic" if r['attack_blocked'] is not None else "no attack traffic to block"
+    return f"{algo(r)} — {blocked}; ≤ {budget:g}% of legitimate users ever limited"
+
+def snippet(rows, rec):
+    """express-rate-limit settings for the Recommended row: its window, and its cap over that window.
+
+    express-rate-limit counts per window, so a sliding window becomes the same cap over the same
+    minutes; a token bucket has no counterpart and falls back to the best fixed-window row, labelled so.
+    """
+    r = rows[0] if rows else None
+    if r is None:
+        return {'label': f"Default: {rec} req/min per user, per 1-minute window", 'minutes': 1, 'limit': rec, 'retry': 60}
+    minutes = r['param'] if r['algorithm'] == 'sliding_window' else 1
+    label = f"Replay-recommended: {rec} req/min per user — {algo(r)}"
+    if r['algorithm'] == 'token_bucket':
+        fixed = next((x for x in rows if x['algorithm'] == 'fixed_window'), None)
+        if fixed:
+            label = f"Fixed-window equivalent of the recommended {algo(r)} at {rec} req/min per user"
+            rec = round(fixed['limit'])
+    return {'label': label, 'minutes': minutes, 'limit': round(rec * minutes), 'retry': minutes * 60}
+
+def risk(score):
+    return "🔴 Critical" if score > SCORE_THRESHOLD else "🟡 Medium" if score > SCORE_THRESHOLD / 2 else "🟢 Low"
+
+def inputs(data, peak, anomaly, replay, probe):
+    """Everything the report depends on, as plain JSON values — also what the render cache is keyed on.
+
+    `peak` is rl_history.outputs(), the rest are the anomaly, replay and probe reports."""
+    rec, strict = replay.get('recommended'), replay.get('strict')
+    # The full configuration grid is only summarised by its size
+    replay = {**{k: v for k, v in replay.items() if k != 'results'}, 'configs': len(replay.get('results') or [])}
+    hours = hourly(data.total, data.step)
+    total = [round(v) for v in hours[-24:]]   # last 24h, req/min
+    # Long-horizon trend from the persistent store: daily mean and busiest minute, last 30 days
+    trend = []
+    if os.path.exists(STORE_PATH):
+        store = Store()
+        trend = [(ts, s / (n * data.step / 60), p * 60 / data.step)
+                 for ts, s, p, n in store.query('total', data.start + len(data.total) * data.step - 30 * DAY, res=DAY)]
+        store.close()
+    values = {'mean': anomaly['mean'], 'std': anomaly['std'], 'peak_hour': peak['peak_hour'],
+              'peak_requests': peak['peak_requests'], 'anomaly_count': len(anomaly['anomalies']),
+              'recommended_limit': round(rec[0]['limit']) if rec else 30, 'strict_limit': round(strict[0]['limit']) if strict else 20,
+              'rate_limited': bool(probe.get('rate_limited')), 'accepted': probe.get('accepted', 0),
+              'reachable': probe.get('reachable', True),
+              'measured_limit': probe.get('limit'), 'measured_window': probe.get('window_s'),
+              'measured_per_minute': probe.get('per_minute'),
+              # Part of the cache key, so a retuned threshold re-renders the report
+              'z_threshold': Z_THRESHOLD, 'score_threshold': SCORE_THRESHOLD}
+    return {'values': values, 'total': total, 'first_h': data.start // 3600 + len(hours) - len(total),
+            'trend': trend, 'anomaly': anomaly, 'replay': replay, 'layout': [TOP_N, PAGE_SIZE]}
+
+def body(f, x):
+    v, anomaly, replay, total, trend = x['values'], x['anomaly'], x['replay'], x['total'], x['trend']
+    mean, std, peak_h, peak_r, n_anom = v['mean'], v['std'], v['peak_hour'], v['peak_requests'], v['anomaly_count']
+    rec, strict, rl, accepted = v['recommended_limit'], v['strict_limit'], v['rate_limited'], v['accepted']
+    m_limit, m_win, m_rate = v['measured_limit'], v['measured_window'], v['measured_per_minute']
+    anom_hours = [h % 24 for h, v, z in anomaly['anomalies']]
+    population = anomaly['population']
+
+    reachable = v['reachable']
+    probe_line = ("API not reachable — historical analysis only" if not reachable else
+                  f"{accepted} requests accepted without 429" if not rl else "Rate limit triggered correctly")
+    if rl and m_limit is not None:
+        probe_line += f" — measured {m_limit} requests per {float(m_win):.0f}s window (≈{float(m_rate):.0f} req/min)"
+    bars = ', '.join(str(v) for v in total)
+    status_icon = "⚪ NOT PROBED" if not reachable else "🟢 PROTECTED" if rl else "🔴 VULNERABLE"
+    report.write(f, 'header', status_icon=status_icon, probe_line=probe_line, bars=bars,
+                 labels=', '.join(f'"{(x["first_h"] + h) % 24:02d}h"' for h in range(len(total))), max_y=max(total) + 60)
+    if len(trend) > 1:
+        report.write(f, 'trend', days=len(trend), max_y=round(max(p for _, _, p in trend)) + 20,
+                     labels=', '.join(f'"{time.strftime("%m-%d", time.gmtime(ts))}"' for ts, _, _ in trend),
+                     means=', '.join(str(round(m)) for _, m, _ in trend), peaks=', '.join(str(round(p)) for _, _, p in trend))
+
+    offenders = anomaly.get('offenders', [])
+    flagged = {o['user']: o for o in offenders}
+    lead = offenders[0] if offenders else None
+    top_name = f"`{lead['user']}`" if lead else "no identity"
+    report.write(f, 'metrics', peak_r=peak_r, peak_h=f'{peak_h:02d}', mean=f'{mean:.0f}', std=f'{std:.1f}',
+                 users=f"{population['users']:,}", user_mean=f"{population['mean']:,.0f}", user_std=f"{population['std']:,.0f}",
+                 n_anom=n_anom, anom_hours=anom_hours, atk=f"{sum(o['requests'] for o in offenders):,}",
+                 offenders=f"{len(offenders)} identit{'y' if len(offenders) == 1 else 'ies'}", top_name=top_name,
+                 atk_pct=round(sum(o['share'] for o in offenders)))
+
+    # Top users: the first TOP_N inline, the whole ranking paged into the report artifact
+    total_all = population['requests'] or 1
+    def user_rows(users, start=1):
+        for i, u in enumerate(users, start):
+            pct = u['requests'] / total_all * 100
+            o = flagged.get(u['user'])
+            yield {'rank': i, 'user': u['user'], 'requests': f"{u['requests']:,}", 'pct': f'{pct:.1f}',
+                   'status': f"🚨 **OFFENDER** (score {o['score']})" if o else "⚠️ Elevated" if pct > 15 else "✅ Normal"}
+    ranked = anomaly['top_users']
+    shown, more = top(ranked)
+    report.write(f, 'users_head')
+    report.rows(f, 'user_row', user_rows(shown))
+    if more:
+        names = pages(report, 'user_row', USERS_HEAD, list(user_rows(ranked)), 'users')
+        report.write(f, 'users_more', shown=len(shown), ranked=len(ranked), users=f"{population['users']:,}",
+                     pages=f"{len(names)} page(s) of up to {PAGE_SIZE}")
+
+    report.write(f, 'endpoints')
+    report.rows(f, 'endpoint_row', ({'endpoint': e['endpoint'], 'share': f"{e['share']:.0f}", 'top_source': e['top_source'],
+                                     'risk': risk(e['score'])} for e in anomaly.get('endpoints', [])))
+    if not anomaly.get('endpoints'):
+        report.write(f, 'endpoints_none')
+
+    report.write(f, 'analysis', mean=f'{mean:.0f}', std=f'{std:.1f}', n_anom=n_anom, anom_hours=anom_hours, peak_r=peak_r,
+                 peak_z=round((peak_r - mean) / max(std, 1), 1), top_name=top_name,
+                 z_threshold=f"{v['z_threshold']:g}", score_threshold=f"{v['score_threshold']:g}",
+                 top_share=f"{lead['share'] if lead else 0:.0f}", top_score=lead['score'] if lead else 0,
+                 pattern=f"Peaks at {lead['peak_rpm']:.0f} req/min at {lead['peak_hour']:02d}:00 on `{lead['endpoint']}`"
+                         if lead else "No offending identity")
+    report.rows(f, 'anomaly_row', ({'hour': f'{h % 24:02d}', 'value': v, 'z': z} for h, v, z in anomaly['anomalies']))
+
+    report.write(f, 'limits', rec=rec, strict=strict, rec_tier=tier(replay['recommended'], replay.get('fp_budget', 1)),
+                 strict_tier=tier(replay['strict'], replay.get('strict_fp', 5)))
+    if replay['recommended']:
+        report.write(f, 'replay', users=f"{replay['users']:,}", attackers=replay['attackers'],
+                     buckets=f"{replay['buckets']:,}", configs=replay['configs'])
+        report.rows(f, 'replay_row', ({'algo': algo(r), 'limit': f"{r['limit']:.0f}", 'fp_users': r['fp_users'],
+                                       'fp_requests': r['fp_requests'],
+                                       'attack_blocked': r['attack_blocked'] if r['attack_blocked'] is not None else '—'}
+                                      for r in replay['recommended']))
+    if rl and m_rate is not None:
+        verdict = "✅ at or below recommended" if float(m_rate) <= rec else "⚠️ looser than recommended — tighten to the recommended limit"
+        report.write(f, 'measured', m_limit=m_limit, m_win=f'{float(m_win):.0f}', m_rate=f'{float(m_rate):.0f}', rec=rec, verdict=verdict)
+    elif not reachable:
+        report.write(f, 'unreachable', rec=rec)
+    elif not rl:
+        report.write(f, 'unprotected', accepted=accepted, rec=rec)
+
+    report.write(f, 'fix', **snippet(replay['recommended'], rec))
+
+def write_summary(data, peak, anomaly, replay, probe):
+    """Streams the report into GITHUB_STEP_SUMMARY. Returns False when the cached render was reused."""
+    with stage('inputs'):
+        x = inputs(data, peak, anomaly, replay, probe)
+    with open(os.environ.get('GITHUB_STEP_SUMMARY','/tmp/summary.md'), 'w') as f, stage('render'):
+        rendered = report.render(f, x, body)
+        # The run id changes every run, so the footer is written after (and outside) the cached body
+        report.write(f, 'footer', run_id=os.environ.get('GITHUB_RUN_ID', 'local'))
+    print("Step Summary written" if rendered else "Step Summary unchanged — reused cached render")
+    return rendered
+
+def load(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    timings = Timings('rl_summary')
+    with stage('load'):
+        data = History()
+        args = (data, outputs(data), load(ANOMALY_PATH, None), load(REPLAY_PATH, {'recommended': [], 'strict': []}),
+                load(MEASURE_PATH, {'rate_limited': False, 'accepted': 0}))
+    write_summary(*args)
+    timings.report()
+
+if __name__ == '__main__':
+    main()
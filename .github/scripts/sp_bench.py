@@ -0,0 +1,271 @@
+import argparse, base64, json, os, platform, shutil, statistics, subprocess, sys, threading, time, urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.environ.get('BENCH_DIR', '/tmp/bench')
+
+# users = synthetic users on top of the 6 built-in rows (5 personas + 1 attacker); days at 60s buckets
+SCALES = {
+    'xs': {'users': 0,       'days': 1,  'findings': 10},
+    's':  {'users': 1_000,   'days': 30, 'findings': 10_000},
+    'm':  {'users': 100_000, 'days': 1,  'findings': 100_000},
+    'l':  {'users': 500_000, 'days': 1,  'findings': 1_000_000},
+}
+SEVERITIES = ('critical', 'high', 'medium', 'low')
+RULES = 40   # distinct finding ids in the findings fixture; the rest are per-target / per-endpoint instances
+
+# ── Local stub API ──────────────────────────────────────────────────────────
+# Just enough of the API for the probes and the rate-limit measurement to run end to end offline:
+# logins return short-lived JWTs, every probe's vulnerable behaviour is reproduced, and bids are
+# rate limited per token when `limit` is set.
+
+def jwt(exp):
+    enc = lambda d: base64.urlsafe_b64encode(json.dumps(d).encode()).rstrip(b'=').decode()
+    return f"{enc({'alg': 'HS256', 'typ': 'JWT'})}.{enc({'userId': 'stub', 'exp': int(exp)})}.stub"
+
+class StubAPI:
+    def __init__(self, limit=None, window=60, rows=500):
+        self.limit, self.window, self.rows = limit, window, rows
+        self.hits = {}   # (token, window index) → bids seen
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def bid(self, token):
+        """(status, headers) for one bid under a fixed-window limit of `limit` per `window` seconds."""
+        if self.limit is None:
+            return 201, {}
+        key = (token, int(time.time() // self.window))
+        with self._lock:
+            self.hits[key] = n = self.hits.get(key, 0) + 1
+        headers = {'RateLimit-Limit': str(self.limit), 'RateLimit-Remaining': str(max(0, self.limit - n))}
+        return (429, {**headers, 'Retry-After': str(self.window)}) if n > self.limit else (201, headers)
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body, headers=None):
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                for k, v in {'Content-Type': 'application/json', 'Content-Length': str(len(raw)), **(headers or {})}.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                path = urllib.parse.urlsplit(self.path).path
+                if path == '/api/auth/login':
+                    return self.reply(200, {'data': {'token': jwt(time.time() + 3600)}})
+                if path.startswith('/api/jobs/') and path.endswith('/bids'):
+                    status, headers = api.bid(self.headers.get('Authorization', ''))
+                    return self.reply(status, {'data': {}} if status == 201 else {'error': 'Too many requests'}, headers)
+                self.reply(404, {'error': 'not found'})
+
+            def do_GET(self):
+                u = urllib.parse.urlsplit(self.path)
+                q = urllib.parse.parse_qs(u.query)
+                if u.path == '/api/properties/search':
+                    n = api.rows if 'OR 1=1' in q.get('q', [''])[0] else 1
+                    return self.reply(200, {'count': n, 'data': [{'id': i, 'name': f'Property {i}'} for i in range(n)]})
+                if u.path == '/api/properties':
+                    n = int(q.get('limit', ['5'])[0])
+                    return self.reply(200, {'count': n, 'data': [{'id': i} for i in range(n)]})
+                if u.path.startswith('/api/jobs'):   # no owner check and expired tokens accepted: BOLA + broken auth
+                    return self.reply(200, {'data': {'title': 'Stub job', 'owner_id': 'alice'}})
+                self.reply(404, {'error': 'not found'})
+
+        return Handler
+
+# ── Fixtures ────────────────────────────────────────────────────────────────
+
+def history_fixture(path, users, days, env):
+    """A simulated history of `users` + 6 rows × `days` of minute buckets (rl_history's seeded generator)."""
+    run([os.path.join(HERE, 'rl_history.py'), '--users', str(users), '--days', str(days), '--out', path], env)
+
+def findings_fixture(path, n, targets=None):
+    """runtime_findings.json with `n` findings: RULES ids repeated across targets and endpoints."""
+    targets = targets or max(1, min(50, n // RULES))
+    per_target = {f'env{t:02d}': {'url': f'https://env{t:02d}.example', 'reachable': True, 'elapsed': 1.0,
+                                  'findings': [], 'latency': {}} for t in range(targets)}
+    names = list(per_target)
+    with open(path, 'w') as f:
+        f.write('{"findings": [')
+        for i in range(n):
+            rule, t = i % RULES, names[i // RULES % targets]
+            finding = {'id': f'VULN-{rule:02d}', 'severity': SEVERITIES[rule % 4],
+                       'rule': f'API{rule % 10 + 1}:2023 — Synthetic rule {rule}',
+                       'file': f'api/src/routes/r{rule}.ts', 'line': 10 + i // (RULES * targets),
+                       'message': f'Synthetic finding {i} on endpoint /api/e{i // (RULES * targets)}', 'fix': 'Apply the fix',
+                       'target': t}
+            f.write((', ' if i else '') + json.dumps(finding))
+            if len(per_target[t]['findings']) < 1000:   # enough for the per-environment table
+                per_target[t]['findings'].append({'severity': finding['severity']})
+        for t in per_target.values():
+            t['latency'] = {f'GET /api/e{e}': {'count': 20, **{p: {'p50': 12.0, 'p95': 40.0, 'p99': 90.0}
+                                                               for p in ('connect', 'ttfb', 'total')}} for e in range(3)}
+        f.write('], "targets": ' + json.dumps(per_target) + ', "probes": []}')
+
+# ── Runner ──────────────────────────────────────────────────────────────────
+
+def run(argv, env):
+    r = subprocess.run([sys.executable] + argv, env=env, cwd=HERE, capture_output=True, text=True)
+    if r.returncode:
+        raise RuntimeError(f"{os.path.basename(argv[0])} failed ({r.returncode}):\n{r.stderr[-2000:]}")
+    return r
+
+def bench(script, env, repeat, args=(), prepare=None):
+    """Runs `script` `repeat` times in a fresh interpreter; wall time end to end and per-stage
+    times from the script's own sp_timing report. Returns the median-based summary."""
+    walls, stages, rss = [], {}, []
+    for _ in range(repeat):
+        if prepare:
+            prepare()
+        t = time.perf_counter()
+        run([os.path.join(HERE, f'{script}.py'), *args], env)
+        walls.append(time.perf_counter() - t)
+        with open(os.path.join(env['TIMINGS_DIR'], f'{script}.json')) as f:
+            timing = json.load(f)
+        rss.append(timing['rss_mb'])
+        for s in timing['stages']:
+            stages.setdefault(s['stage'], []).append(s['seconds'])
+    return {'script': script, 'runs': [round(w, 3) for w in walls], 'median': round(statistics.median(walls), 3),
+            'min': round(min(walls), 3), 'rss_mb': max(rss),
+            'stages': {k: round(statistics.median(v), 3) for k, v in stages.items()}}
+
+def clear(*paths):
+    def prepare():
+        for p in paths:
+            shutil.rmtree(p, ignore_errors=True)
+    return prepare
+
+def bench_scale(name, scale, api, repeat, only):
+    """Builds the fixtures for one scale in BENCH_DIR/<name> and benchmarks each script against them."""
+    root = os.path.join(BENCH_DIR, name)
+    state = os.path.join(root, 'state')
+    os.makedirs(root, exist_ok=True)
+    env = {**os.environ, 'TIMINGS_DIR': os.path.join(root, 'timings'),
+           'GITHUB_OUTPUT': os.path.join(root, 'output.txt'), 'GITHUB_STEP_SUMMARY': os.path.join(root, 'summary.md'),
+           'RL_HISTORY': os.path.join(root, 'history.rlh'), 'RL_ANOMALY': os.path.join(root, 'anomaly.json'),
+           'RL_REPLAY': os.path.join(root, 'replay.json'), 'RL_MEASURE': os.path.join(root, 'measure.json'),
+           'RL_DETECTOR_STATE': os.path.join(state, 'detector.json'), 'RL_PROFILE': os.path.join(state, 'profile.json'),
+           'RL_STORE': os.path.join(state, 'history.db'), 'RL_REPORT_DIR': os.path.join(state, 'report'),
+           'RUNTIME_FINDINGS': os.path.join(root, 'findings.json'), 'SARIF_PATH': os.path.join(root, 'results.sarif'),
+           'SARIF_DELTA': os.path.join(root, 'delta', 'delta.sarif'), 'SARIF_BASELINE': os.path.join(root, 'sarif_state', 'baseline.json'),
+           'SP_TOKEN_CACHE': os.path.join(root, 'tokens.json'), 'API_URL': api.url, 'API_TARGETS': '',
+           'PROBE_ENVIRONMENT': '', 'PROBE_TAGS': '', 'PROBE_DEADLINE': '10'}
+    wanted = lambda s: not only or s in only
+    results = []
+    def add(r):
+        results.append({'scale': name, **scale, **r})
+        print(f"  {name:<4} {r['script']:<13} median {r['median']:>8.2f}s  min {r['min']:>8.2f}s  rss {r['rss_mb']:>7} MB")
+
+    if any(wanted(s) for s in ('rl_anomaly', 'rl_replay', 'rl_summary')):
+        t = time.perf_counter()
+        history_fixture(env['RL_HISTORY'], scale['users'], scale['days'], env)
+        print(f"  {name:<4} history fixture: {scale['users'] + 6:,} users × {scale['days']} day(s) "
+              f"in {time.perf_counter() - t:.1f}s")
+        # Each run starts cold — no detector state, profile or cached render from the previous run
+        add(bench('rl_anomaly', env, repeat if wanted('rl_anomaly') else 1, prepare=clear(state)))
+        if wanted('rl_replay') or wanted('rl_summary'):
+            r = bench('rl_replay', env, repeat if wanted('rl_replay') else 1)
+            if wanted('rl_replay'): add(r)
+        if wanted('rl_summary'):
+            add(bench('rl_summary', env, repeat, prepare=clear(env['RL_REPORT_DIR'])))
+        if not wanted('rl_anomaly'):
+            results[:] = [r for r in results if r['script'] != 'rl_anomaly']
+
+    if wanted('sp_sarif') or wanted('sp_dashboard'):
+        t = time.perf_counter()
+        findings_fixture(env['RUNTIME_FINDINGS'], scale['findings'])
+        print(f"  {name:<4} findings fixture: {scale['findings']:,} findings in {time.perf_counter() - t:.1f}s")
+        if wanted('sp_sarif'):   # cold: no baseline, so every result is new
+            add(bench('sp_sarif', env, repeat, prepare=clear(os.path.dirname(env['SARIF_BASELINE']))))
+        if wanted('sp_dashboard'):
+            add(bench('sp_dashboard', env, repeat))
+
+    if wanted('sp_probe') and name == min(SCALES, key=lambda s: SCALES[s]['findings']):
+        # Probes don't scale with the fixtures — run them once, against the stub API
+        add(bench('sp_probe', {**env, 'RUNTIME_FINDINGS': os.path.join(root, 'probe_findings.json')}, repeat,
+                  prepare=clear(env['SP_TOKEN_CACHE'])))
+    return results
+
+# ── Baseline comparison ─────────────────────────────────────────────────────
+
+def compare(results, baseline, tolerance):
+    """Rows of (scale, script, baseline s, current s, ratio, regressed) for benchmarks in both."""
+    base = {(r['scale'], r['script']): r for r in baseline['results']}
+    rows = []
+    for r in results['results']:
+        b = base.get((r['scale'], r['script']))
+        if not b: continue
+        ratio = r['median'] / b['median'] if b['median'] else 1.0
+        rows.append((r['scale'], r['script'], b['median'], r['median'], round(ratio, 2), ratio > 1 + tolerance))
+    return rows
+
+def markdown(results, rows):
+    out = "## ⏱️ Benchmark results\n\n| Scale | Script | Median s | Min s | Peak RSS MB | Slowest stage |\n|---|---|---:|---:|---:|---|\n"
+    for r in results['results']:
+        slow = max(((k, v) for k, v in r['stages'].items() if '/' not in k), key=lambda kv: kv[1], default=None)
+        out += (f"| {r['scale']} | `{r['script']}` | {r['median']:.2f} | {r['min']:.2f} | {r['rss_mb']} | "
+                f"{f'{slow[0]} ({slow[1]:.2f}s)' if slow else '—'} |\n")
+    if rows:
+        out += "\n### Against baseline\n\n| Scale | Script | Baseline s | Current s | Ratio |\n|---|---|---:|---:|---:|\n"
+        for scale, script, b, c, ratio, bad in rows:
+            out += f"| {scale} | `{script}` | {b:.2f} | {c:.2f} | {ratio}×{' 🔴' if bad else ''} |\n"
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark the rate-limit and security-posture scripts on synthetic fixtures')
+    ap.add_argument('--scale', action='append', choices=sorted(SCALES), help=f'fixture scale (repeatable, default xs and s): {SCALES}')
+    ap.add_argument('--script', action='append', help='only these scripts (rl_anomaly, rl_replay, rl_summary, sp_sarif, sp_dashboard, sp_probe)')
+    ap.add_argument('--repeat', type=int, default=3, help='runs per benchmark; the median is reported')
+    ap.add_argument('--rate-limit', type=int, help='bids per minute the stub API allows (default: unlimited, like the vulnerable API)')
+    ap.add_argument('--out', default=os.path.join(BENCH_DIR, 'results.json'))
+    ap.add_argument('--baseline', help='earlier results.json to compare with')
+    ap.add_argument('--tolerance', type=float, default=0.25, help='slowdown vs the baseline median counted as a regression')
+    ap.add_argument('--fail-on-regression', action='store_true')
+    args = ap.parse_args()
+
+    results = {'meta': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+                        'commit': subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip(),
+                        'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'repeat': args.repeat},
+               'results': []}
+    with StubAPI(limit=args.rate_limit) as api:
+        for name in args.scale or ['xs', 's']:
+            results['results'] += bench_scale(name, SCALES[name], api, args.repeat, set(args.script or []))
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    rows = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), args.tolerance)
+        for scale, script, b, c, ratio, bad in rows:
+            print(f"  {scale:<4} {script:<13} {b:>8.2f}s → {c:>8.2f}s  {ratio}×{'  REGRESSION' if bad else ''}")
+    if os.environ.get('GITHUB_STEP_SUMMARY'):
+        with open(os.environ['GITHUB_STEP_SUMMARY'], 'a') as f:
+            f.write(markdown(results, rows))
+    if args.fail_on_regression and any(bad for *_, bad in rows):
+        sys.exit(f"Slower than the baseline by more than {args.tolerance:.0%}")
+
+if __name__ == '__main__':
+    main()
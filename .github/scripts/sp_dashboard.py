@@ -1,4 +1,7 @@
-import json, os, datetime
+import json, os, datetime, time
+from sp_timing import Timings
+
+timings = Timings('sp_dashboard')
 
 repo = os.environ.get('GITHUB_REPO', 'sautalwar/cushman-property-api')
 code_count    = int(os.environ.get('CODE_SCAN_COUNT', 0))
@@ -6,8 +9,9 @@ secret_count  = int(os.environ.get('SECRET_COUNT', 0))
 dep_count     = int(os.environ.get('DEP_COUNT', 0))
 runtime_count = int(os.environ.get('RUNTIME_COUNT', 0))
 
-with open('/tmp/runtime_findings.json') as f:
+with timings.stage('load'), open(os.environ.get('RUNTIME_FINDINGS', '/tmp/runtime_findings.json')) as f:
     runtime = json.load(f)
+started = time.perf_counter()
 
 findings = runtime.get('findings', [])
 critical = sum(1 for f in findings if f['severity'] == 'critical')
@@ -36,13 +40,43 @@ summary = f"""# 🔐 Security Posture Dashboard
 | 📦 Dependabot CVEs | **{dep_count}** | Mixed | {'⚠️ Upgrade deps' if dep_count > 0 else '✅ Dependencies clean'} |
 
 ---
+"""
+
+targets = runtime.get('targets', {})
+if targets:
+    summary += "\n## 🌐 Runtime Status by Environment\n\n"
+    summary += "| Environment | Target | Status | Critical | High | Medium | Probe time |\n"
+    summary += "|-------------|--------|--------|----------|------|--------|-----------|\n"
+    for name, t in targets.items():
+        sev = [f['severity'] for f in t['findings']]
+        status = ('⚠️ Unreachable' if not t.get('reachable', True) else
+                  f"🔴 {len(sev)} finding(s)" if sev else '✅ Clean')
+        summary += (f"| **{name}** | `{t['url']}` | {status} | {sev.count('critical')} | "
+                    f"{sev.count('high')} | {sev.count('medium')} | {t.get('elapsed', 0):.1f}s |\n")
+    summary += "\n---\n"
 
+# Per-endpoint latency from the probe requests themselves — a cheap regression signal
+budget = float(os.environ.get('LATENCY_BUDGET_MS', 1000))
+latency = [(name, ep, s) for name, t in targets.items() for ep, s in t.get('latency', {}).items()]
+if latency:
+    summary += f"\n## ⏱️ Probe Latency (ms, p95 budget {budget:.0f})\n\n"
+    summary += "| Environment | Endpoint | Requests | p50 | p95 | p99 | TTFB p95 | Connect p95 |\n"
+    summary += "|-------------|----------|----------|-----|-----|-----|----------|-------------|\n"
+    for name, ep, s in latency:
+        t = s['total']
+        flag = ' ⚠️' if t['p95'] > budget else ''
+        summary += (f"| {name} | `{ep}` | {s['count']} | {t['p50']} | **{t['p95']}**{flag} | {t['p99']} | "
+                    f"{s['ttfb']['p95']} | {s['connect']['p95']} |\n")
+    summary += "\n---\n"
+
+summary += """
 ## 🔬 Runtime Probe Findings
 """
 if findings:
     for f in findings:
         icon = {'critical':'🔴','high':'🟠','medium':'🟡'}.get(f['severity'],'⚠️')
-        summary += f"\n### {icon} `{f['id']}` — {f['rule']}\n"
+        where = f" · `{f['target']}`" if 'target' in f else ''
+        summary += f"\n### {icon} `{f['id']}` — {f['rule']}{where}\n"
         summary += f"**File:** `{f['file']}` line {f['line']}\n\n"
         summary += f"**Evidence:** {f['message']}\n\n"
         summary += f"**Fix:** `{f['fix']}`\n\n"
@@ -62,6 +96,9 @@ summary += f"""
 *Security Posture Dashboard · Generated automatically by GitHub Actions · {now}*
 """
 
-with open(os.environ.get('GITHUB_STEP_SUMMARY', '/tmp/summary.md'), 'w') as f:
+timings.record('render', time.perf_counter() - started)   # the module-level template build above
+
+with timings.stage('write'), open(os.environ.get('GITHUB_STEP_SUMMARY', '/tmp/summary.md'), 'w') as f:
     f.write(summary)
 print("Security posture dashboard written to Step Summary")
+timings.report()
@@ -0,0 +1,362 @@
+import argparse, base64, gzip, hashlib, json, os, re, sys, threading, time, urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from sp_http import Client
+from sp_timing import Timings
+
+# SP_GITHUB_API points these scripts at `sp_github.py stub` to work offline; GITHUB_API_URL is set by
+# Actions itself (the GHES API on a GHES runner), so it stays the default rather than the override
+API_URL = os.environ.get('SP_GITHUB_API') or os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+CACHE_DIR = os.environ.get('GH_CACHE', '/tmp/sp_github_cache')
+WORKERS = int(os.environ.get('ISSUE_WORKERS', 4))
+MAX_WAIT = float(os.environ.get('ISSUE_MAX_WAIT', 300))   # longest rate-limit pause worth waiting out in a run
+
+class ETagCache:
+    """On-disk copy of every GET response with an ETag, one file per request path.
+
+    Replaying the ETag as If-None-Match lets GitHub answer 304 Not Modified, which
+    doesn't count against the rate limit; the cached body and Link header stand in.
+    """
+
+    def __init__(self, path=CACHE_DIR):
+        self.path = path
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha256(key.encode()).hexdigest()[:32] + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._file(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, etag, link, data):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'etag': etag, 'link': link, 'data': data}, f)
+        os.replace(tmp, path)
+
+class GitHub:
+    """REST client for the GitHub API on one keep-alive pool shared by worker threads.
+
+    GETs are conditional on the ETag cache. Every response's x-ratelimit-* headers
+    are tracked: once the remaining budget hits zero, or GitHub answers a
+    secondary-limit 403/429 with retry-after, all workers hold off until it
+    resets — unless that is more than MAX_WAIT away.
+    """
+
+    def __init__(self, token, api=API_URL, workers=WORKERS, cache=None):
+        self.http = Client(api, timeout=15, pool_size=workers)
+        self.headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/vnd.github+json',
+                        'X-GitHub-Api-Version': '2022-11-28', 'User-Agent': 'security-posture'}
+        self.cache = cache
+        self.remaining = None
+        self.stats = {'requests': 0, 'not_modified': 0}
+        self._resume = 0.0   # epoch seconds before which no request is sent
+        self._lock = threading.Lock()
+
+    def request(self, method, path, body=None, headers=None, retries=3):
+        """Returns (status, response headers, json); 429 without a request when the limit resets too late."""
+        for _ in range(retries + 1):
+            with self._lock:
+                delay = self._resume - time.time()
+            if delay > MAX_WAIT:
+                return 429, {}, {}
+            if delay > 0:
+                time.sleep(delay)
+            status, rhdrs, data = self.http.fetch(method, path, body, {**self.headers, **(headers or {})})
+            with self._lock:
+                self.stats['requests'] += 1
+                if 'x-ratelimit-remaining' in rhdrs:
+                    self.remaining = int(rhdrs['x-ratelimit-remaining'])
+                    if self.remaining == 0:
+                        self._resume = max(self._resume, float(rhdrs.get('x-ratelimit-reset', 0)))
+                if status not in (403, 429) or not ('retry-after' in rhdrs or self.remaining == 0):
+                    return status, rhdrs, data
+                self._resume = max(self._resume, time.time() + float(rhdrs.get('retry-after', 60)))
+        return status, rhdrs, data
+
+    def get(self, path):
+        """A GET answered from the ETag cache when GitHub says nothing changed."""
+        cached = self.cache and self.cache.get(path)
+        status, headers, data = self.request('GET', path, headers={'If-None-Match': cached['etag']} if cached else None)
+        if status == 304 and cached:
+            with self._lock:
+                self.stats['not_modified'] += 1
+            return 200, {'link': cached['link']}, cached['data']
+        if status == 200 and self.cache and 'etag' in headers:
+            self.cache.put(path, headers['etag'], headers.get('link', ''), data)
+        return status, headers, data
+
+    def paginate(self, path):
+        """Yields the items of every page, following the Link: rel="next" header."""
+        while path:
+            status, headers, data = self.get(path)
+            if status != 200:
+                raise RuntimeError(f"GET {path} returned HTTP {status}")
+            yield from data
+            m = re.search(r'<([^>]+)>;\s*rel="next"', headers.get('link', ''))
+            u = urllib.parse.urlsplit(m[1]) if m else None
+            path = u and u.path[len(self.http.prefix):] + (f'?{u.query}' if u.query else '')
+
+# ── Alerts ──────────────────────────────────────────────────────────────────
+# The fields the dashboard and issues use, under the names the /tmp/*_alerts.json files always had
+
+class CodeScanningAlert(NamedTuple):
+    id: int
+    rule: str
+    severity: str
+    description: str
+    file: str
+    line: int
+    url: str
+
+    @classmethod
+    def from_api(cls, a):
+        loc = (a.get('most_recent_instance') or {}).get('location') or {}
+        rule = a.get('rule') or {}
+        return cls(a['number'], rule.get('id'), rule.get('severity'),
+                   rule.get('description'), loc.get('path'), loc.get('start_line'), a.get('html_url'))
+
+class SecretAlert(NamedTuple):
+    id: int
+    type: str
+    bypassed: bool
+    url: str
+
+    @classmethod
+    def from_api(cls, a):
+        return cls(a['number'], a.get('secret_type_display_name'), a.get('push_protection_bypassed'), a.get('html_url'))
+
+class DependabotAlert(NamedTuple):
+    id: int
+    package: str
+    severity: str
+    cve: str
+    summary: str
+    patched_version: str
+    url: str
+
+    @classmethod
+    def from_api(cls, a):
+        vuln, advisory = a.get('security_vulnerability') or {}, a.get('security_advisory') or {}
+        return cls(a['number'], ((a.get('dependency') or {}).get('package') or {}).get('name'), vuln.get('severity'),
+                   advisory.get('cve_id'), advisory.get('summary'),
+                   (vuln.get('first_patched_version') or {}).get('identifier'), a.get('html_url'))
+
+# kind → (alert type, file the workflow keeps, step output with the count)
+ALERTS = {
+    'code-scanning':   (CodeScanningAlert, '/tmp/code_scan_alerts.json', 'code_scan_count'),
+    'secret-scanning': (SecretAlert, '/tmp/secret_alerts.json', 'secret_count'),
+    'dependabot':      (DependabotAlert, '/tmp/dep_alerts.json', 'dep_count'),
+}
+
+def alerts(gh, repo, kind):
+    """Open alerts of one kind as typed tuples — none when the feature is off or not visible to the token."""
+    cls = ALERTS[kind][0]
+    try:
+        return [cls.from_api(a) for a in gh.paginate(f'/repos/{repo}/{kind}/alerts?state=open&per_page=100')]
+    except RuntimeError as e:
+        print(f"Could not read {kind} alerts: {e}")
+        return []
+
+# ── SARIF ───────────────────────────────────────────────────────────────────
+
+def upload_sarif(gh, repo, path, ref, sha):
+    """Uploads one SARIF log (plain or .gz) as its own analysis → GitHub's upload id, or None if refused.
+
+    Each upload is checked against GitHub's size and result limits on its own, which is what
+    lets sp_sarif's parts through; each part names its own category in automationDetails.id.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not path.endswith('.gz'):
+        data = gzip.compress(data)
+    status, _, body = gh.request('POST', f'/repos/{repo}/code-scanning/sarifs',
+                                 {'commit_sha': sha, 'ref': ref, 'sarif': base64.b64encode(data).decode()})
+    if status != 202:
+        print(f"Could not upload {path}: HTTP {status} {body.get('message', '')}")
+        return None
+    return body.get('id')
+
+# ── Local stub ──────────────────────────────────────────────────────────────
+
+class Stub:
+    """In-process stand-in for the parts of the GitHub API these scripts use.
+
+    Serves alert lists and issues from memory with real pagination, ETags (and
+    304s that leave the rate limit alone) and x-ratelimit-* headers, and accepts
+    issue creates, updates and comments and SARIF uploads. Set SP_GITHUB_API to
+    `url` to use it.
+    """
+
+    def __init__(self, alerts=None, issues=None, limit=5000, port=0):
+        self.alerts, self.issues = alerts or {}, issues or []
+        self.comments = []   # {'issue': number, 'body': ...} in the order they were posted
+        self.sarifs = []     # decoded SARIF logs, in the order they were uploaded
+        self.remaining, self.limit = limit, limit
+        self.calls = []   # (method, path) of every request
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def listing(self, path, query):
+        kind = re.fullmatch(r'/repos/[^/]+/[^/]+/([\w-]+)/alerts', path)
+        if kind:
+            return self.alerts.get(kind[1], [])
+        if re.fullmatch(r'/repos/[^/]+/[^/]+/issues', path):
+            labels = set(filter(None, query.get('labels', [''])[0].split(',')))
+            return [i for i in self.issues if i['state'] == query.get('state', ['open'])[0]
+                    and labels <= {l['name'] for l in i['labels']}]
+        return None
+
+    def write(self, method, path, body):
+        if method == 'POST' and re.fullmatch(r'/repos/[^/]+/[^/]+/code-scanning/sarifs', path):
+            self.sarifs.append(json.loads(gzip.decompress(base64.b64decode(body['sarif']))))
+            return 202, {'id': f'sarif-{len(self.sarifs)}', 'url': f'{self.url}{path}/sarif-{len(self.sarifs)}'}
+        m = re.fullmatch(r'/repos/[^/]+/[^/]+/issues/(\d+)/comments', path)
+        if m and method == 'POST':
+            issue = next((i for i in self.issues if i['number'] == int(m[1])), None)
+            if issue is None:
+                return 404, {'message': 'Not Found'}
+            issue['comments'] = issue.get('comments', 0) + 1
+            self.comments.append({'issue': issue['number'], **body})
+            return 201, {'id': len(self.comments), **body}
+        m = re.fullmatch(r'/repos/[^/]+/[^/]+/issues(?:/(\d+))?', path)
+        if not m or (method == 'POST') == bool(m[1]):
+            return 404, {'message': 'Not Found'}
+        labels = [{'name': l} for l in body.pop('labels', [])] or None
+        if method == 'POST':
+            issue = {'number': max([i['number'] for i in self.issues], default=0) + 1, 'state': 'open',
+                     'title': '', 'body': '', 'labels': [], 'comments': 0}
+            self.issues.append(issue)
+        else:
+            issue = next((i for i in self.issues if i['number'] == int(m[1])), None)
+            if issue is None:
+                return 404, {'message': 'Not Found'}
+        issue.update(body)
+        if labels is not None:
+            issue['labels'] = labels
+        return (201 if method == 'POST' else 200), issue
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body, headers=None, charge=True):
+                raw = b'' if status == 304 else json.dumps(body).encode()
+                with stub._lock:
+                    if charge:
+                        stub.remaining = max(0, stub.remaining - 1)
+                    limits = {'x-ratelimit-limit': str(stub.limit), 'x-ratelimit-remaining': str(stub.remaining),
+                              'x-ratelimit-reset': str(int(time.time()) + 3600)}
+                self.send_response(status)
+                for k, v in {'Content-Type': 'application/json', 'Content-Length': str(len(raw)), **limits, **(headers or {})}.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_GET(self):
+                u = urllib.parse.urlsplit(self.path)
+                stub.calls.append(('GET', self.path))
+                q = urllib.parse.parse_qs(u.query)
+                with stub._lock:
+                    items = stub.listing(u.path, q)
+                if items is None:
+                    return self.reply(404, {'message': 'Not Found'})
+                page, per = int(q.get('page', ['1'])[0]), int(q.get('per_page', ['30'])[0])
+                body = items[(page - 1) * per:page * per]
+                etag = 'W/"' + hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:32] + '"'
+                headers = {'ETag': etag}
+                if page * per < len(items):
+                    nxt = urllib.parse.urlencode({**{k: v[0] for k, v in q.items()}, 'page': page + 1})
+                    headers['Link'] = f'<{stub.url}{u.path}?{nxt}>; rel="next"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self.reply(304, None, headers, charge=False)
+                self.reply(200, body, headers)
+
+            def _write(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                stub.calls.append((self.command, self.path))
+                with stub._lock:
+                    status, out = stub.write(self.command, urllib.parse.urlsplit(self.path).path, body)
+                self.reply(status, out)
+
+            do_POST = do_PATCH = _write
+
+        return Handler
+
+def main():
+    ap = argparse.ArgumentParser(description='Read GitHub security alerts, upload SARIF, or serve a local stub of the API')
+    sub = ap.add_subparsers(dest='command', required=True)
+    a = sub.add_parser('alerts', help='write open alerts of one kind to its /tmp file and count them as a step output')
+    a.add_argument('kind', choices=sorted(ALERTS))
+    a.add_argument('--repo', default=os.environ.get('GITHUB_REPO', 'sautalwar/cushman-property-api'))
+    a.add_argument('--out', help='alerts file (default: the one for the kind)')
+    u = sub.add_parser('sarif', help='upload SARIF logs, one analysis per file')
+    u.add_argument('paths', nargs='+')
+    u.add_argument('--repo', default=os.environ.get('GITHUB_REPO', 'sautalwar/cushman-property-api'))
+    u.add_argument('--ref', default=os.environ.get('GITHUB_REF', ''))
+    u.add_argument('--sha', default=os.environ.get('GITHUB_SHA', ''))
+    s = sub.add_parser('stub', help='serve the API offline until interrupted')
+    s.add_argument('--port', type=int, default=8765)
+    s.add_argument('--fixtures', help='JSON file of {"code-scanning": [...], "secret-scanning": [...], "dependabot": [...], "issues": [...]}')
+    args = ap.parse_args()
+
+    if args.command == 'stub':
+        fixtures = {}
+        if args.fixtures:
+            with open(args.fixtures) as f:
+                fixtures = json.load(f)
+        with Stub({k: v for k, v in fixtures.items() if k in ALERTS}, fixtures.get('issues', []), port=args.port) as stub:
+            print(f"GitHub API stub on {stub.url} — export SP_GITHUB_API={stub.url}")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return
+
+    gh = GitHub(os.environ.get('GH_TOKEN') or os.environ.get('GITHUB_TOKEN', ''), cache=ETagCache())
+    if args.command == 'sarif':
+        timings = Timings('sp_github-sarif')
+        with timings.stage('upload'):
+            ids = [upload_sarif(gh, args.repo, path, args.ref, args.sha) for path in args.paths]
+        timings.report()
+        print(f"Uploaded {sum(map(bool, ids))} of {len(ids)} SARIF file(s): {', '.join(filter(None, ids))}")
+        if not all(ids):
+            sys.exit("Some SARIF files were not accepted")
+        return
+
+    # One step per kind, each with its own timings file
+    timings = Timings(f'sp_github-{args.kind}')
+    _, default_out, output = ALERTS[args.kind]
+    with timings.stage('fetch'):
+        found = alerts(gh, args.repo, args.kind)
+    with timings.stage('write'):
+        with open(args.out or default_out, 'w') as f:
+            json.dump([x._asdict() for x in found], f)
+        with open(os.environ.get('GITHUB_OUTPUT', '/tmp/gho.txt'), 'a') as f:
+            f.write(f"{output}={len(found)}\n")
+    print(f"Found {len(found)} open {args.kind} alert(s) — {gh.stats['not_modified']} of "
+          f"{gh.stats['requests']} request(s) answered from the ETag cache")
+    timings.report()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import http.client, json, queue, threading, time, urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from sp_latency import Latency, endpoint
+
+CHUNK = 64 << 10
+
+class Client:
+    """Keep-alive HTTP client for one API — connections are pooled and reused across threads."""
+
+    def __init__(self, base, timeout=4, pool_size=8, max_bytes=8 << 20):
+        u = urllib.parse.urlsplit(base)
+        self.scheme, self.host, self.port = u.scheme or 'http', u.hostname, u.port
+        self.prefix = u.path.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_bytes = max_bytes   # bodies are never read past this, however much the API sends
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self.latency = Latency()
+        self.reached = False   # set once any response comes back — tells "clean" apart from "unreachable"
+
+    def _connect(self, timeout):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=timeout)
+
+    def _checkout(self, timeout):
+        try:
+            conn = self._idle.get_nowait()
+            if conn.sock: conn.sock.settimeout(timeout)
+            return conn, True
+        except queue.Empty:
+            return self._connect(timeout), False
+
+    def _read(self, r, reader):
+        """Reads the body in chunks up to max_bytes, into a buffer or through reader.feed(); returns (buf, complete)."""
+        buf, n = bytearray(), 0
+        while n < self.max_bytes:
+            chunk = r.read(min(CHUNK, self.max_bytes - n))
+            if not chunk:
+                return buf, True
+            n += len(chunk)
+            if reader is None: buf += chunk
+            else: reader.feed(chunk)
+        return buf, not r.read(1)
+
+    @contextmanager
+    def _slot(self, deadline):
+        """A pool slot, waited for no longer than the deadline allows — yields False if none freed up in time."""
+        got = self._slots.acquire(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        try:
+            yield got
+        finally:
+            if got: self._slots.release()
+
+    def fetch(self, method, path, body=None, headers=None, deadline=None, reader=None):
+        """Returns (status, response headers, json) — status 0 means unreachable or out of time.
+
+        With a reader (e.g. sp_stream.RowCounter) the body is streamed into it instead of
+        parsed, and the reader is returned in place of the json.
+        """
+        timeout = self.timeout if deadline is None else min(self.timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            return 0, {}, {}
+        data = json.dumps(body).encode() if body else None
+        hdrs = {'Content-Type': 'application/json', **(headers or {})}
+        with self._slot(deadline) as got:
+            if deadline is not None:   # time spent waiting for the slot comes out of the request's
+                timeout = min(self.timeout, deadline - time.monotonic())
+            if not got or timeout <= 0:
+                return 0, {}, {}
+            conn, reused = self._checkout(timeout)
+            start = time.perf_counter()
+            try:
+                try:
+                    if not reused: conn.connect()
+                    connected = time.perf_counter()
+                    conn.request(method, self.prefix + path, body=data, headers=hdrs)
+                    r = conn.getresponse()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # Server dropped an idle keep-alive connection — retry once on a fresh one
+                    conn.close()
+                    if not reused: raise
+                    start = time.perf_counter()
+                    conn = self._connect(timeout)
+                    conn.connect()
+                    connected = time.perf_counter()
+                    conn.request(method, self.prefix + path, body=data, headers=hdrs)
+                    r = conn.getresponse()
+                first_byte = time.perf_counter()
+                raw, complete = self._read(r, reader if r.status < 400 else None)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                return 0, {}, {}
+            done = time.perf_counter()
+            # A body left half-read poisons the connection — only complete reads go back to the pool
+            if r.will_close or not complete: conn.close()
+            else: self._idle.put(conn)
+        self.reached = True
+        self.latency.record(endpoint(method, path), connected - start, first_byte - start, done - start)
+        rhdrs = {k.lower(): v for k, v in r.getheaders()}
+        if r.status >= 400:
+            return r.status, rhdrs, {}
+        if reader is not None:
+            reader.truncated = not complete
+            return r.status, rhdrs, reader
+        if not complete:
+            return r.status, rhdrs, {}
+        try:
+            return r.status, rhdrs, json.loads(raw)
+        except ValueError:
+            return r.status, rhdrs, {}
+
+    def request(self, method, path, body=None, headers=None, deadline=None, reader=None):
+        """Returns (status, json) like the old urlopen helper."""
+        status, _, body = self.fetch(method, path, body, headers, deadline, reader)
+        return status, body
+
+    def burst(self, method, path, bodies, headers=None, deadline=None):
+        """Sends one request per body concurrently (capped by pool size); returns statuses in order."""
+        with ThreadPoolExecutor(self.pool_size) as ex:
+            futs = [ex.submit(self.request, method, path, b, headers, deadline) for b in bodies]
+            return [f.result()[0] for f in futs]
+
+    def bound(self, deadline):
+        return Bound(self, deadline)
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+class Bound:
+    """A Client view that stops issuing requests once its deadline (monotonic seconds) has passed."""
+
+    def __init__(self, client, deadline):
+        self.client, self.deadline = client, deadline
+
+    def request(self, method, path, body=None, headers=None, reader=None):
+        return self.client.request(method, path, body, headers, self.deadline, reader)
+
+    def burst(self, method, path, bodies, headers=None):
+        return self.client.burst(method, path, bodies, headers, self.deadline)
+
+def run_parallel(client, probes, workers=8, deadline=20.0):
+    """Runs each probe(api) concurrently; returns {name: result} for probes that finished.
+
+    Every probe gets `deadline` seconds from when it starts, so a probe queued behind busy
+    workers loses none of its time. One still running a request timeout past its own
+    deadline is given up on, and the sweep as a whole stops after every round of workers
+    had its full budget, even if a probe ignores its deadline and holds on to a worker.
+    """
+    results, started = {}, {}
+    grace = deadline + client.timeout
+
+    def call(name, fn):
+        started[name] = time.monotonic()
+        return fn(client.bound(started[name] + deadline))
+
+    ex = ThreadPoolExecutor(workers)
+    futs = {ex.submit(call, name, fn): name for name, fn in probes.items()}
+    stop = time.monotonic() + -(-len(futs) // workers) * grace
+    pending = set(futs)
+    while pending:
+        due = [started[futs[f]] + grace for f in pending if futs[f] in started]
+        done, pending = wait(pending, timeout=max(0.0, min(due + [stop]) - time.monotonic()), return_when=FIRST_COMPLETED)
+        for fut in done:
+            name = futs[fut]
+            try:
+                results[name] = fut.result()
+            except Exception as e:
+                print(f"  probe {name} failed: {e!r}")
+        now = time.monotonic()
+        late = {f for f in pending if now >= stop or (futs[f] in started and now >= started[futs[f]] + grace)}
+        for fut in late:
+            print(f"  probe {futs[fut]} exceeded its {deadline:.0f}s deadline — skipped")
+        pending -= late
+    ex.shutdown(wait=False, cancel_futures=True)
+    return results
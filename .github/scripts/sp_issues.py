@@ -1,31 +1,27 @@
-import json, os, subprocess
-
-with open('/tmp/runtime_findings.json') as f:
-    data = json.load(f)
+import argparse, hashlib, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+from sp_github import ETagCache, GitHub, WORKERS
+from sp_timing import Timings
 
 repo = os.environ.get('GITHUB_REPO', 'sautalwar/cushman-property-api')
+STATE_PATH = os.environ.get('ISSUE_STATE', '/tmp/sp_issues_state/state.json')
+CLOSE_AFTER = int(os.environ.get('ISSUE_CLOSE_AFTER', 2))      # clean, fully-checked runs before an issue is closed
+RESYNC_HOURS = float(os.environ.get('ISSUE_RESYNC_HOURS', 24))   # re-list issues at least this often, changed or not
 icons = {'critical': '🔴', 'high': '🟠', 'medium': '🟡', 'low': '🔵'}
+FOOTER = '\n---\n*Auto-generated by Security Posture Dashboard'
 
-for finding in data.get('findings', []):
-    vuln_id = finding['id']
+def render(vuln_id, instances):
+    """(title, body without the run footer, labels) of the issue for one vuln."""
+    finding = instances[0]
+    targets = ', '.join(f"`{f.get('target', 'default')}`" for f in instances)
     sev     = finding['severity']
     icon    = icons.get(sev, '⚠️')
-
-    # Check if an open issue for this vuln already exists
-    existing = subprocess.run(
-        ['gh', 'issue', 'list', '--repo', repo,
-         '--label', f'vuln:{vuln_id}', '--state', 'open', '--json', 'number'],
-        capture_output=True, text=True
-    )
-    if existing.stdout.strip() not in ('', '[]', 'null'):
-        print(f"Issue already open for {vuln_id} — skipping")
-        continue
-
     body = f"""## {icon} Runtime Security Finding: `{vuln_id}`
 
 **Severity:** `{sev.upper()}`
 **OWASP Category:** {finding['rule']}
 **Affected file:** `{finding['file']}` (line {finding['line']})
+**Environments:** {targets}
 
 ---
 
@@ -53,19 +49,194 @@ Choose one of the following actions:
 | **Apply the fix** | Add label `apply-fix` | Copilot opens a PR with the patch |
 | **Accept the risk** | Add label `risk-accepted` | Issue closed, finding suppressed |
 | **Investigate** | Leave open | Stays in security backlog |
-
----
-*Auto-generated by Security Posture Dashboard · Run [{os.environ.get('GITHUB_RUN_ID','')}](https://github.com/{repo}/actions/runs/{os.environ.get('GITHUB_RUN_ID','')})*
 """
-
-    result = subprocess.run(
-        ['gh', 'issue', 'create', '--repo', repo,
-         '--title', f"{icon} Security Finding: {vuln_id} — {finding['rule'][:60]}",
-         '--body', body,
-         '--label', 'security,ai-recommendation,' + f'vuln:{vuln_id},{sev}'],
-        capture_output=True, text=True
-    )
-    if result.returncode == 0:
-        print(f"Created issue for {vuln_id}: {result.stdout.strip()}")
-    else:
-        print(f"Could not create issue for {vuln_id}: {result.stderr[:200]}")
+    return (f"{icon} Security Finding: {vuln_id} — {finding['rule'][:60]}", body,
+            ['security', 'ai-recommendation', f'vuln:{vuln_id}', sev])
+
+def footer():
+    run_id = os.environ.get('GITHUB_RUN_ID', '')
+    return f"{FOOTER} · Run [{run_id}](https://github.com/{repo}/actions/runs/{run_id})*\n"
+
+def index(issues):
+    """Open vuln:* issues → {vuln id: [issues, oldest first]}; pull requests are skipped."""
+    by_vuln = {}
+    for issue in sorted(issues, key=lambda i: i['number']):
+        if 'pull_request' in issue:
+            continue
+        for label in issue['labels']:
+            if label['name'].startswith('vuln:'):
+                by_vuln.setdefault(label['name'][5:], []).append(issue)
+    return by_vuln
+
+def digest(title, body, labels):
+    """What an issue for the vuln would say — unchanged digest, nothing to do."""
+    return hashlib.sha256(json.dumps([title, body, sorted(labels)]).encode()).hexdigest()[:16]
+
+def covered(data):
+    """Vulns every probed target was checked for — absent from the findings, they are really gone.
+
+    Empty as soon as one target was unreachable, so an outage never closes anything.
+    """
+    targets = data.get('targets') or {}
+    sets = [set(t.get('checked', [])) if t.get('reachable') else set() for t in targets.values()]
+    return set.intersection(*sets) if sets else set()
+
+class State:
+    """Last-known digest, issue number and clean-run count per vuln, kept between runs.
+
+    A vuln whose rendered issue matches its digest needs no API call; one that stopped
+    being found is counted down locally and only costs calls once it is due to close.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.vulns, self.synced = {}, 0
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.vulns, self.synced = saved.get('vulns', {}), saved.get('synced', 0)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'synced': self.synced, 'vulns': self.vulns}, f, indent=1)
+        os.replace(self.path + '.tmp', self.path)
+
+def plan(by_id, open_issues, resolve=()):
+    """Diffs the findings against the open issues → [(action, vuln id, issue number, payload)].
+
+    A vuln without an issue gets one; an issue whose title, labels or evidence no
+    longer match is updated in place; extra open issues for the same vuln are closed
+    as duplicates of the oldest. Issues of the vulns in `resolve` — no longer found —
+    are closed as completed, with a comment saying why.
+    """
+    ops = []
+    for vuln_id, instances in by_id.items():
+        title, body, labels = render(vuln_id, instances)
+        issues = open_issues.get(vuln_id, [])
+        if not issues:
+            ops.append(('create', vuln_id, None, {'title': title, 'body': body + footer(), 'labels': labels}))
+            continue
+        issue = issues[0]
+        current = {label['name'] for label in issue['labels']}
+        if (issue['title'] != title or not set(labels) <= current
+                or (issue.get('body') or '').split(FOOTER)[0].strip() != body.strip()):
+            ops.append(('update', vuln_id, issue['number'],
+                        {'title': title, 'body': body + footer(), 'labels': sorted(current | set(labels))}))
+        for dup in issues[1:]:
+            ops.append(('close', vuln_id, dup['number'], {'state': 'closed', 'state_reason': 'not_planned'}))
+    for vuln_id in resolve:
+        for issue in open_issues.get(vuln_id, []):
+            ops.append(('resolve', vuln_id, issue['number'], {'state': 'closed', 'state_reason': 'completed'}))
+    return ops
+
+def resolution(vuln_id):
+    run_id = os.environ.get('GITHUB_RUN_ID', '')
+    return (f"✅ `{vuln_id}` was not found in the last {CLOSE_AFTER} runs of the runtime probes, each of which "
+            f"reached every target and completed its check — closing as fixed. A new issue opens if it comes back.\n\n"
+            f"*Security Posture Dashboard · Run [{run_id}](https://github.com/{repo}/actions/runs/{run_id})*")
+
+def apply(gh, ops, workers=WORKERS):
+    """Runs the planned operations on a bounded worker pool → [(op, issue number or None if it failed)]."""
+    def run(op):
+        action, vuln_id, number, payload = op
+        if action == 'create':
+            status, _, data = gh.request('POST', f'/repos/{repo}/issues', payload)
+            return op, data.get('number') if status == 201 else None
+        if action == 'resolve':
+            status, _, _ = gh.request('POST', f'/repos/{repo}/issues/{number}/comments', {'body': resolution(vuln_id)})
+            if status != 201:
+                return op, None
+        status, _, _ = gh.request('PATCH', f'/repos/{repo}/issues/{number}', payload)
+        return op, number if status == 200 else None
+
+    with ThreadPoolExecutor(workers) as ex:
+        results = list(ex.map(run, ops))
+    for (action, vuln_id, number, _), issue in results:
+        verb = {'create': 'Created', 'update': 'Updated', 'close': 'Closed duplicate', 'resolve': 'Closed fixed'}[action]
+        print(f"{verb} issue #{issue} for {vuln_id}" if issue else f"Could not {action} issue for {vuln_id}")
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description='Reconcile vuln:* GitHub issues with the runtime findings')
+    ap.add_argument('--dry-run', action='store_true', help='print the plan without changing any issue')
+    ap.add_argument('--full', action='store_true', help='reconcile with GitHub even if no finding changed')
+    args = ap.parse_args()
+
+    timings = Timings('sp_issues')
+    with timings.stage('load'), open(os.environ.get('RUNTIME_FINDINGS', '/tmp/runtime_findings.json')) as f:
+        data = json.load(f)
+    state = State()
+
+    # One issue per vuln, however many environments it was found on
+    by_id = {}
+    for finding in data.get('findings', []):
+        by_id.setdefault(finding['id'], []).append(finding)
+
+    with timings.stage('diff'):
+        wanted = {v: digest(*render(v, instances)) for v, instances in by_id.items()}
+        checked = covered(data)
+        for vuln_id, entry in state.vulns.items():
+            if vuln_id in wanted:
+                entry['missing'] = 0   # found again — the clean-run count starts over
+            elif vuln_id in checked:
+                entry['missing'] = entry.get('missing', 0) + 1
+        changed = [v for v, h in wanted.items() if state.vulns.get(v, {}).get('hash') != h]
+        due = [v for v, e in state.vulns.items() if v not in wanted and e.get('missing', 0) >= CLOSE_AFTER]
+        resync = time.time() - state.synced > RESYNC_HOURS * 3600
+
+    if not (changed or due or resync or args.full):
+        print(f"{len(wanted)} finding(s) unchanged since the last run — no GitHub API calls needed")
+        if not args.dry_run:
+            state.save()
+        timings.report()
+        return
+
+    gh = GitHub(os.environ.get('GH_TOKEN') or os.environ.get('GITHUB_TOKEN', ''), cache=ETagCache())
+    try:
+        # Every issue this script creates is labelled `security`, so one paginated query covers them all
+        with timings.stage('list'):
+            open_issues = index(gh.paginate(f'/repos/{repo}/issues?state=open&labels=security&per_page=100'))
+    except RuntimeError as e:
+        print(f"Could not list open issues, leaving them unchanged: {e}")
+        timings.report()
+        return
+
+    with timings.stage('plan'):
+        # Open issues the state doesn't know about (a lost cache, a hand-made issue) start their clean-run count now
+        for vuln_id in open_issues:
+            if vuln_id not in wanted and vuln_id not in state.vulns and vuln_id in checked:
+                state.vulns[vuln_id] = {'hash': None, 'missing': 1}
+        resolve = [v for v in open_issues if v not in wanted and state.vulns.get(v, {}).get('missing', 0) >= CLOSE_AFTER]
+        ops = plan(by_id, open_issues, resolve)
+    if args.dry_run:
+        for action, vuln_id, number, _ in ops:
+            print(f"would {action} {f'#{number}' if number else 'an issue'} for {vuln_id}")
+        timings.report()
+        return
+
+    with timings.stage('apply'):
+        results = apply(gh, ops)
+    failed = {vuln_id for (_, vuln_id, _, _), issue in results if issue is None}
+    # Issues GitHub already matches, and the ones just written, are recorded so the next run can skip them
+    for vuln_id, h in wanted.items():
+        if vuln_id not in failed:
+            number = next((n for (a, v, _, _), n in results if v == vuln_id and a in ('create', 'update')), None)
+            number = number or open_issues.get(vuln_id, [{}])[0].get('number')
+            state.vulns[vuln_id] = {'hash': h, 'issue': number, 'missing': 0}
+    for vuln_id in list(state.vulns):
+        # Fixed and closed now, or closed by hand since the last run: nothing left to track
+        if vuln_id not in wanted and vuln_id not in failed and (vuln_id in resolve or vuln_id not in open_issues):
+            del state.vulns[vuln_id]
+    state.synced = time.time()
+    state.save()
+
+    done = [action for (action, *_), issue in results if issue]
+    print(f"{len(by_id)} vuln(s), {sum(map(len, open_issues.values()))} open issue(s): "
+          f"{done.count('create')} created, {done.count('update')} updated, "
+          f"{done.count('resolve')} closed as fixed, {done.count('close')} duplicate(s) closed"
+          + (f", {gh.remaining} API requests left" if gh.remaining is not None else ''))
+    timings.report()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import re, threading
+
+PHASES = ('connect', 'ttfb', 'total')
+_ID = re.compile(r'/(?:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|\d+)(?=/|$)', re.I)
+
+def endpoint(method, path):
+    """`GET /api/jobs/<uuid>?x=1` → `GET /api/jobs/:id` so samples for one route share a histogram."""
+    return f"{method} {_ID.sub('/:id', path.split('?', 1)[0])}"
+
+class Histogram:
+    """HDR-style log-linear histogram of microsecond values.
+
+    Values below 2**bits are counted exactly; larger ones share a bucket with every value
+    that has the same top `bits` bits, so each bucket is within 1/2**(bits-1) relative
+    error whatever the magnitude — 7 bits keeps percentiles within ~1.6%.
+    """
+
+    def __init__(self, bits=7):
+        self.bits = bits
+        self.counts = {}
+        self.n = 0
+
+    def record(self, us):
+        us = max(0, int(us))
+        shift = max(0, us.bit_length() - self.bits)
+        key = (us >> shift) << shift
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.n += 1
+
+    def percentile(self, q):
+        """Value at quantile q (0–100), as the midpoint of its bucket."""
+        if not self.n:
+            return 0
+        rank, seen = q / 100 * self.n, 0
+        for k in sorted(self.counts):
+            seen += self.counts[k]
+            if seen >= rank:
+                width = 1 << max(0, k.bit_length() - self.bits)
+                return k + width // 2
+        return max(self.counts)
+
+class Latency:
+    """Thread-safe per-endpoint histograms for connect, time-to-first-byte and total time."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, connect, ttfb, total):
+        with self._lock:
+            hists = self.endpoints.setdefault(key, {p: Histogram() for p in PHASES})
+            for p, secs in zip(PHASES, (connect, ttfb, total)):
+                hists[p].record(secs * 1e6)
+
+    def summary(self):
+        """{endpoint: {'count': n, 'connect'|'ttfb'|'total': {'p50','p95','p99'} in ms}}"""
+        with self._lock:
+            return {key: {'count': h['total'].n,
+                          **{p: {f"p{q}": round(h[p].percentile(q) / 1000, 1) for q in (50, 95, 99)} for p in PHASES}}
+                    for key, h in sorted(self.endpoints.items())}
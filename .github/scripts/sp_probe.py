@@ -1,47 +1,18 @@
-import json, os, urllib.request, urllib.error, base64, time
+import argparse, json, os, base64, time, urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from sp_http import Client
+from sp_stream import RowCounter
+from sp_registry import INCONCLUSIVE, Probe, Declarative, Context, register, select, run
+from sp_tokens import TokenCache
+from sp_timing import Timings
 
-api = os.environ.get('API_URL', 'http://localhost:3001')
-findings = []
+# Seeded demo accounts the probes act as
+IDENTITIES = {
+    'alice':   'alice@propowner.com',
+    'bob':     'bob@propowner.com',
+    'charlie': 'charlie@plumbing.com',
+}
 
-def http(method, path, body=None, headers=None):
-    """Simple HTTP helper — avoids needing curl or requests library."""
-    url = f"{api}{path}"
-    data = json.dumps(body).encode() if body else None
-    hdrs = {'Content-Type': 'application/json', **(headers or {})}
-    try:
-        req = urllib.request.Request(url, data=data, headers=hdrs, method=method)
-        with urllib.request.urlopen(req, timeout=4) as r:
-            return r.status, json.loads(r.read())
-    except urllib.error.HTTPError as e:
-        return e.code, {}
-    except Exception:
-        return 0, {}   # API unreachable in CI — skip probe
-
-def login(email):
-    status, body = http('POST', '/api/auth/login',
-                         {'email': email, 'password': 'Password123!'})
-    return body.get('data', {}).get('token', '') if status == 200 else ''
-
-# ── Probe 1: BOLA ──────────────────────────────────────────────────────────
-# Bob (different owner) tries to read Alice's job. Should get 403, not 200.
-bob_token = login('bob@propowner.com')
-if bob_token:
-    status, body = http('GET', '/api/jobs/cccccccc-0000-0000-0000-000000000001',
-                         headers={'Authorization': f'Bearer {bob_token}'})
-    if status == 200:
-        findings.append({
-            'id': 'VULN-1-BOLA', 'severity': 'critical',
-            'rule': 'API1:2023 — Broken Object Level Authorization',
-            'file': 'api/src/services/JobService.ts', 'line': 12,
-            'message': f"Bob accessed Alice's job (HTTP {status}). "
-                       f"Job title: '{body.get('data',{}).get('title','N/A')}'. "
-                       "No owner_id check in SQL query.",
-            'fix': "Add 'AND owner_id = $2' to WHERE clause in getJobById()"
-        })
-
-# ── Probe 2: Broken Auth ───────────────────────────────────────────────────
-# Send a token with exp = 1 hour ago. Should get 401, not 200.
-import struct
 def make_expired_jwt():
     now = int(time.time())
     hdr = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=').decode()
@@ -51,70 +22,179 @@ def make_expired_jwt():
     }).encode()).rstrip(b'=').decode()
     return f"{hdr}.{pay}.invalidsig"
 
-expired = make_expired_jwt()
-status, _ = http('GET', '/api/jobs', headers={'Authorization': f'Bearer {expired}'})
-if status == 200:
-    findings.append({
+# ── Probe 1: BOLA ──────────────────────────────────────────────────────────
+# Bob (different owner) tries to read Alice's job. Should get 403, not 200.
+register(Declarative(
+    'bola', 'GET', '/api/jobs/cccccccc-0000-0000-0000-000000000001',
+    identity='bob', expect=(403, 404), tags=('fast', 'authz'),
+    finding={
+        'id': 'VULN-1-BOLA', 'severity': 'critical',
+        'rule': 'API1:2023 — Broken Object Level Authorization',
+        'file': 'api/src/services/JobService.ts', 'line': 12,
+        'message': "Bob accessed Alice's job (HTTP {status}). "
+                   "Job title: '{data[title]}'. "
+                   "No owner_id check in SQL query.",
+        'fix': "Add 'AND owner_id = $2' to WHERE clause in getJobById()"
+    }))
+
+# ── Probe 2: Broken Auth ───────────────────────────────────────────────────
+# Send a token with exp = 1 hour ago. Should get 401, not 200.
+register(Declarative(
+    'expired_jwt', 'GET', '/api/jobs',
+    identity='expired-admin', expect=(401,), tags=('fast', 'auth'),
+    finding={
         'id': 'VULN-2-AUTH', 'severity': 'critical',
         'rule': 'API2:2023 — Broken Authentication',
         'file': 'api/src/middleware/auth.ts', 'line': 18,
-        'message': f"Expired JWT accepted (HTTP {status}). "
+        'message': "Expired JWT accepted (HTTP {status}). "
                    "ignoreExpiration: true allows tokens expired hours/days ago.",
         'fix': "Remove ignoreExpiration: true from jwt.verify() options"
-    })
+    }))
 
 # ── Probe 3: Rate Limit ────────────────────────────────────────────────────
-# Send 20 rapid requests. If none return 429, rate limiting is missing.
-charlie_token = login('charlie@plumbing.com')
-if charlie_token:
-    got_429 = False
-    for i in range(20):
-        status, _ = http('POST', '/api/jobs/cccccccc-0000-0000-0000-000000000001/bids',
-                          {'amount': 100 + i},
-                          headers={'Authorization': f'Bearer {charlie_token}'})
-        if status == 429:
-            got_429 = True
-            break
-    if not got_429:
-        findings.append({
+# Send a 20-request burst. If none return 429, rate limiting is missing.
+@register
+class RateLimitProbe(Probe):
+    name, severity, tags = 'rate_limit', 'medium', ('slow', 'abuse')
+    vuln = 'VULN-6-RATELIMIT'
+
+    def run(self, http, ctx):
+        charlie_token = ctx.token(http, 'charlie')
+        if not charlie_token:
+            return INCONCLUSIVE
+        statuses = http.burst('POST', '/api/jobs/cccccccc-0000-0000-0000-000000000001/bids',
+                              [{'amount': 100 + i} for i in range(20)],
+                              headers={'Authorization': f'Bearer {charlie_token}'})
+        if 429 in statuses:
+            return None
+        # Requests cut off by the deadline come back as 0, and a 5xx (or any other refusal) is not an
+        # accepted bid — only a burst the API served in full proves the limiter is missing
+        if not all(200 <= s < 300 for s in statuses):
+            return INCONCLUSIVE
+        return {
             'id': 'VULN-6-RATELIMIT', 'severity': 'medium',
             'rule': 'API4:2023 — Unrestricted Resource Consumption',
             'file': 'api/src/routes/jobs.ts', 'line': 45,
             'message': "20 consecutive bid requests accepted without any 429 response. "
                        "No per-user rate limiter on POST /api/jobs/:id/bids.",
             'fix': "Add express-rate-limit with keyGenerator: (req) => req.user.userId"
-        })
+        }
 
 # ── Probe 4: SQL Injection ─────────────────────────────────────────────────
 # Send injection payload to /search. If row count is abnormally high → vulnerable.
-alice_token = login('alice@propowner.com')
-if alice_token:
-    _, baseline = http('GET', '/api/properties?limit=5',
-                        headers={'Authorization': f'Bearer {alice_token}'})
-    safe_count = baseline.get('count', 0)
-    try:
-        import urllib.parse
+@register
+class SqlInjectionProbe(Probe):
+    name, severity, tags = 'sqli', 'critical', ('fast', 'injection')
+    vuln = 'VULN-8-SQLI'
+
+    def run(self, http, ctx):
+        alice_token = ctx.token(http, 'alice')
+        if not alice_token:
+            return INCONCLUSIVE
+        auth = {'Authorization': f'Bearer {alice_token}'}
+        status, baseline = http.request('GET', '/api/properties?limit=5', headers=auth)
+        if not 200 <= status < 300:   # no safe baseline to compare against
+            return INCONCLUSIVE
+        safe_count = baseline.get('count', 0)
         q = urllib.parse.quote("' OR 1=1 --")
-        status, body = http('GET', f'/api/properties/search?q={q}',
-                             headers={'Authorization': f'Bearer {alice_token}'})
-        injected_count = body.get('count', 0)
+        # A successful injection can dump the whole table — count rows while streaming, never buffer them
+        rows = RowCounter('data')
+        status, _ = http.request('GET', f'/api/properties/search?q={q}', headers=auth, reader=rows)
+        if not status or status >= 500:
+            return INCONCLUSIVE
+        injected_count = rows.count if rows.truncated else rows.fields.get('count', rows.count)
+        shown = f"at least {injected_count} (response cut at {rows.bytes >> 20} MB)" if rows.truncated else injected_count
         if isinstance(injected_count, int) and isinstance(safe_count, int):
             if injected_count > safe_count + 2:
-                findings.append({
+                return {
                     'id': 'VULN-8-SQLI', 'severity': 'critical',
                     'rule': 'API8:2023 — Security Misconfiguration (SQL Injection)',
                     'file': 'api/src/services/PropertyService.ts', 'line': 67,
-                    'message': f"SQL injection returned {injected_count} rows vs safe baseline {safe_count}. "
+                    'message': f"SQL injection returned {shown} rows vs safe baseline {safe_count}. "
                                "Payload: q=' OR 1=1 --",
                     'fix': "Replace string concat with parameterized: WHERE name ILIKE $1"
-                })
-    except Exception:
-        pass
+                }
+
+def csv(value):
+    return [v.strip() for v in value.split(',') if v.strip()] if value else None
+
+def parse_targets(spec, default_url, default_name='default'):
+    """`name=url,name=url` (commas or newlines) → {name: url}; a bare URL is named after its host."""
+    targets = {}
+    for item in (spec or '').replace('\n', ',').split(','):
+        item = item.strip()
+        if not item: continue
+        name, sep, url = item.partition('=')
+        if not sep or '://' in name:
+            name, url = urllib.parse.urlsplit(item).netloc or item, item
+        targets[name.strip()] = url.strip().rstrip('/')
+    return targets or {default_name: default_url}
+
+def probe_target(name, url, probes, concurrency, deadline, cache):
+    """One target = its own connection pool and login context, so slow targets don't starve fast ones."""
+    client = Client(url, timeout=4, pool_size=concurrency,
+                    max_bytes=int(os.environ.get('PROBE_MAX_BYTES', 8 << 20)))
+    ctx = Context(IDENTITIES, url, cache, synthetic={'expired-admin': make_expired_jwt})
+    started, done = time.monotonic(), set()
+    try:
+        findings = run(client, probes, ctx, workers=concurrency, deadline=deadline, done=done)
+    finally:
+        client.close()
+    # `checked`: vulns whose probe reached a verdict against a live target — absent from findings means not present
+    checked = sorted(p.vuln for p in probes if p.vuln and p.name in done) if client.reached else []
+    return {'url': url, 'reachable': client.reached, 'elapsed': round(time.monotonic() - started, 2),
+            'findings': [{**f, 'target': name} for f in findings], 'checked': checked,
+            'latency': client.latency.summary()}
+
+def main():
+    ap = argparse.ArgumentParser(description='Runtime API security probes')
+    ap.add_argument('--probe', default=os.environ.get('PROBE_NAMES', ''), help='comma-separated probe names')
+    ap.add_argument('--tags', default=os.environ.get('PROBE_TAGS', ''), help='run probes having any of these tags')
+    ap.add_argument('--severity', default=os.environ.get('PROBE_SEVERITY', ''), help='comma-separated severities')
+    ap.add_argument('--targets', default=os.environ.get('API_TARGETS', ''), help='name=url pairs to probe concurrently')
+    ap.add_argument('--environment', default=os.environ.get('PROBE_ENVIRONMENT', ''),
+                    help='only probe targets whose name starts with this (e.g. production)')
+    ap.add_argument('--list', action='store_true', help='list matching probes and exit')
+    args = ap.parse_args()
+
+    probes = select(csv(args.probe), csv(args.tags), csv(args.severity))
+    if args.list:
+        for p in probes:
+            print(f"{p.name:<14} {p.severity:<9} {','.join(p.tags)}")
+        return
+
+    env = '' if args.environment == 'all' else args.environment
+    api_url = os.environ.get('API_URL', 'http://localhost:3001')
+    targets = parse_targets(args.targets, api_url, env or 'default')
+    targets = {n: u for n, u in targets.items() if n.startswith(env)}
+    if not targets:
+        # e.g. `local` picked while API_TARGETS only lists deployed targets — probe API_URL rather than fail the run
+        print(f"::warning::No probe target matches environment '{env}' — probing API_URL ({api_url}) instead")
+        targets = {env: api_url}
+    concurrency = int(os.environ.get('PROBE_CONCURRENCY', 8))
+    deadline = float(os.environ.get('PROBE_DEADLINE', 20))
+    cache = TokenCache()
+
+    # Targets are independent too — fan out across them, each with its own pool
+    timings = Timings('sp_probe')
+    started = time.monotonic()
+    with timings.stage('probe'):
+        with ThreadPoolExecutor(len(targets)) as ex:
+            futs = {n: ex.submit(probe_target, n, u, probes, concurrency, deadline, cache) for n, u in targets.items()}
+            per_target = {n: fut.result() for n, fut in futs.items()}
+        for n, t in per_target.items():
+            timings.record(n, t['elapsed'])   # each target ran on its own thread — wall time only
+    findings = [f for t in per_target.values() for f in t['findings']]
+
+    # Write results — `findings` stays a flat list (each tagged with its target) for existing consumers
+    with timings.stage('write'), open(os.environ.get('RUNTIME_FINDINGS', '/tmp/runtime_findings.json'), 'w') as f:
+        json.dump({'findings': findings, 'targets': per_target, 'probes': [p.name for p in probes]}, f, indent=2)
 
-# Write results
-with open('/tmp/runtime_findings.json', 'w') as f:
-    json.dump({'findings': findings}, f, indent=2)
+    print(f"Runtime probes complete — {len(probes)} probe(s) × {len(targets)} target(s), "
+          f"{len(findings)} finding(s) in {time.monotonic() - started:.1f}s")
+    for f in findings:
+        print(f"  [{f['severity'].upper()}] {f['target']} {f['id']}: {f['message'][:80]}...")
+    timings.report()
 
-print(f"Runtime probes complete — {len(findings)} finding(s)")
-for f in findings:
-    print(f"  [{f['severity'].upper()}] {f['id']}: {f['message'][:80]}...")
+if __name__ == '__main__':
+    main()
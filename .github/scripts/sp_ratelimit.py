@@ -0,0 +1,172 @@
+import argparse, json, os, re, time
+from concurrent.futures import ThreadPoolExecutor
+from sp_http import Client
+import rl_io, sp_tokens
+from sp_timing import Timings, stage
+
+MEASURE_PATH = os.environ.get('RL_MEASURE', '/tmp/ratelimit_measure.json')
+BID_PATH = '/api/jobs/cccccccc-0000-0000-0000-000000000001/bids'
+LIMIT_HEADERS = ('retry-after', 'ratelimit', 'ratelimit-policy', 'ratelimit-limit', 'ratelimit-remaining',
+                 'ratelimit-reset', 'x-ratelimit-limit', 'x-ratelimit-remaining', 'x-ratelimit-reset')
+
+def burst(client, token, n, deadline):
+    """Fires n bid requests concurrently; returns counts plus the rate-limit headers of the first 429 (or last reply)."""
+    hdrs = {'Authorization': f'Bearer {token}'}
+    if n <= 0:
+        return {'sent': 0, 'passed': 0, 'limited': 0, 'failed': 0, 'headers': {}}
+    with ThreadPoolExecutor(min(n, client.pool_size)) as ex:
+        replies = list(ex.map(lambda i: client.fetch('POST', BID_PATH, {'amount': 100 + i}, hdrs, deadline), range(n)))
+    limited = [r for r in replies if r[0] == 429]
+    failed = sum(1 for r in replies if r[0] == 0)
+    seen = limited[0][1] if limited else next((r[1] for r in reversed(replies) if r[0]), {})
+    return {'sent': n, 'passed': n - len(limited) - failed, 'limited': len(limited), 'failed': failed,
+            'headers': {k: v for k, v in seen.items() if k in LIMIT_HEADERS}}
+
+def reset_hint(headers):
+    """Seconds until the window resets, from Retry-After / RateLimit-Reset / RateLimit-Policy — None if absent."""
+    for key in ('retry-after', 'ratelimit-reset', 'x-ratelimit-reset'):
+        try:
+            v = float(headers[key])
+        except (KeyError, ValueError):
+            continue
+        return max(0.0, v - time.time()) if v > 1e9 else v   # some servers send an epoch timestamp
+    return policy_window(headers)
+
+def policy_window(headers):
+    """Window length in seconds advertised by a RateLimit-Policy `w=` parameter, if any."""
+    m = re.search(r'\bw=(\d+)', headers.get('ratelimit-policy', '') + headers.get('ratelimit', ''))
+    return float(m.group(1)) if m else None
+
+def header_limit(headers):
+    for key in ('ratelimit-limit', 'x-ratelimit-limit'):
+        try:
+            return int(headers[key].split(',')[0].split(';')[0])
+        except (KeyError, ValueError):
+            pass
+    m = re.search(r'(?:^|[\s,])(\d+);w=', headers.get('ratelimit-policy', ''))
+    return int(m.group(1)) if m else None
+
+def wait_for_reset(client, token, deadline, hint, poll=1.0):
+    """Waits until the limiter admits a request again; returns seconds waited, or None if the deadline hit first.
+
+    The admitting request itself counts toward the fresh window — callers carry it into the next burst.
+    """
+    start = time.monotonic()
+    if hint:
+        time.sleep(max(0.0, min(hint, deadline - time.monotonic())))
+    while time.monotonic() < deadline:
+        if burst(client, token, 1, deadline)['passed']:
+            return time.monotonic() - start
+        time.sleep(poll)
+    return None
+
+def measure(client, token, max_requests=200, deadline_s=240, max_trials=8):
+    """Measures the limiter: the largest burst it admits per window, and the window length.
+
+    1. Discovery — escalating concurrent bursts (4, 8, 16, …) until the first 429. The
+       requests admitted so far are the first guess for the limit.
+    2. Window — exhaust a fresh window and time how long until requests are admitted again
+       (RateLimit-Policy `w=` wins when the server sends it).
+    3. Bisection — one trial per fresh window narrows [largest admitted, smallest rejected).
+    """
+    deadline = time.monotonic() + deadline_s
+    sent = passed = 0
+    size, last = 4, None
+    while sent < max_requests and time.monotonic() < deadline:
+        last = burst(client, token, min(size, max_requests - sent), deadline)
+        sent, passed = sent + last['sent'], passed + last['passed']
+        if last['limited']:
+            break
+        size *= 2
+    limited = bool(last and last['limited'])
+    result = {'rate_limited': limited, 'sent': sent, 'accepted': passed, 'limit': None, 'range': None,
+              'window_s': None, 'per_minute': None, 'converged': False, 'trials': 0,
+              'header_limit': header_limit(last['headers']) if last else None,
+              'headers': last['headers'] if last else {}}
+    if not limited:
+        return result
+
+    lo, hi = 0, passed + 1
+    window = policy_window(result['headers'])
+    if wait_for_reset(client, token, deadline, reset_hint(last['headers'])) is None:
+        return result
+    if window is None:
+        started = time.monotonic()
+        b = burst(client, token, hi, deadline)
+        if not b['limited'] or wait_for_reset(client, token, deadline, reset_hint(b['headers'])) is None:
+            return result
+        window = time.monotonic() - started
+    result['window_s'] = round(window, 1)
+
+    carry, guess = 1, passed   # the request that saw the reset already counts toward the window
+    while hi - lo > 1 and result['trials'] < max_trials:
+        mid = guess if guess is not None and lo < guess < hi else (lo + hi) // 2
+        guess = None
+        b = burst(client, token, mid - carry, deadline)
+        result['trials'] += 1
+        if b['failed']:
+            break
+        if b['limited']:
+            hi, carry = mid, 1
+            if wait_for_reset(client, token, deadline, reset_hint(b['headers'])) is None:
+                break
+        else:
+            lo, carry = mid, 0
+            if time.monotonic() + window >= deadline:
+                break
+            time.sleep(window)   # let every request of this trial age out of the window
+    result.update(range=[lo, hi], converged=hi - lo <= 1)
+    # lo = 0: no trial got through unlimited before the search stopped — only an upper bound is known
+    if lo:
+        result.update(limit=lo, per_minute=round(lo * 60 / window, 1))
+    return result
+
+def probe(api, identity='charlie@plumbing.com', max_requests=200, deadline=240):
+    """Logs in as `identity` and measures the limit; an unreachable API reports `reachable: False`, nothing sent."""
+    client = Client(api, timeout=4, pool_size=16)
+    with stage('login'):
+        token = sp_tokens.token(client, api, identity, sp_tokens.TokenCache())
+    if token:
+        with stage('measure'):
+            result = measure(client, token, max_requests, deadline)
+    else:
+        print("API not reachable — historical analysis only")
+        result = {'rate_limited': False, 'sent': 0, 'accepted': 0, 'reachable': False}
+    client.close()
+
+    if result['rate_limited']:
+        print(f"Rate limit triggered after {result['accepted']} accepted request(s)")
+        if result['limit'] is not None:
+            print(f"Measured limit: {result['limit']} per {result['window_s']}s window "
+                  f"(range {result['range']}, {result['trials']} trial(s), header limit {result['header_limit']})")
+        else:
+            print(f"Limit not measured — the search stopped before any burst got through "
+                  f"(range {result['range']}, {result['trials']} trial(s), header limit {result['header_limit']})")
+    elif token:
+        print(f"No 429 after {result['sent']} requests — no rate limiting detected")
+    return result
+
+def outputs(result):
+    return {'rate_limited': int(result['rate_limited']), 'accepted': result['accepted'],
+            'reachable': int(result.get('reachable', True)),
+            'measured_limit': result.get('limit'), 'measured_window': result.get('window_s'),
+            'measured_per_minute': result.get('per_minute')}
+
+def main():
+    ap = argparse.ArgumentParser(description='Measure the per-user rate limit on POST /api/jobs/:id/bids')
+    ap.add_argument('--api', default=os.environ.get('API_URL', 'http://localhost:3001'))
+    ap.add_argument('--identity', default='charlie@plumbing.com')
+    ap.add_argument('--max-requests', type=int, default=200, help='discovery stops here if no 429 shows up')
+    ap.add_argument('--deadline', type=float, default=240, help='seconds for the whole measurement')
+    ap.add_argument('--out', default=MEASURE_PATH)
+    args = ap.parse_args()
+
+    timings = Timings('sp_ratelimit')
+    result = probe(args.api, args.identity, args.max_requests, args.deadline)
+    with open(args.out, 'w') as f:
+        json.dump(result, f, indent=2)
+    rl_io.set_outputs(outputs(result))
+    timings.report()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import threading
+import sp_tokens
+from sp_http import run_parallel
+
+REGISTRY = {}
+# A probe's answer when it couldn't tell: unreachable, timed out, 5xx or no login. Unlike None
+# (checked, not vulnerable) it says nothing about the vuln, so the vuln doesn't count as checked.
+INCONCLUSIVE = 'inconclusive'
+
+def register(probe):
+    """Adds a probe instance (or a Probe subclass, which is instantiated) to the registry."""
+    inst = probe() if isinstance(probe, type) else probe
+    if inst.name in REGISTRY:
+        raise ValueError(f"duplicate probe name: {inst.name}")
+    REGISTRY[inst.name] = inst
+    return probe
+
+class Probe:
+    """Base class — subclasses set name/severity/tags/vuln and implement
+    run(http, ctx) → finding dict, None when clean, or INCONCLUSIVE."""
+    name = ''
+    severity = 'medium'
+    tags = ()
+    vuln = ''   # id of the finding this probe reports — a clean run means that vuln wasn't seen
+
+    def run(self, http, ctx):
+        raise NotImplementedError
+
+class _Fields(dict):
+    def __missing__(self, key):
+        return 'N/A'
+
+class Declarative(Probe):
+    """A single-request probe: clean on the expected refusal, a finding when the API serves the
+    request anyway (a status in `vulnerable`, 2xx by default), inconclusive on anything else."""
+
+    def __init__(self, name, method, path, expect, finding, identity=None, body=None, tags=(),
+                 vulnerable=range(200, 300)):
+        self.name, self.method, self.path, self.body = name, method, path, body
+        self.expect, self.identity, self.finding = tuple(expect), identity, finding
+        self.vulnerable = vulnerable
+        self.severity, self.tags, self.vuln = finding['severity'], tuple(tags), finding['id']
+
+    def run(self, http, ctx):
+        headers = {}
+        if self.identity:
+            token = ctx.token(http, self.identity)
+            if not token:
+                return INCONCLUSIVE
+            headers['Authorization'] = f'Bearer {token}'
+        status, body = http.request(self.method, self.path, self.body, headers=headers)
+        if status in self.expect:
+            return None
+        # 0 = unreachable, 5xx = broken, a 429 or another refusal = not served — none of them proves anything
+        if status not in self.vulnerable:
+            return INCONCLUSIVE
+        fields = {'status': status, 'expect': '/'.join(map(str, self.expect)),
+                  'data': _Fields(body.get('data') if isinstance(body.get('data'), dict) else {})}
+        return {k: v.format_map(fields) if isinstance(v, str) else v for k, v in self.finding.items()}
+
+class Context:
+    """Per-run state shared by probes: identities, and a token cache so each identity logs in at most once."""
+
+    def __init__(self, identities, api, cache, synthetic=None):
+        self.identities, self.api, self.cache = identities, api, cache
+        self.synthetic = synthetic or {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def token(self, http, identity):
+        if identity in self.synthetic:
+            return self.synthetic[identity]()
+        with self._lock:
+            lock = self._locks.setdefault(identity, threading.Lock())
+        with lock:
+            return sp_tokens.token(http, self.api, self.identities[identity], self.cache)
+
+def select(names=None, tags=None, severities=None):
+    """Registered probes matching every given filter; tags match if any tag overlaps."""
+    picked = []
+    for probe in REGISTRY.values():
+        if names and probe.name not in names: continue
+        if tags and not set(tags) & set(probe.tags): continue
+        if severities and probe.severity not in severities: continue
+        picked.append(probe)
+    return picked
+
+def run(client, probes, ctx, workers=8, deadline=20.0, done=None):
+    """Runs the selected probes in parallel; returns findings in registry order.
+
+    The names of the probes that reached a verdict — a finding or a clean check —
+    are added to `done`; inconclusive, failed and timed-out probes are left out.
+    """
+    results = run_parallel(client, {p.name: (lambda http, p=p: p.run(http, ctx)) for p in probes},
+                           workers=workers, deadline=deadline)
+    if done is not None:
+        done.update(name for name, r in results.items() if r is not INCONCLUSIVE)
+    return [results[p.name] for p in probes if isinstance(results.get(p.name), dict)]
@@ -1,55 +1,241 @@
-import json, time
+import hashlib, json, os, re, zlib
+from sp_timing import Timings
 
-with open('/tmp/runtime_findings.json') as f:
-    data = json.load(f)
+SARIF_PATH = os.environ.get('SARIF_PATH', '/tmp/sarif/results.sarif')   # extra parts land next to it
+CATEGORY = os.environ.get('SARIF_CATEGORY', 'runtime-api-probe')
+# Only the results that changed since the previous run, for people and tools following the diff
+DELTA_PATH = os.environ.get('SARIF_DELTA', '/tmp/sarif_delta/delta.sarif')
+# The previous run's results by fingerprint — cached between runs
+BASELINE_PATH = os.environ.get('SARIF_BASELINE', '/tmp/sarif_state/baseline.json')
+FINGERPRINT = 'runtimeFinding/v1'
+# GitHub rejects uploads over 10 MB gzip-compressed or with more than 25,000 results in a run;
+# parts stop short of 10 MB to leave room for the rules table that closes each one
+MAX_BYTES = int(os.environ.get('SARIF_MAX_BYTES', 9 << 20))
+MAX_RESULTS = int(os.environ.get('SARIF_MAX_RESULTS', 25_000))
 
-findings = data.get('findings', [])
+SCHEMA = "https://raw.githubusercontent.com/oasis-tcs/sarif-spec/master/Schemata/sarif-schema-2.1.0.json"
+DRIVER = {"name": "PropTracker Runtime API Security Probe", "version": "1.0.0",
+          "informationUri": "https://github.com/sautalwar/cushman-property-api"}
 
 # SARIF severity mapping
 sev_map = {'critical': 'error', 'high': 'error', 'medium': 'warning', 'low': 'note'}
+security_severity = {'critical': '9.0', 'high': '7.0'}
 
-# Build SARIF 2.1.0 document
-sarif = {
-    "version": "2.1.0",
-    "$schema": "https://raw.githubusercontent.com/oasis-tcs/sarif-spec/master/Schemata/sarif-schema-2.1.0.json",
-    "runs": [{
-        "tool": {
-            "driver": {
-                "name": "PropTracker Runtime API Security Probe",
-                "version": "1.0.0",
-                "informationUri": "https://github.com/sautalwar/cushman-property-api",
-                "rules": [
-                    {
-                        "id": f["id"],
-                        "name": f["id"].replace("-", ""),
-                        "shortDescription": {"text": f["rule"]},
-                        "fullDescription": {"text": f["message"]},
-                        "helpUri": "https://owasp.org/API-Security/",
-                        "properties": {"security-severity": "9.0" if f["severity"] == "critical" else "7.0" if f["severity"] == "high" else "5.0"}
-                    }
-                    for f in findings
-                ]
-            }
-        },
-        "results": [
-            {
-                "ruleId": f["id"],
-                "level": sev_map.get(f["severity"], "warning"),
-                "message": {"text": f"{f['message']} Fix: {f['fix']}"},
-                "locations": [{
-                    "physicalLocation": {
-                        "artifactLocation": {"uri": f["file"], "uriBaseId": "%SRCROOT%"},
-                        "region": {"startLine": f["line"]}
-                    }
-                }]
+def rule(f):
+    return {
+        "id": f["id"],
+        "name": f["id"].replace("-", ""),
+        "shortDescription": {"text": f["rule"]},
+        "fullDescription": {"text": f["message"]},
+        "helpUri": "https://owasp.org/API-Security/",
+        "properties": {"security-severity": security_severity.get(f["severity"], "5.0")}
+    }
+
+def fingerprint(f):
+    """Stable across runs: the same vuln at the same place on the same target."""
+    key = f"{f['id']}\0{f['file']}\0{f['line']}\0{f.get('target', 'default')}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def result(f, index, state=None):
+    r = {
+        "ruleId": f["id"],
+        "ruleIndex": index,
+        "level": sev_map.get(f["severity"], "warning"),
+        "message": {"text": f"[{f.get('target', 'default')}] {f['message']}" + (f" Fix: {f['fix']}" if f.get('fix') else '')},
+        "locations": [{
+            "physicalLocation": {
+                "artifactLocation": {"uri": f["file"], "uriBaseId": "%SRCROOT%"},
+                "region": {"startLine": f["line"]}
             }
-            for f in findings
-        ],
-        "automationDetails": {"id": f"runtime-probe/{int(time.time())}"}
-    }]
-}
+        }],
+        "partialFingerprints": {FINGERPRINT: fingerprint(f)},
+        "properties": {"target": f.get("target", "default")}
+    }
+    if state:
+        r["baselineState"] = state
+    return r
+
+def dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+class SarifWriter:
+    """Streams a SARIF 2.1.0 log to disk one compact result at a time.
+
+    Rules are deduplicated by id as findings arrive and results point at them by
+    ruleIndex. Each part writes its results first and its tool.driver.rules last
+    (JSON key order is free), so only the rules table is ever held in memory.
+    A part is closed and the next started before it would pass `max_results`
+    results or `max_bytes` gzip-compressed, the size GitHub checks; each part is
+    its own run and category. A path ending in .gz writes gzip parts, otherwise
+    the compressed size is measured alongside the plain file.
+    """
+
+    def __init__(self, path=SARIF_PATH, category=CATEGORY, max_bytes=MAX_BYTES, max_results=MAX_RESULTS):
+        self.path, self.category = path, category
+        self.max_bytes, self.max_results = max_bytes, max_results
+        self.gzip = path.endswith('.gz')
+        self.rules, self.index = [], {}   # rule dicts in ruleIndex order, id → ruleIndex
+        self.parts = []                   # [path, results] per part written
+        self._f = None
+
+    def __enter__(self):
+        self._open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def part_path(self, n):
+        if n == 1:
+            return self.path
+        folder, name = os.path.split(self.path)
+        stem, dot, ext = name.partition('.')
+        return os.path.join(folder, f'{stem}-{n}{dot}{ext}')
+
+    def _open(self):
+        n = len(self.parts) + 1
+        self.parts.append([self.part_path(n), 0])
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._f = open(self.parts[-1][0], 'wb')
+        # Level 1 when only measuring: it compresses worse than the upload will, so the estimate errs large
+        self._z = zlib.compressobj(6 if self.gzip else 1, wbits=31 if self.gzip else 15)
+        self._zsize = 0
+        # A fixed id per part, so GitHub matches each part's alerts with the same part's previous upload
+        category = self.category if n == 1 else f'{self.category}/part-{n}'
+        self._write(b'{"version":"2.1.0","$schema":' + dumps(SCHEMA) + b',"runs":[{"automationDetails":'
+                    + dumps({"id": f"{category}/"}) + b',"results":[')
+
+    def _write(self, data):
+        z = self._z.compress(data)
+        self._zsize += len(z)
+        self._f.write(z if self.gzip else data)
+
+    def _close_part(self):
+        self._write(b'],"tool":{"driver":' + dumps({**DRIVER, "rules": self.rules}) + b'}}]}')
+        tail = self._z.flush()
+        if self.gzip:
+            self._f.write(tail)
+        self._f.close()
+        self._f = None
+
+    def add(self, f, state=None):
+        if f['id'] not in self.index:
+            self.index[f['id']] = len(self.rules)
+            self.rules.append(rule(f))
+        count = self.parts[-1][1]
+        if count and (count >= self.max_results or self._zsize >= self.max_bytes):
+            self._close_part()
+            self._open()
+            count = 0
+        self._write((b',' if count else b'') + dumps(result(f, self.index[f['id']], state)))
+        self.parts[-1][1] += 1
+
+    def close(self):
+        if self._f:
+            self._close_part()
+            # Drop parts left by an earlier, larger run so they aren't uploaded again
+            folder, name = os.path.split(self.path)
+            stem, dot, ext = name.partition('.')
+            part = re.compile(re.escape(stem) + r'-(\d+)' + re.escape(dot + ext))
+            for other in os.listdir(folder or '.'):
+                m = part.fullmatch(other)
+                if m and int(m[1]) > len(self.parts):
+                    os.remove(os.path.join(folder, other))
+
+class Baseline:
+    """The previous run's results by fingerprint, to classify this run's as new, updated or unchanged.
+
+    Each entry keeps a digest of what the result said plus the finding itself, to report it
+    as fixed (baselineState "absent") once it stops appearing — or to carry it forward
+    unchanged when this run couldn't look for it.
+    """
+
+    def __init__(self, path=BASELINE_PATH):
+        self.path = path
+        self.previous, self.current = {}, {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.previous = json.load(f)
+        for fp, entry in self.previous.items():
+            if len(entry) == 6:   # written before findings were kept whole
+                digest, vid, file, line, target, severity = entry
+                self.previous[fp] = [digest, {'id': vid, 'file': file, 'line': line, 'target': target,
+                                              'severity': severity, 'rule': vid, 'message': 'Reported by an earlier run.'}]
+
+    def state(self, f):
+        fp = fingerprint(f)
+        evidence = dumps([f['severity'], f['rule'], f['message'], f.get('fix')])
+        kept = {k: f[k] for k in ('id', 'file', 'line', 'severity', 'rule', 'message', 'fix') if k in f}
+        entry = [hashlib.sha256(evidence).hexdigest()[:16], {**kept, 'target': f.get('target', 'default')}]
+        self.current[fp] = entry
+        old = self.previous.get(fp)
+        return 'new' if old is None else 'unchanged' if old[0] == entry[0] else 'updated'
+
+    def missing(self, targets):
+        """Findings the previous run reported and this one didn't → (fixed, carried).
+
+        One is fixed only if its target was reached and its probe reached a verdict there
+        (`targets[*].checked`, as in sp_issues.covered); otherwise — a probe left out of this
+        run, an outage — it is carried forward as it was and stays in the baseline.
+        """
+        checked = {name: set(t.get('checked', [])) if t.get('reachable') else set() for name, t in targets.items()}
+        fixed, carried = [], []
+        for fp, (digest, f) in self.previous.items():
+            if fp in self.current:
+                continue
+            if f['id'] in checked.get(f['target'], ()):
+                fixed.append({**f, 'rule': f['id'], 'message': 'No longer reported by the runtime probes.', 'fix': None})
+            else:
+                self.current[fp] = [digest, f]
+                carried.append(f)
+        return fixed, carried
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.current, f, separators=(',', ':'))
+        os.replace(self.path + '.tmp', self.path)
+
+def main():
+    timings = Timings('sp_sarif')
+    with timings.stage('load'), open(os.environ.get('RUNTIME_FINDINGS', '/tmp/runtime_findings.json')) as f:
+        data = json.load(f)
+    findings, targets = data.get('findings', []), data.get('targets') or {}
+    with timings.stage('baseline'):
+        baseline = Baseline()
+
+    # The same vuln found on several targets is one rule with one result per target.
+    # The full log is what GitHub gets — a result missing from an upload closes its alert, so
+    # results this run didn't look for are carried into it — and the delta log holds only
+    # what changed, fixed results included.
+    counts = {'new': 0, 'updated': 0, 'unchanged': 0, 'absent': 0, 'carried': 0}
+    with timings.stage('write'), SarifWriter() as sarif, SarifWriter(DELTA_PATH, f'{CATEGORY}-delta') as delta:
+        for f in findings:
+            state = baseline.state(f)
+            counts[state] += 1
+            sarif.add(f, state)
+            if state != 'unchanged':
+                delta.add(f, state)
+        fixed, carried = baseline.missing(targets)
+        for f in carried:
+            counts['carried'] += 1
+            sarif.add(f, 'unchanged')
+        for f in fixed:
+            counts['absent'] += 1
+            delta.add(f, 'absent')
+    with timings.stage('baseline'):
+        baseline.save()
 
-with open('/tmp/results.sarif', 'w') as f:
-    json.dump(sarif, f, indent=2)
+    changed = counts['new'] + counts['updated'] + counts['absent']
+    with open(os.environ.get('GITHUB_OUTPUT', '/tmp/gho.txt'), 'a') as f:
+        f.write(f"sarif_changed={int(changed > 0)}\n")
+        for state, n in counts.items():
+            f.write(f"sarif_{state}={n}\n")
+    print(f"SARIF generated with {len(findings) + len(carried)} result(s) for {len(sarif.rules)} rule(s)"
+          + (f" in {len(sarif.parts)} files" if len(sarif.parts) > 1 else '')
+          + f" — {counts['new']} new, {counts['updated']} updated, {counts['absent']} fixed since the last run"
+          + (f", {counts['carried']} carried over unchecked" if counts['carried'] else ''))
+    timings.report()
 
-print(f"SARIF generated with {len(findings)} result(s)")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import json, re
+
+_TOKEN = re.compile(rb'["\\\[\]{},:]')
+
+class RowCounter:
+    """Incremental JSON scanner for `{"data": [...], "count": n}` style responses.
+
+    Counts the elements of the top-level `key` array and keeps the small top-level
+    scalars named in `keep`, without ever holding more than one chunk of the body.
+    Only structural bytes are visited (via one regex scan per chunk), so large
+    string values cost almost nothing. Call feed() with successive chunks; `count`
+    is valid at any point, which is what lets callers stop at a byte cap.
+    """
+
+    def __init__(self, key='data', keep=('count', 'total')):
+        self.key, self.keep = key.encode(), {k.encode() for k in keep}
+        self.rows, self.fields, self.bytes = 0, {}, 0
+        self.truncated = False
+        self._depth, self._in_str, self._escaped = 0, False, False
+        self._expect_key, self._key, self._key_buf = False, None, None
+        self._counting, self._empty = False, True
+        self._scalar = None   # bytearray while capturing a kept scalar value
+
+    def feed(self, chunk):
+        self.bytes += len(chunk)
+        skip = 0 if self._escaped else -1
+        self._escaped = False
+        last = 0
+        for m in _TOKEN.finditer(chunk):
+            i = m.start()
+            c = chunk[i:i + 1]
+            if i == skip:
+                continue
+            if self._counting and self._empty and chunk[last:i].strip():
+                self._empty = False
+            last = m.end()
+            if self._in_str:
+                if c == b'\\':
+                    skip = i + 1
+                    if skip == len(chunk): self._escaped = True
+                elif c == b'"':
+                    self._in_str = False
+                    if self._key_buf is not None:
+                        self._key = bytes(self._key_buf + chunk[self._key_start:i])[:256]
+                        self._key_buf = None
+                continue
+            if self._scalar is not None:
+                if c in b',}' and self._depth == 1:
+                    self._scalar += chunk[self._scalar_start:i]
+                    self._store(self._scalar)
+                    self._scalar = None
+            if c == b'"':
+                self._in_str = True
+                if self._depth == 1 and self._expect_key:
+                    self._expect_key, self._key_buf, self._key_start = False, bytearray(), m.end()
+                elif self._counting and self._depth == 2:
+                    self._empty = False
+            elif c in b'{[':
+                if self._counting and self._depth == 2:
+                    self._empty = False
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = True
+                elif self._depth == 2 and c == b'[' and self._key == self.key:
+                    self._counting, self._empty = True, True
+            elif c in b'}]':
+                self._depth -= 1
+                if self._counting and self._depth == 1:
+                    self.rows += 0 if self._empty else 1
+                    self._counting = False
+            elif c == b',':
+                if self._depth == 1:
+                    self._expect_key = True
+                elif self._counting and self._depth == 2:
+                    self.rows += 1
+            elif c == b':' and self._depth == 1 and self._key in self.keep:
+                self._scalar, self._scalar_start = bytearray(), m.end()
+        if self._counting and self._empty and chunk[last:].strip():
+            self._empty = False
+        if self._key_buf is not None:
+            self._key_buf += chunk[self._key_start:]
+            self._key_start = 0
+            if len(self._key_buf) > 256: self._key_buf = self._key_buf[:256]
+        if self._scalar is not None:
+            self._scalar += chunk[self._scalar_start:]
+            self._scalar_start = 0
+            if len(self._scalar) > 64: self._scalar = None   # not a small scalar — don't keep it
+
+    def _store(self, raw):
+        try:
+            self.fields[self._key.decode()] = json.loads(raw)
+        except ValueError:
+            pass
+
+    @property
+    def count(self):
+        """Rows seen so far — the array's elements, including one still in progress when cut off."""
+        return self.rows + (1 if self._counting and not self._empty else 0)
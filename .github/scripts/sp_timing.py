@@ -0,0 +1,115 @@
+import json, os, resource, sys, time, tracemalloc
+from contextlib import contextmanager, nullcontext
+
+TIMINGS_DIR = os.environ.get('TIMINGS_DIR', '/tmp/timings')
+# tracemalloc slows allocation-heavy code several-fold, so Python allocation peaks are opt-in
+TRACE_ALLOC = os.environ.get('TIMINGS_TRACEMALLOC') == '1'
+
+_active = None
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    kb = resource.getrusage(who).ru_maxrss
+    return round(kb / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)   # bytes on macOS, KiB elsewhere
+
+class Timings:
+    """Per-stage wall time, CPU time, peak RSS and peak traced allocations for one script.
+
+    `with timings.stage('name'):` times a stage; a stage opened inside another is
+    recorded as `outer/inner`, and re-entering a stage (in a loop) adds to it and
+    counts the calls. Library code uses the module-level stage(), which records into
+    the active Timings and does nothing when there is none — the same functions then
+    report their stages standalone, under rl_pipeline and under a benchmark.
+    Peak RSS is the process high-water mark when the stage last ended; it only grows.
+    """
+
+    def __init__(self, script):
+        global _active
+        self.script = script
+        self.entries = {}   # stage path → totals, in first-start order
+        self._stack = []    # [name, traced peak seen so far] per open stage
+        self.started = time.perf_counter()
+        self.cpu = time.process_time()
+        if TRACE_ALLOC and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _active = self
+
+    def _entry(self, name):
+        path = '/'.join([n for n, _ in self._stack] + [name])
+        return self.entries.setdefault(path, {'stage': path, 'calls': 0, 'seconds': 0.0, 'cpu': 0.0,
+                                              'rss_mb': None, 'alloc_mb': None})
+
+    def _fold_peak(self):
+        """Moves the traced peak since the last reset into every open stage, then resets it."""
+        if not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for frame in self._stack:
+            frame[1] = max(frame[1], peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name):
+        self._fold_peak()
+        entry = self._entry(name)
+        self._stack.append([name, 0])
+        t, c = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry['seconds'] += time.perf_counter() - t
+            entry['cpu'] += time.process_time() - c
+            entry['calls'] += 1
+            entry['rss_mb'] = peak_rss_mb()
+            self._fold_peak()
+            _, alloc = self._stack.pop()
+            if tracemalloc.is_tracing():
+                entry['alloc_mb'] = max(entry['alloc_mb'] or 0.0, round(alloc / (1 << 20), 1))
+
+    def record(self, name, seconds):
+        """Adds a duration measured elsewhere — e.g. by a worker thread — under the current stage."""
+        entry = self._entry(name)
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+        entry['cpu'] = None
+
+    def result(self):
+        stages = [{**e, 'seconds': round(e['seconds'], 3), 'cpu': e['cpu'] if e['cpu'] is None else round(e['cpu'], 3)}
+                  for e in self.entries.values() if e['calls']]
+        return {'script': self.script, 'seconds': round(time.perf_counter() - self.started, 3),
+                'cpu': round(time.process_time() - self.cpu, 3), 'rss_mb': peak_rss_mb(),
+                'children_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN), 'stages': stages}
+
+    def report(self, summary=True):
+        """Writes TIMINGS_DIR/<script>.json and appends a compact table to GITHUB_STEP_SUMMARY."""
+        result = self.result()
+        os.makedirs(TIMINGS_DIR, exist_ok=True)
+        path = os.path.join(TIMINGS_DIR, f'{self.script}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(result, f, indent=2)
+        os.replace(path + '.tmp', path)
+        if summary:
+            with open(os.environ.get('GITHUB_STEP_SUMMARY', '/tmp/summary.md'), 'a') as f:
+                f.write(table(result))
+        return result
+
+def table(result):
+    """Collapsible Markdown table of a result(), inner stages indented under their parent."""
+    alloc = any(s['alloc_mb'] is not None for s in result['stages'])
+    out = (f"\n<details><summary>⏱️ <code>{result['script']}</code> — {result['seconds']:.2f}s, "
+           f"peak RSS {result['rss_mb']} MB</summary>\n\n"
+           f"| Stage | Calls | Wall s | CPU s | Peak RSS MB |{' Py alloc peak MB |' if alloc else ''}\n"
+           f"|-------|------:|-------:|------:|------------:|{'------------------:|' if alloc else ''}\n")
+    for s in result['stages']:
+        name = '&nbsp;&nbsp;' * s['stage'].count('/') + s['stage'].rsplit('/', 1)[-1]
+        cpu = '—' if s['cpu'] is None else f"{s['cpu']:.2f}"
+        extra = f" {s['alloc_mb'] if s['alloc_mb'] is not None else '—'} |" if alloc else ''
+        out += f"| {name} | {s['calls']} | {s['seconds']:.2f} | {cpu} | {s['rss_mb'] or '—'} |{extra}\n"
+    return out + "\n</details>\n"
+
+def stage(name):
+    """Times `name` into the active Timings; a no-op when nothing is being timed."""
+    return _active.stage(name) if _active else nullcontext()
+
+def record(name, seconds):
+    if _active:
+        _active.record(name, seconds)
@@ -0,0 +1,76 @@
+import argparse, base64, fcntl, json, os, sys, threading, time
+
+CACHE_PATH = os.environ.get('SP_TOKEN_CACHE', '/tmp/sp_tokens.json')
+PASSWORD   = 'Password123!'   # shared password of the seeded demo accounts
+
+def jwt_exp(token):
+    """The `exp` claim of a JWT (unverified), or None if the token has none."""
+    try:
+        pay = token.split('.')[1]
+        return int(json.loads(base64.urlsafe_b64decode(pay + '=' * (-len(pay) % 4)))['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+class TokenCache:
+    """On-disk JWT cache keyed by API + identity, valid until the token's own `exp` claim.
+
+    Every write re-reads the file under an exclusive lock, so workflow steps and
+    parallel probes can share one cache without clobbering each other's entries.
+    """
+
+    def __init__(self, path=CACHE_PATH, skew=60):
+        self.path, self.skew = path, skew
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, api, identity):
+        entry = self._load().get(f"{api}|{identity}")
+        if entry and entry['exp'] > time.time() + self.skew:
+            return entry['token']
+        return None
+
+    def put(self, api, identity, token):
+        exp = jwt_exp(token)
+        if exp is None:
+            return   # no expiry to honour — don't cache it
+        with self._lock, open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            now = time.time()
+            entries = {k: v for k, v in self._load().items() if v['exp'] > now}
+            entries[f"{api}|{identity}"] = {'token': token, 'exp': exp}
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+
+def login(http, email):
+    status, body = http.request('POST', '/api/auth/login', {'email': email, 'password': PASSWORD})
+    return body.get('data', {}).get('token', '') if status == 200 else ''
+
+def token(http, api, email, cache):
+    """Cached token for `email`, logging in only when there is no unexpired one."""
+    tok = cache.get(api, email)
+    if not tok:
+        tok = login(http, email)
+        if tok: cache.put(api, email, tok)
+    return tok
+
+def main():
+    from sp_http import Client
+    ap = argparse.ArgumentParser(description='Print a (cached) API token for a demo account')
+    ap.add_argument('email')
+    ap.add_argument('--api', default=os.environ.get('API_URL', 'http://localhost:3001'))
+    args = ap.parse_args()
+    tok = token(Client(args.api, timeout=5), args.api, args.email, TokenCache())
+    if not tok:
+        sys.exit(1)
+    print(tok)
+
+if __name__ == '__main__':
+    main()
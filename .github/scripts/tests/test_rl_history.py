@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from rl_history import options, outputs, simulate
+
+END = 20000 * 86400   # 00:00 UTC
+
+def test_a_fixed_seed_and_end_reproduce_the_history(tmp_path):
+    a = simulate(3, 2, 60, 1, 'burst', 7, str(tmp_path / 'a.rlh'), END)
+    b = simulate(3, 2, 60, 1, 'burst', 7, str(tmp_path / 'b.rlh'), END)
+    assert a.start == b.start == END - 2 * 86400
+    assert np.array_equal(a.counts, b.counts) and np.array_equal(a.total, b.total)
+
+def test_attacker_total_covers_the_last_24h_only(tmp_path):
+    data = simulate(0, 7, 60, 1, 'burst', 7, str(tmp_path / 'h.rlh'), END)
+    atk = np.asarray(data.counts[-1])
+    assert outputs(data)['attacker_total'] == atk[-1440:].sum() < atk.sum()
+
+def test_end_must_be_a_midnight():
+    assert options(['--end', str(END)]).end == END
+    with pytest.raises(SystemExit):
+        options(['--end', str(END + 3600)])
@@ -0,0 +1,47 @@
+import gzip, json
+from collections import Counter
+import numpy as np
+import pytest
+import rl_ingest
+from rl_ingest import Aggregator, build, check_step, ingest
+
+def test_batches_merge_into_the_same_aggregate(monkeypatch):
+    rng = np.random.default_rng(0)
+    events = [(f'u{rng.integers(40)}', f'GET /api/e{rng.integers(5)}', 1_700_000_000 + int(rng.integers(0, 7200)))
+              for _ in range(3000)]
+    monkeypatch.setattr(rl_ingest, 'BATCH', 97)   # many merges, new and repeated keys in each
+    agg = Aggregator(60)
+    for e in events:
+        agg.add(*e)
+    u, e, b, c = agg.decode()
+    got = Counter({(agg.users.names[i], agg.endpoints.names[j], int(k)): int(n) for i, j, k, n in zip(u, e, b, c)})
+    want = Counter((user, ep, ts // 60) for user, ep, ts in events)
+    assert got == want
+    assert np.all(np.diff(agg.keys.astype(np.float64)) > 0)   # still sorted and unique
+
+def test_combined_and_jsonl_logs_fold_into_buckets(tmp_path):
+    combined = tmp_path / 'access.log'
+    combined.write_text('10.0.0.1 - alice [16/Oct/2026:10:00:05 +0000] "GET /api/jobs HTTP/1.1" 200 12\n'
+                        '10.0.0.1 - alice [16/Oct/2026:10:00:55 +0000] "GET /api/jobs HTTP/1.1" 200 12\n'
+                        '10.0.0.2 - - [16/Oct/2026:12:00:10 +0200] "POST /api/jobs HTTP/1.1" 201 3\n'
+                        'not a request line\n')
+    jsonl = tmp_path / 'app.jsonl.gz'
+    with gzip.open(jsonl, 'wt') as f:
+        f.write(json.dumps({'user': 'alice', 'time': '2026-10-16T10:01:00Z', 'method': 'GET', 'path': '/api/jobs'}) + '\n')
+    agg = ingest([str(combined), str(jsonl)], 60)
+    assert (agg.lines, agg.skipped) == (4, 1)
+    u, e, b, c = agg.decode()
+    rows = sorted((agg.users.names[i], int(k) - int(b.min()), int(n)) for i, k, n in zip(u, b, c))
+    assert rows == [('10.0.0.2', 0, 1), ('alice', 0, 2), ('alice', 1, 1)]   # 12:00 +0200 is 10:00 UTC
+
+@pytest.mark.parametrize('step, ok', [(60, True), (300, True), (3600, True), (420, False), (90, False), (7200, False)])
+def test_step_must_tile_an_hour(step, ok):
+    assert (check_step(step) is None) == ok
+
+def test_build_raises_instead_of_exiting(tmp_path):
+    log = tmp_path / 'empty.log'
+    log.write_text('garbage\n')
+    with pytest.raises(ValueError, match='No parseable'):
+        build([str(log)], 60, str(tmp_path / 'h.rlh'))
+    with pytest.raises(ValueError, match='step'):
+        build([str(log)], 420, str(tmp_path / 'h.rlh'))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+import rl_io
+
+def test_history_round_trips_arrays_and_metadata(tmp_path):
+    path = str(tmp_path / 'history.rlh')
+    arrays = {'counts': np.arange(35, dtype=np.uint16).reshape(5, 7), 'total': np.arange(7, dtype=np.int64) * 3,
+              'flags': np.array([True, False, True])}
+    rl_io.write(path, arrays, users=['a', 'b', 'c', 'd', 'e'], start=1_700_000_000, step=60, source='test')
+    h = rl_io.History(path)
+    for name, a in arrays.items():
+        assert h.arrays[name].dtype == a.dtype and np.array_equal(h.arrays[name], a)
+        assert h.meta['arrays'][name]['offset'] % rl_io.ALIGN == 0
+    assert (h.users, h.start, h.step, h.source) == (['a', 'b', 'c', 'd', 'e'], 1_700_000_000, 60, 'test')
+    assert isinstance(h.counts, np.memmap)
+    with pytest.raises(AttributeError):
+        h.missing
+
+def test_created_arrays_are_written_in_place(tmp_path):
+    path = str(tmp_path / 'history.rlh')
+    maps = rl_io.create(path, {'counts': ((3, 4), np.uint32)}, users=['x', 'y', 'z'])
+    maps['counts'][1, 2] = 9
+    maps['counts'].flush()
+    assert rl_io.History(path).counts.tolist() == [[0] * 4, [0, 0, 9, 0], [0] * 4]
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / 'not-history.json'
+    path.write_text('{"users": []}')
+    with pytest.raises(ValueError, match='not a history file'):
+        rl_io.History(str(path))
+
+def test_set_outputs_writes_none_as_empty(tmp_path, monkeypatch):
+    out = tmp_path / 'output.txt'
+    monkeypatch.setenv('GITHUB_OUTPUT', str(out))
+    rl_io.set_outputs({'limit': 30, 'window': None})
+    assert out.read_text() == 'limit=30\nwindow=\n'
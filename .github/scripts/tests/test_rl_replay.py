@@ -0,0 +1,103 @@
+import numpy as np
+import rl_io
+from rl_replay import excess, exceeded, fixed_window, recommend, replay, sample, sliding_window, token_bucket, volumes
+
+def history(tmp_path, counts, users=None):
+    path = str(tmp_path / 'history.rlh')
+    rl_io.write(path, {'counts': np.asarray(counts, np.uint16)}, users=users or [f'u{i}' for i in range(len(counts))],
+                attackers=[], start=0, step=60)
+    return rl_io.History(path)
+
+def test_volumes_match_a_full_row_sum(tmp_path, monkeypatch):
+    counts = np.random.default_rng(0).integers(0, 50, (37, 120))
+    monkeypatch.setattr('rl_replay.CHUNK', 100)   # several row blocks, the last one short
+    assert volumes(history(tmp_path, counts).counts, 20).tolist() == counts[:, 20:].sum(axis=1).tolist()
+
+def test_sample_keeps_the_busiest_users_and_every_attacker(tmp_path):
+    counts = np.zeros((20, 60))
+    counts[:, 0] = np.arange(20)
+    data = history(tmp_path, counts)
+    rows, attack, weights = sample(data, {'u3'}, n=4)
+    assert len(rows) == 5 and attack.tolist() == [False] * 4 + [True]
+    assert rows[:2, 0].tolist() == [19, 18] and rows[4, 0] == 3   # the heavy half, then the drawn ones, then u3
+    assert weights[:2].tolist() == [1, 1] and weights[2:4].tolist() == [8.5, 8.5]
+
+def test_exceeded_without_legitimate_rows_is_zero():
+    limits = np.array([1.0, 10.0])
+    assert exceeded(np.zeros((0, 5)), limits, np.zeros(0)).tolist() == [0, 0]
+    assert exceeded(np.ones((2, 5)), limits, np.zeros(2)).tolist() == [0, 0]
+
+def test_token_bucket_folds_idle_buckets_exactly():
+    # One user, limit 2/min with a 1-minute burst: a full bucket admits 2, then refills 2 per idle minute
+    c = np.array([[5, 0, 0, 3, 0, 1]], float)
+    blocked, hit = token_bucket(c, np.array([False]), np.ones(1), np.array([2.0]), 1, 1)
+    assert blocked[:, 0].tolist() == [3 + 1, 0]   # 5 → 2 admitted; 3 → 2 admitted; 1 admitted
+    assert hit.tolist() == [1.0]
+
+def traffic(seed=0, users=12, buckets=90):
+    rng = np.random.default_rng(seed)
+    c = (rng.random((users, buckets)) < 0.3) * rng.integers(1, 30, (users, buckets))
+    atk = np.zeros(users, bool)
+    atk[-2:] = True
+    return c.astype(float), atk, rng.random(users) + 0.5
+
+LIMITS = np.array([1.0, 4.0, 10.0, 25.0, 60.0])
+
+def by_hand(c, atk, wt, rejected):
+    """(2, K) weighted legit / attack requests rejected, and the weighted share of legit users ever rejected."""
+    blocked = np.array([[(wt[m] * rejected[m][:, k]).sum() for k in range(len(LIMITS))] for m in (~atk, atk)])
+    hit = np.array([(wt[~atk] * (rejected[~atk][:, k] > 0)).sum() / wt[~atk].sum() for k in range(len(LIMITS))])
+    return blocked, hit
+
+def test_excess_is_the_weighted_sum_over_each_limit():
+    x, _, w = traffic()
+    want = [(w[:, None] * np.maximum(0, x - L)).sum() for L in LIMITS]
+    assert np.allclose(excess(x, LIMITS, w), want)
+
+def test_fixed_window_rejects_what_exceeds_each_minute():
+    c, atk, wt = traffic(1)
+    rejected = np.stack([np.maximum(0, c - L).sum(axis=1) for L in LIMITS], axis=1)
+    blocked, hit = fixed_window(c, atk, wt, LIMITS, 1)
+    assert np.allclose(blocked, by_hand(c, atk, wt, rejected)[0])
+    assert np.allclose(hit, by_hand(c, atk, wt, rejected)[1])
+
+def test_sliding_window_counts_every_attempt_in_the_window():
+    c, atk, wt = traffic(2)
+    m = 5
+    rejected = np.zeros((len(c), len(LIMITS)))
+    for u in range(len(c)):
+        for t in range(c.shape[1]):
+            attempts = c[u, max(0, t - m + 1):t + 1].sum()
+            for k, L in enumerate(LIMITS):
+                rejected[u, k] += min(c[u, t], max(0.0, attempts - L * m))
+    blocked, hit = sliding_window(c, atk, wt, LIMITS, 1, m)
+    assert np.allclose(blocked, by_hand(c, atk, wt, rejected)[0])
+    assert np.allclose(hit, by_hand(c, atk, wt, rejected)[1])
+
+def test_token_bucket_matches_a_bucket_by_bucket_replay():
+    c, atk, wt = traffic(3)
+    burst = 2
+    rejected = np.zeros((len(c), len(LIMITS)))
+    for u in range(len(c)):
+        for k, L in enumerate(LIMITS):
+            tokens = L * burst
+            for n in c[u]:
+                tokens = min(L * burst, tokens + L)
+                admitted = min(n, np.floor(tokens))
+                tokens -= admitted
+                rejected[u, k] += n - admitted
+    blocked, hit = token_bucket(c, atk, wt, LIMITS, 1, burst)
+    assert np.allclose(blocked, by_hand(c, atk, wt, rejected)[0])
+    assert np.allclose(hit, by_hand(c, atk, wt, rejected)[1])
+
+def test_recommend_blocks_the_most_attack_traffic_within_budget():
+    rows = replay(*traffic(4)[:2], 60)
+    assert {r['algorithm'] for r in rows} == {'fixed_window', 'sliding_window', 'token_bucket'}
+    for budget in (1.0, 5.0):
+        best = recommend(rows, budget)
+        assert best and all(r['fp_users'] <= budget and r['fp_requests'] <= budget for r in best)
+        for r in best:
+            rivals = [x for x in rows if x['algorithm'] == r['algorithm'] and x['fp_users'] <= budget
+                      and x['fp_requests'] <= budget]
+            assert r['attack_blocked'] == max(x['attack_blocked'] for x in rivals)
+        assert [r['attack_blocked'] for r in best] == sorted((r['attack_blocked'] for r in best), reverse=True)
@@ -0,0 +1,58 @@
+import sqlite3
+from types import SimpleNamespace
+import numpy as np
+from rl_anomaly import Profile, earlier, slot
+from rl_store import DAY, HOUR, Store
+
+WEEK = 7 * DAY
+MONDAY = 4 * DAY   # 1970-01-05
+
+def test_hourly_rollups_keep_the_sum_of_squares(tmp_path):
+    store = Store(str(tmp_path / 'h.db'))
+    v = np.arange(180) % 7
+    store.append('total', MONDAY, 60, v)
+    rows = store.moments('total', res=HOUR)
+    assert [r[0] for r in rows] == [MONDAY, MONDAY + HOUR, MONDAY + 2 * HOUR]
+    for (_, n, s, q), h in zip(rows, v.reshape(3, 60)):
+        assert (n, s, q) == (60, h.sum(), (h * h).sum())
+    assert store.moments('total', res=DAY)[0][1:] == (180, v.sum(), (v * v).sum())
+
+def test_a_store_from_before_the_sum_of_squares_is_migrated(tmp_path):
+    path = str(tmp_path / 'old.db')
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE points (series TEXT NOT NULL, res INTEGER NOT NULL, ts INTEGER NOT NULL, sum REAL NOT NULL, "
+               "peak REAL NOT NULL, n INTEGER NOT NULL, PRIMARY KEY (series, res, ts)) WITHOUT ROWID")
+    db.execute("INSERT INTO points VALUES ('total', 60, ?, 5, 5, 1)", (MONDAY,))
+    db.commit(); db.close()
+    store = Store(path)
+    store.append('total', MONDAY + 60, 60, [3] * 59)
+    assert store.query('total')[0][1] == 5 + 3 * 59
+    assert store.moments('total') == []   # an hour with a legacy bucket has no known spread
+    store.append('total', MONDAY + HOUR, 60, [2] * 60)
+    assert store.moments('total') == [(MONDAY + HOUR, 60, 120, 240)]
+
+def test_the_profile_learns_earlier_weeks_from_the_store(tmp_path):
+    rng = np.random.default_rng(0)
+    store = Store(str(tmp_path / 'h.db'))
+    weeks = rng.poisson(40, 3 * WEEK // 60)
+    store.append('total', MONDAY, 60, weeks)
+    # Today's history alone is one day — every slot stays untrained without the store
+    today = SimpleNamespace(start=MONDAY + 3 * WEEK, step=60, total=rng.poisson(40, DAY // 60))
+    assert Profile.learn(today.start, 60, today.total).trained == 0
+    profile = Profile.learn(today.start, 60, today.total, earlier=earlier(store, today))
+    assert profile.trained == 168
+    assert all(38 < m < 42 for m in profile.median)
+    assert all(5 < sd < 8 for sd in profile.sd)   # √40 ≈ 6.3: the Poisson spread of single minutes
+
+def test_the_profile_matches_between_the_store_and_the_history(tmp_path):
+    # The same four weeks, learned from buckets or from the store's hourly rollups of them
+    rng = np.random.default_rng(1)
+    t = MONDAY + np.arange(4 * WEEK // 60) * 60
+    v = rng.poisson(np.where(t % DAY // HOUR < 8, 5, 50))
+    store = Store(str(tmp_path / 'h.db'))
+    store.append('total', MONDAY, 60, v)
+    data = SimpleNamespace(start=MONDAY + 4 * WEEK, step=60, total=np.zeros(0, np.int64))
+    a = Profile.learn(MONDAY, 60, v)
+    b = Profile.learn(data.start, 60, data.total, earlier=earlier(store, data))
+    assert a.median == b.median and a.sd == b.sd
+    assert a.median[slot(MONDAY + 3 * HOUR)] < 6 < 45 < a.median[slot(MONDAY + 12 * HOUR)]
@@ -0,0 +1,26 @@
+import io
+from types import SimpleNamespace
+import numpy as np
+import rl_summary
+
+ANOMALY = {'mean': 20.0, 'std': 4.0, 'anomalies': [], 'offenders': [], 'endpoints': [], 'top_users': [],
+           'population': {'users': 3, 'mean': 100.0, 'std': 10.0, 'requests': 300}}
+REPLAY = {'recommended': [], 'strict': [], 'results': []}
+
+def render(probe, tmp_path, monkeypatch):
+    monkeypatch.setattr('rl_summary.STORE_PATH', str(tmp_path / 'none.db'))
+    data = SimpleNamespace(start=0, step=60, total=np.full(24 * 60, 20))
+    x = rl_summary.inputs(data, {'peak_hour': 3, 'peak_requests': 25}, ANOMALY, REPLAY, probe)
+    f = io.StringIO()
+    rl_summary.body(f, x)
+    return f.getvalue()
+
+def test_unreachable_api_is_not_reported_as_unprotected(tmp_path, monkeypatch):
+    out = render({'rate_limited': False, 'sent': 0, 'accepted': 0, 'reachable': False}, tmp_path, monkeypatch)
+    assert 'API not reachable' in out and 'the API was not reachable' in out
+    assert 'VULNERABLE' not in out and 'no limiter detected' not in out
+
+def test_admitted_burst_is_reported_as_unprotected(tmp_path, monkeypatch):
+    out = render({'rate_limited': False, 'sent': 200, 'accepted': 200}, tmp_path, monkeypatch)
+    assert '🔴 VULNERABLE — 200 requests accepted without 429' in out
+    assert 'no limiter detected — 200 requests admitted' in out
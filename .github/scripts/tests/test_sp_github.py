@@ -0,0 +1,68 @@
+import json, os, subprocess, sys
+from sp_github import ETagCache, GitHub, Stub
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(script, tmp_path, *args, **env):
+    env = {**os.environ, 'GH_CACHE': str(tmp_path / 'cache'), 'GH_TOKEN': 'test', 'GITHUB_OUTPUT': str(tmp_path / 'output.txt'),
+           'TIMINGS_DIR': str(tmp_path / 'timings'), 'GITHUB_STEP_SUMMARY': str(tmp_path / 'summary.md'), **env}
+    return subprocess.run([sys.executable, os.path.join(SCRIPTS, script), *args], env=env, capture_output=True, text=True)
+
+def test_each_sarif_part_is_its_own_upload(tmp_path):
+    findings = [{'id': f'VULN-{i}', 'severity': 'high', 'rule': 'Rule', 'file': 'api/src/app.ts', 'line': i,
+                 'message': 'Seen.', 'target': 'local'} for i in range(5)]
+    (tmp_path / 'findings.json').write_text(json.dumps({'findings': findings, 'targets': {}}))
+    sarif = tmp_path / 'sarif'
+    assert run('sp_sarif.py', tmp_path, RUNTIME_FINDINGS=str(tmp_path / 'findings.json'), SARIF_MAX_RESULTS='2',
+               SARIF_PATH=str(sarif / 'results.sarif'), SARIF_DELTA=str(tmp_path / 'delta' / 'delta.sarif'),
+               SARIF_BASELINE=str(tmp_path / 'state' / 'baseline.json')).returncode == 0
+    parts = sorted(str(p) for p in sarif.iterdir())
+    assert len(parts) == 3
+    with Stub() as stub:
+        done = run('sp_github.py', tmp_path, 'sarif', *parts, '--ref', 'refs/heads/main', '--sha', 'a' * 40,
+                   SP_GITHUB_API=stub.url)
+        assert done.returncode == 0, done.stdout + done.stderr
+        uploaded = stub.sarifs
+    assert len(uploaded) == 3
+    assert sorted(s['runs'][0]['automationDetails']['id'] for s in uploaded) == \
+        ['runtime-api-probe/', 'runtime-api-probe/part-2/', 'runtime-api-probe/part-3/']
+    assert sorted(len(s['runs'][0]['results']) for s in uploaded) == [1, 2, 2]
+
+def issue(n, *labels):
+    return {'number': n, 'state': 'open', 'title': f'Issue {n}', 'body': '', 'labels': [{'name': l} for l in labels]}
+
+def test_unchanged_pages_come_from_the_etag_cache(tmp_path):
+    with Stub(issues=[issue(n, 'security') for n in range(1, 6)]) as stub:
+        gh = GitHub('test', api=stub.url, cache=ETagCache(str(tmp_path)))
+        path = '/repos/o/r/issues?state=open&labels=security&per_page=2'
+        assert [i['number'] for i in gh.paginate(path)] == [1, 2, 3, 4, 5]
+        spent = stub.limit - stub.remaining
+        assert (gh.stats['requests'], spent) == (3, 3)
+        # Nothing changed: every page is a 304 that costs no rate limit
+        assert [i['number'] for i in gh.paginate(path)] == [1, 2, 3, 4, 5]
+        assert gh.stats['not_modified'] == 3 and stub.limit - stub.remaining == spent
+        # A changed page is fetched again, the others still come from the cache
+        stub.issues[4]['title'] = 'Renamed'
+        assert [i['title'] for i in gh.paginate(path)][-1] == 'Renamed'
+        assert gh.stats['not_modified'] == 5 and stub.limit - stub.remaining == spent + 1
+
+def test_alerts_step_writes_typed_alerts_and_their_count(tmp_path):
+    fixture = [{'number': 7, 'rule': {'id': 'js/sql-injection', 'severity': 'error', 'description': 'SQLi'},
+                'most_recent_instance': {'location': {'path': 'api/src/db.ts', 'start_line': 12}},
+                'html_url': 'https://example.test/7'}]
+    with Stub({'code-scanning': fixture}) as stub:
+        out = tmp_path / 'alerts.json'
+        done = run('sp_github.py', tmp_path, 'alerts', 'code-scanning', '--out', str(out), SP_GITHUB_API=stub.url)
+        assert done.returncode == 0, done.stderr
+    assert json.loads(out.read_text()) == [{'id': 7, 'rule': 'js/sql-injection', 'severity': 'error', 'description': 'SQLi',
+                                            'file': 'api/src/db.ts', 'line': 12, 'url': 'https://example.test/7'}]
+    assert 'code_scan_count=1' in (tmp_path / 'output.txt').read_text()
+    assert (tmp_path / 'timings' / 'sp_github-code-scanning.json').exists()
+
+def test_exhausted_rate_limit_is_not_waited_out_past_max_wait(tmp_path):
+    with Stub(issues=[issue(1, 'security')], limit=1) as stub:
+        gh = GitHub('test', api=stub.url)
+        assert gh.request('GET', '/repos/o/r/issues')[0] == 200
+        assert gh.remaining == 0
+        assert gh.request('GET', '/repos/o/r/issues')[0] == 429   # the reset is an hour away
+        assert len(stub.calls) == 1
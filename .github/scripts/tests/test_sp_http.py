@@ -0,0 +1,58 @@
+import json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from sp_http import Client, run_parallel
+
+class Slow(BaseHTTPRequestHandler):
+    """Answers every GET after `delay` seconds."""
+    protocol_version = 'HTTP/1.1'
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        data = json.dumps({'ok': True}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+@pytest.fixture
+def slow():
+    def serve(delay):
+        Slow.delay = delay
+        return f'http://127.0.0.1:{server.server_port}'
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Slow)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield serve
+    server.shutdown()
+
+def test_waiting_for_a_pool_slot_stops_at_the_deadline(slow):
+    client = Client(slow(1.5), timeout=4, pool_size=1)
+    holder = threading.Thread(target=client.fetch, args=('GET', '/held'))
+    holder.start()
+    time.sleep(0.2)   # the only slot is now busy for another ~1.3s
+    started = time.monotonic()
+    status, _, _ = client.fetch('GET', '/queued', deadline=time.monotonic() + 0.3)
+    assert status == 0
+    assert time.monotonic() - started < 1.0
+    holder.join()
+    client.close()
+
+def test_each_probe_gets_its_own_deadline(slow):
+    client = Client(slow(0.6), timeout=4, pool_size=4)
+    probes = {name: (lambda http: http.request('GET', '/')[0]) for name in ('first', 'second', 'third')}
+    # One worker: the later probes start ~0.6s and ~1.2s in, past a deadline shared from the start
+    assert run_parallel(client, probes, workers=1, deadline=1.0) == {'first': 200, 'second': 200, 'third': 200}
+    client.close()
+
+def test_a_probe_past_its_deadline_is_skipped(slow):
+    client = Client(slow(0), timeout=0.2, pool_size=2)
+    probes = {'stuck': lambda http: time.sleep(1.5), 'quick': lambda http: http.request('GET', '/')[0]}
+    started = time.monotonic()
+    assert run_parallel(client, probes, workers=2, deadline=0.3) == {'quick': 200}
+    assert time.monotonic() - started < 1.2
+    client.close()
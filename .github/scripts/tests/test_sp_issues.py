@@ -0,0 +1,35 @@
+import json, os, subprocess, sys
+from sp_github import Stub
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FINDING = {'id': 'VULN-1-BOLA', 'severity': 'critical', 'rule': 'API1:2023 — Broken Object Level Authorization',
+           'file': 'api/src/services/JobService.ts', 'line': 12, 'message': "Bob accessed Alice's job.",
+           'fix': "Add 'AND owner_id = $2' to WHERE clause in getJobById()", 'target': 'local'}
+
+def reconcile(stub, tmp_path, findings):
+    """One sp_issues run against the stub, with a probe run that checked VULN-1-BOLA on every target."""
+    path = tmp_path / 'findings.json'
+    path.write_text(json.dumps({'findings': findings,
+                                'targets': {'local': {'reachable': True, 'checked': ['VULN-1-BOLA']}}}))
+    env = {**os.environ, 'RUNTIME_FINDINGS': str(path), 'ISSUE_STATE': str(tmp_path / 'state' / 'state.json'),
+           'ISSUE_CLOSE_AFTER': '2', 'GH_CACHE': str(tmp_path / 'cache'), 'GH_TOKEN': 'test',
+           'SP_GITHUB_API': stub.url, 'TIMINGS_DIR': str(tmp_path / 'timings'),
+           'GITHUB_STEP_SUMMARY': str(tmp_path / 'summary.md')}
+    subprocess.run([sys.executable, os.path.join(SCRIPTS, 'sp_issues.py')], env=env, check=True,
+                   capture_output=True)
+
+def test_finding_that_comes_back_restarts_the_clean_run_count(tmp_path):
+    with Stub() as stub:
+        reconcile(stub, tmp_path, [FINDING])
+        assert [i['state'] for i in stub.issues] == ['open']
+        for findings in ([], [FINDING], []):
+            reconcile(stub, tmp_path, findings)
+        assert [i['state'] for i in stub.issues] == ['open']
+        assert stub.comments == []
+
+def test_finding_missing_for_close_after_runs_is_closed(tmp_path):
+    with Stub() as stub:
+        for findings in ([FINDING], [], []):
+            reconcile(stub, tmp_path, findings)
+        assert [(i['state'], i['state_reason']) for i in stub.issues] == [('closed', 'completed')]
+        assert len(stub.comments) == 1
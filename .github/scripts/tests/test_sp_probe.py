@@ -0,0 +1,115 @@
+import base64, json, os, subprocess, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from sp_probe import probe_target
+from sp_registry import select
+from sp_tokens import TokenCache
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def jwt(exp):
+    pay = base64.urlsafe_b64encode(json.dumps({'exp': exp}).encode()).rstrip(b'=').decode()
+    return f"e30.{pay}.sig"
+
+class API(BaseHTTPRequestHandler):
+    """An API that logs in fine but times out, errors or refuses on the probed routes."""
+    routes = {}
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=None):
+        data = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_route(self, method):
+        if self.headers.get('Content-Length'):
+            self.rfile.read(int(self.headers['Content-Length']))
+        if self.path == '/api/auth/login':
+            return self.reply(200, {'data': {'token': jwt(int(time.time()) + 3600)}})
+        for (m, prefix), (delay, status, body) in self.routes.items():
+            if m == method and self.path.startswith(prefix):
+                time.sleep(delay)
+                return self.reply(status, body)
+        self.reply(404)
+
+    def do_GET(self):
+        self.handle_route('GET')
+
+    def do_POST(self):
+        self.handle_route('POST')
+
+@pytest.fixture
+def api():
+    def serve(routes):
+        API.routes = routes
+        server = ThreadingHTTPServer(('127.0.0.1', 0), API)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}'
+    servers = []
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+def test_timeouts_and_5xx_are_not_checked(api, tmp_path):
+    url = api({
+        ('GET', '/api/jobs/cccccccc'): (3, 200, {'data': {'title': 'late'}}),   # past the deadline
+        ('GET', '/api/jobs'): (0, 401, {}),
+        ('GET', '/api/properties/search'): (0, 500, {}),
+        ('GET', '/api/properties'): (0, 200, {'count': 5}),
+    })
+    result = probe_target('local', url, select(['bola', 'expired_jwt', 'sqli']), 4, 1.0,
+                          TokenCache(str(tmp_path / 'tokens.json')))
+    assert result['reachable']
+    assert result['findings'] == []
+    assert result['checked'] == ['VULN-2-AUTH']
+
+def test_clean_and_vulnerable_runs_are_checked(api, tmp_path):
+    url = api({
+        ('GET', '/api/jobs/cccccccc'): (0, 200, {'data': {'title': 'Fix sink'}}),
+        ('GET', '/api/jobs'): (0, 401, {}),
+    })
+    result = probe_target('local', url, select(['bola', 'expired_jwt']), 4, 5.0,
+                          TokenCache(str(tmp_path / 'tokens.json')))
+    assert [f['id'] for f in result['findings']] == ['VULN-1-BOLA']
+    assert result['checked'] == ['VULN-1-BOLA', 'VULN-2-AUTH']
+
+def test_rate_limit_burst_answered_with_5xx_is_not_checked(api, tmp_path):
+    url = api({('POST', '/api/jobs/cccccccc'): (0, 503, {})})
+    result = probe_target('local', url, select(['rate_limit']), 8, 5.0, TokenCache(str(tmp_path / 'tokens.json')))
+    assert result['findings'] == []
+    assert result['checked'] == []
+
+def test_rate_limit_burst_accepted_in_full_is_a_finding(api, tmp_path):
+    url = api({('POST', '/api/jobs/cccccccc'): (0, 201, {})})
+    result = probe_target('local', url, select(['rate_limit']), 8, 5.0, TokenCache(str(tmp_path / 'tokens.json')))
+    assert [f['id'] for f in result['findings']] == ['VULN-6-RATELIMIT']
+    assert result['checked'] == ['VULN-6-RATELIMIT']
+
+def test_environment_without_a_target_falls_back_to_api_url(tmp_path):
+    out = tmp_path / 'findings.json'
+    env = {**os.environ, 'API_TARGETS': 'staging=http://127.0.0.1:9,production=http://127.0.0.1:9',
+           'API_URL': 'http://127.0.0.1:9', 'RUNTIME_FINDINGS': str(out), 'PROBE_DEADLINE': '2',
+           'SP_TOKEN_CACHE': str(tmp_path / 'tokens.json'), 'TIMINGS_DIR': str(tmp_path / 'timings'),
+           'GITHUB_STEP_SUMMARY': str(tmp_path / 'summary.md')}
+    run = subprocess.run([sys.executable, os.path.join(SCRIPTS, 'sp_probe.py'),
+                          '--environment', 'local', '--probe', 'expired_jwt'], env=env, capture_output=True, text=True)
+    assert run.returncode == 0, run.stderr
+    assert '::warning::' in run.stdout
+    assert list(json.loads(out.read_text())['targets']) == ['local']
+
+def test_unexpected_refusals_are_inconclusive_not_findings(api, tmp_path):
+    url = api({
+        ('GET', '/api/jobs/cccccccc'): (0, 429, {}),
+        ('GET', '/api/jobs'): (0, 403, {}),
+    })
+    result = probe_target('local', url, select(['bola', 'expired_jwt']), 4, 5.0,
+                          TokenCache(str(tmp_path / 'tokens.json')))
+    assert result['findings'] == []
+    assert result['checked'] == []
@@ -0,0 +1,50 @@
+import json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from sp_http import Client
+from sp_ratelimit import measure, outputs, probe
+
+class Limited(BaseHTTPRequestHandler):
+    """Admits `limit` bids per fixed `window`-second window and answers the rest with 429."""
+    limit, window = 2, 1
+    lock, counts = threading.Lock(), {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.lock:
+            slot = int(time.time() // self.window)
+            self.counts[slot] = self.counts.get(slot, 0) + 1
+            ok = self.counts[slot] <= self.limit
+        data = json.dumps({} if ok else {'error': 'Too many requests'}).encode()
+        self.send_response(201 if ok else 429)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('RateLimit-Policy', f'{self.limit};w={self.window}')
+        if not ok:
+            self.send_header('Retry-After', str(self.window - time.time() % self.window))
+        self.end_headers()
+        self.wfile.write(data)
+
+@pytest.fixture
+def client():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Limited)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    c = Client(f'http://127.0.0.1:{server.server_port}', timeout=4, pool_size=8)
+    yield c
+    c.close()
+    server.shutdown()
+
+def test_search_that_never_admits_a_trial_leaves_the_limit_unknown(client):
+    result = measure(client, 'token', max_requests=20, deadline_s=20, max_trials=0)
+    assert result['rate_limited']
+    assert result['limit'] is None and result['per_minute'] is None
+    assert not result['converged']
+
+def test_unreachable_api_reports_nothing_accepted():
+    result = probe('http://127.0.0.1:9', max_requests=50, deadline=5)
+    assert result == {'rate_limited': False, 'sent': 0, 'accepted': 0, 'reachable': False}
+    assert outputs(result)['reachable'] == 0 and outputs(result)['accepted'] == 0
@@ -0,0 +1,97 @@
+import gzip, json, os, random, subprocess, sys
+from sp_sarif import SarifWriter, fingerprint
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def finding(vid, target='local', **kw):
+    return {'id': vid, 'severity': 'medium', 'rule': f'Rule of {vid}', 'file': f'api/src/{vid}.ts', 'line': 7,
+            'message': f'{vid} seen.', 'fix': 'Fix it', 'target': target, **kw}
+
+def sarif(tmp_path, findings, checked, reachable=True):
+    """One sp_sarif run → (results of the full log, results of the delta log), as [(ruleId, baselineState)]."""
+    path = tmp_path / 'findings.json'
+    path.write_text(json.dumps({'findings': findings,
+                                'targets': {'local': {'reachable': reachable, 'checked': checked}}}))
+    env = {**os.environ, 'RUNTIME_FINDINGS': str(path), 'SARIF_PATH': str(tmp_path / 'sarif' / 'results.sarif'),
+           'SARIF_DELTA': str(tmp_path / 'delta' / 'delta.sarif'), 'SARIF_BASELINE': str(tmp_path / 'state' / 'baseline.json'),
+           'GITHUB_OUTPUT': str(tmp_path / 'output.txt'), 'TIMINGS_DIR': str(tmp_path / 'timings'),
+           'GITHUB_STEP_SUMMARY': str(tmp_path / 'summary.md')}
+    subprocess.run([sys.executable, os.path.join(SCRIPTS, 'sp_sarif.py')], env=env, check=True, capture_output=True)
+    logs = [json.loads((tmp_path / d).read_text()) for d in ('sarif/results.sarif', 'delta/delta.sarif')]
+    return [sorted((r['ruleId'], r.get('baselineState')) for r in log['runs'][0]['results']) for log in logs]
+
+def test_finding_a_run_did_not_check_is_carried_not_fixed(tmp_path):
+    both = ['VULN-2-AUTH', 'VULN-6-RATELIMIT']
+    sarif(tmp_path, [finding('VULN-2-AUTH'), finding('VULN-6-RATELIMIT')], both)
+    # A fast-only run: the slow rate-limit probe didn't run, so its finding is still open
+    full, delta = sarif(tmp_path, [finding('VULN-2-AUTH')], ['VULN-2-AUTH'])
+    assert full == [('VULN-2-AUTH', 'unchanged'), ('VULN-6-RATELIMIT', 'unchanged')]
+    assert delta == []
+    # The next run that does check it and doesn't find it closes it
+    full, delta = sarif(tmp_path, [finding('VULN-2-AUTH')], both)
+    assert full == [('VULN-2-AUTH', 'unchanged')]
+    assert delta == [('VULN-6-RATELIMIT', 'absent')]
+
+def test_unreachable_target_fixes_nothing(tmp_path):
+    sarif(tmp_path, [finding('VULN-2-AUTH')], ['VULN-2-AUTH'])
+    full, delta = sarif(tmp_path, [], ['VULN-2-AUTH'], reachable=False)
+    assert full == [('VULN-2-AUTH', 'unchanged')]
+    assert delta == []
+
+def write(path, findings, **limits):
+    with SarifWriter(str(path), 'probe', **limits) as w:
+        for f in findings:
+            w.add(f)
+    return w
+
+def load(path):
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        return json.load(f)
+
+def test_parts_split_at_the_result_limit_and_each_is_a_whole_log(tmp_path):
+    findings = [finding(f'VULN-{i % 3}', line=i) for i in range(7)]
+    w = write(tmp_path / 'out' / 'results.sarif', findings, max_results=3)
+    assert [(os.path.basename(p), n) for p, n in w.parts] == [('results.sarif', 3), ('results-2.sarif', 3), ('results-3.sarif', 1)]
+    logs = [load(p) for p, _ in w.parts]
+    assert [log['runs'][0]['automationDetails']['id'] for log in logs] == ['probe/', 'probe/part-2/', 'probe/part-3/']
+    for log in logs:
+        run = log['runs'][0]
+        rules = run['tool']['driver']['rules']
+        assert all(rules[r['ruleIndex']]['id'] == r['ruleId'] for r in run['results'])
+    assert sum(len(log['runs'][0]['results']) for log in logs) == 7
+
+def test_parts_split_at_the_compressed_size_limit(tmp_path):
+    rng = random.Random(0)
+    noisy = [finding('VULN-1', line=i, message=''.join(rng.choice('abcdefghij') for _ in range(2000))) for i in range(40)]
+    w = write(tmp_path / 'results.sarif.gz', noisy, max_bytes=20_000)
+    assert len(w.parts) > 1
+    for path, _ in w.parts[:-1]:
+        assert os.path.getsize(path) < 20_000 + 16_000   # the limit, plus one result and the deflate lag
+    assert sum(len(load(p)['runs'][0]['results']) for p, _ in w.parts) == 40
+
+def test_a_smaller_run_removes_the_parts_left_by_a_larger_one(tmp_path):
+    path = tmp_path / 'results.sarif'
+    write(path, [finding(f'VULN-{i}') for i in range(5)], max_results=2)
+    assert sorted(os.listdir(tmp_path)) == ['results-2.sarif', 'results-3.sarif', 'results.sarif']
+    write(path, [finding('VULN-1')], max_results=2)
+    assert os.listdir(tmp_path) == ['results.sarif']
+
+def test_fingerprint_follows_place_and_target_not_wording():
+    f = finding('VULN-1-BOLA')
+    assert fingerprint(f) == fingerprint({**f, 'message': 'Reworded.', 'severity': 'critical'})
+    assert len({fingerprint(f), fingerprint({**f, 'line': 8}), fingerprint({**f, 'target': 'staging'}),
+                fingerprint({**f, 'file': 'api/src/other.ts'})}) == 4
+    assert fingerprint({k: v for k, v in f.items() if k != 'target'}) == fingerprint({**f, 'target': 'default'})
+
+def test_baseline_states_across_runs(tmp_path):
+    both = ['VULN-1', 'VULN-2']
+    full, delta = sarif(tmp_path, [finding('VULN-1'), finding('VULN-2')], both)
+    assert full == delta == [('VULN-1', 'new'), ('VULN-2', 'new')]
+    full, delta = sarif(tmp_path, [finding('VULN-1'), finding('VULN-2', message='Worse now.')], both)
+    assert full == [('VULN-1', 'unchanged'), ('VULN-2', 'updated')]
+    assert delta == [('VULN-2', 'updated')]
+    full, delta = sarif(tmp_path, [finding('VULN-1')], both)
+    assert full == [('VULN-1', 'unchanged')]
+    assert delta == [('VULN-2', 'absent')]
+    assert 'sarif_absent=1' in (tmp_path / 'output.txt').read_text().splitlines()
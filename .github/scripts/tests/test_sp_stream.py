@@ -0,0 +1,27 @@
+import json
+import pytest
+from sp_stream import RowCounter
+
+BODY = json.dumps({'success': True, 'data': [{'id': i, 'name': f'Unit {i}, "A"', 'tags': ['x', {'y': [1, 2]}],
+                                               'note': 'brackets ] } [ { and \\\\ escapes'} for i in range(25)],
+                   'count': 25, 'meta': {'count': 999, 'data': [1, 2, 3]}}).encode()
+
+@pytest.mark.parametrize('size', [1, 3, 7, 64, len(BODY)])
+def test_counts_rows_and_keeps_top_level_scalars_across_any_chunking(size):
+    rc = RowCounter('data')
+    for i in range(0, len(BODY), size):
+        rc.feed(BODY[i:i + size])
+    assert rc.count == 25
+    assert rc.fields == {'count': 25}   # the nested meta.count is not top level
+    assert rc.bytes == len(BODY)
+
+def test_empty_and_scalar_arrays():
+    for body, rows in ((b'{"data": []}', 0), (b'{"data": [ ]}', 0), (b'{"data": [1, 2, 3]}', 3), (b'{"data": ["a,b"]}', 1)):
+        rc = RowCounter('data')
+        rc.feed(body)
+        assert rc.count == rows, body
+
+def test_a_cut_off_body_counts_the_row_in_progress():
+    rc = RowCounter('data')
+    rc.feed(BODY[:BODY.index(b'"id": 3')])
+    assert rc.count == 4